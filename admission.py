@@ -0,0 +1,256 @@
+import asyncio
+import math
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Deque, Tuple, Callable
+from config import (
+    MODEL_MAX_CONCURRENCY,
+    GENERATION_QUEUE_MAX,
+)
+from llm_providers import provider_registry
+from metrics import track_queued, track_in_flight
+
+# Servis süresi tahmini için başlangıç değeri ve EWMA katsayısı
+INITIAL_SERVICE_SEC = 10.0
+EWMA_ALPHA = 0.2
+
+class QueueFullError(Exception):
+    """Bekleme kuyruğu dolu - istemci Retry-After sonra tekrar denemeli"""
+
+    def __init__(self, gate_name: str, retry_after: int):
+        self.gate_name = gate_name
+        self.retry_after = retry_after
+        super().__init__(f"Generation queue is full for {gate_name}, retry after {retry_after} seconds")
+
+class _Gate:
+    """Sabit eşzamanlılık limiti ve sınırlı FIFO bekleme kuyruğu"""
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.active = 0
+        self.avg_service_sec = INITIAL_SERVICE_SEC
+        self._waiters: Deque[Tuple[str, asyncio.Future]] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def is_full(self) -> bool:
+        return self.active >= self.limit and len(self._waiters) >= self.max_queue
+
+    def position(self, ticket_id: str) -> Optional[int]:
+        for index, (waiting_ticket, _) in enumerate(self._waiters):
+            if waiting_ticket == ticket_id:
+                return index
+        return None
+
+    def eta_seconds(self, position: int) -> int:
+        # Önündeki istekler limit kadar paralel işlenir
+        return int(math.ceil((position // self.limit + 1) * self.avg_service_sec))
+
+    def retry_after(self) -> int:
+        return max(1, self.eta_seconds(len(self._waiters)))
+
+    async def acquire(self, ticket_id: str):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise QueueFullError(self.name, self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (ticket_id, future)
+        self._waiters.append(entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot bize devredilmişti, bir sonrakine aktar
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(entry)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self):
+        # Slotu doğrudan sıradaki bekleyene devret (active sayısı değişmez)
+        while self._waiters:
+            _, future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+    def record_service_time(self, seconds: float):
+        self.avg_service_sec = (1 - EWMA_ALPHA) * self.avg_service_sec + EWMA_ALPHA * seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "avg_service_sec": round(self.avg_service_sec, 2)
+        }
+
+class AdmissionController:
+    """
+    LLM sağlayıcıları önünde kabul kontrolü.
+
+    Her çağrı önce model, sonra sağlayıcı kapısından geçer. Kuyruk doluysa
+    QueueFullError fırlatılır (endpoint 429 + Retry-After döner). Limitler
+    worker process başınadır.
+    """
+
+    def __init__(self):
+        # Eşzamanlılık limitleri provider politikalarından gelir
+        self._provider_gates: Dict[str, _Gate] = {
+            provider.name: _Gate(provider.name, provider.policy.max_concurrency, GENERATION_QUEUE_MAX)
+            for provider in provider_registry.providers()
+        }
+        self._model_gates: Dict[str, _Gate] = {}
+        self._tickets: Dict[str, Dict[str, Any]] = {}
+
+    def _provider_gate(self, provider: str) -> _Gate:
+        gate = self._provider_gates.get(provider)
+        if gate is None:
+            # Sonradan kaydedilen provider
+            registered = provider_registry.get(provider) or provider_registry.get(provider_registry.default_name)
+            gate = _Gate(provider, registered.policy.max_concurrency, GENERATION_QUEUE_MAX)
+            self._provider_gates[provider] = gate
+        return gate
+
+    def _model_gate(self, provider: str, model_name: str) -> _Gate:
+        gate = self._model_gates.get(model_name)
+        if gate is None:
+            # Model için özel limit yoksa sağlayıcı limiti geçerlidir
+            limit = MODEL_MAX_CONCURRENCY.get(model_name, self._provider_gate(provider).limit)
+            gate = _Gate(model_name, limit, GENERATION_QUEUE_MAX)
+            self._model_gates[model_name] = gate
+        return gate
+
+    def check_capacity(self, provider: str, model_name: str):
+        """Kuyruk zaten doluysa beklemeden reddet (stream başlamadan 429 için)"""
+        for gate in (self._model_gate(provider, model_name), self._provider_gate(provider)):
+            if gate.is_full():
+                raise QueueFullError(gate.name, gate.retry_after())
+
+    def is_idle(self, provider: str, model_name: str) -> bool:
+        """Model ve sağlayıcı kapısında boş slot var ve bekleyen yok (düşük öncelikli işler için)"""
+        return all(
+            self._gate_free(gate)
+            for gate in (self._model_gate(provider, model_name), self._provider_gate(provider))
+        )
+
+    @staticmethod
+    def _gate_free(gate: _Gate) -> bool:
+        return gate.active < gate.limit and not gate.queued
+
+    def _preempt(self, provider: str, model_name: str):
+        """Normal isteği bekletecek kapılardaki düşük öncelikli (önceden alınabilir) işleri iptal ettir"""
+        model_busy = not self._gate_free(self._model_gate(provider, model_name))
+        provider_busy = not self._gate_free(self._provider_gate(provider))
+        for ticket in list(self._tickets.values()):
+            on_preempt = ticket["on_preempt"]
+            if on_preempt is None:
+                continue
+            if (model_busy and ticket["model_name"] == model_name) or (provider_busy and ticket["provider"] == provider):
+                ticket["on_preempt"] = None
+                on_preempt()
+
+    @staticmethod
+    def _ticket_key(ticket_id: str, owner_id: Optional[int]) -> str:
+        # İstemci id'leri kullanıcıya göre ayrılır: farklı kullanıcıların aynı id'leri çakışmaz
+        return ticket_id if owner_id is None else f"user-{owner_id}:{ticket_id}"
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model_name: str, ticket_id: Optional[str] = None,
+                   on_preempt: Optional[Callable[[], None]] = None, owner_id: Optional[int] = None):
+        """
+        Model + sağlayıcı slotu al, iş bitince bırak.
+
+        on_preempt verilen işler düşük önceliklidir: normal bir istek aynı kapıda beklemek
+        zorunda kalırsa on_preempt çağrılır (iş iptal edilir, slot normal isteğe geçer).
+        owner_id verilirse ticket sadece o kullanıcı tarafından sorgulanabilir.
+        """
+        ticket_id = self._ticket_key(ticket_id or uuid.uuid4().hex, owner_id)
+        model_gate = self._model_gate(provider, model_name)
+        provider_gate = self._provider_gate(provider)
+        if on_preempt is None and not self.is_idle(provider, model_name):
+            self._preempt(provider, model_name)
+        ticket = {"state": "queued", "provider": provider, "model_name": model_name, "started_at": None,
+                  "on_preempt": on_preempt, "owner_id": owner_id}
+        self._tickets[ticket_id] = ticket
+        track_queued(provider, 1)
+        try:
+            await model_gate.acquire(ticket_id)
+            try:
+                await provider_gate.acquire(ticket_id)
+                ticket["state"] = "running"
+                ticket["started_at"] = time.monotonic()
+                track_queued(provider, -1)
+                track_in_flight(provider, 1)
+                try:
+                    yield ticket_id
+                finally:
+                    track_in_flight(provider, -1)
+                    provider_gate.release()
+                    elapsed = time.monotonic() - ticket["started_at"]
+                    provider_gate.record_service_time(elapsed)
+                    model_gate.record_service_time(elapsed)
+            finally:
+                model_gate.release()
+        finally:
+            if ticket["state"] == "queued":
+                # Slot alınamadan çıkıldı (kuyruk dolu / iptal)
+                track_queued(provider, -1)
+            # Aynı id ile sonradan gelen isteğin kaydını silme
+            if self._tickets.get(ticket_id) is ticket:
+                del self._tickets[ticket_id]
+
+    def ticket_status(self, ticket_id: str, owner_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Kuyruk pozisyonu ve tahmini bekleme süresi (ticket başka kullanıcınınsa None)"""
+        key = self._ticket_key(ticket_id, owner_id)
+        ticket = self._tickets.get(key)
+        if ticket is None or ticket["owner_id"] != owner_id:
+            return None
+        if ticket["state"] == "running":
+            return {
+                "ticket_id": ticket_id,
+                "state": "running",
+                "model_name": ticket["model_name"],
+                "position": 0,
+                "eta_seconds": 0,
+                "running_for_sec": round(time.monotonic() - ticket["started_at"], 1)
+            }
+
+        model_gate = self._model_gate(ticket["provider"], ticket["model_name"])
+        provider_gate = self._provider_gate(ticket["provider"])
+        position = model_gate.position(key)
+        gate = model_gate
+        if position is None:
+            # Model kapısını geçti, sağlayıcı kapısında bekliyor
+            position = provider_gate.position(key) or 0
+            gate = provider_gate
+        return {
+            "ticket_id": ticket_id,
+            "state": "queued",
+            "model_name": ticket["model_name"],
+            "position": position + 1,
+            "eta_seconds": gate.eta_seconds(position)
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "providers": {name: gate.snapshot() for name, gate in self._provider_gates.items()},
+            "models": {name: gate.snapshot() for name, gate in self._model_gates.items()}
+        }
+
+# Global admission controller
+admission_controller = AdmissionController()
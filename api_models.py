@@ -47,6 +47,12 @@ class UserProfile(BaseModel):
     created_at: datetime
     last_login: Optional[datetime] = None
     profile_completed: bool = False
+    default_model: Optional[str] = None
+    speculative_generation: bool = False
+
+class UserPreferencesUpdate(BaseModel):
+    default_model: Optional[str] = None
+    speculative_generation: Optional[bool] = None
 
 class ProfileCompletionRequest(BaseModel):
     full_name: str
@@ -55,10 +61,20 @@ class ProfileCompletionRequest(BaseModel):
 
 
 # Request Models
+class SpeculationHint(BaseModel):
+    """Spekülatif ön üretimde kullanılacak, o ana kadar bilinen üretim girdileri"""
+    custom_input: str = ""
+    temperature: float = 0.7
+    top_p: float = 0.9
+    repetition_penalty: float = 1.2
+    system_prompt: str = ""
+    is_sms: bool = False
+
 class RequestCreate(BaseModel):
     original_text: str
     response_type: str  # positive, negative, informative, other
     is_new_request: bool = False  # Yeni istek öneri mi?
+    speculation: Optional[SpeculationHint] = None  # Opt-in kullanıcılar için; yoksa varsayılan parametreler
 
 class GenerateRequest(BaseModel):
     request_id: int
@@ -69,6 +85,20 @@ class GenerateRequest(BaseModel):
     repetition_penalty: Optional[float] = 1.2
     system_prompt: Optional[str] = ""  # Sistem promptu eklendi
     is_sms: Optional[bool] = False  # SMS yanıtı mı? (max 450 karakter)
+    no_cache: Optional[bool] = False  # True ise önbellek atlanır, yeni üretim yapılır
+    ticket_id: Optional[str] = None  # Kuyruk pozisyonu sorgulamak için istemci tarafından üretilen id
+    continue_previous: Optional[bool] = False  # True ise bu talebin son yanıtı bağlam olarak gönderilir
+
+class BatchGenerateRequest(BaseModel):
+    request_id: int
+    model_names: List[str]  # Aynı talep için karşılaştırılacak modeller
+    custom_input: str
+    temperature: Optional[float] = 0.7
+    top_p: Optional[float] = 0.9
+    repetition_penalty: Optional[float] = 1.2
+    system_prompt: Optional[str] = ""
+    is_sms: Optional[bool] = False
+    no_cache: Optional[bool] = False
 
 class FeedbackRequest(BaseModel):
     response_id: int
@@ -95,6 +125,23 @@ class GenerateResponse(BaseModel):
     response_text: str
     latency_ms: float
     created_at: datetime
+    cache_status: Optional[str] = None  # hit, miss, coalesced, bypass
+    load_duration_ms: Optional[float] = None  # Ollama cold start (model yükleme) süresi
+    tokens_used: Optional[int] = None  # Girdi + üretilen token (önbellekten dönerse boş)
+    tokens_per_second: Optional[float] = None
+    prompt_eval_ms: Optional[float] = None  # Prefill süresi; tekrar eden system promptunda düşmeli
+
+class GenerationJobStatus(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded, failed
+    request_id: int
+    model_name: str
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    response: Optional[GenerateResponse] = None  # İş başarılıysa yazılan yanıt
 
 class FeedbackResponse(BaseModel):
     success: bool
@@ -125,6 +172,20 @@ class AdminUsersResponse(BaseModel):
     users: List[UserStats]
     total_count: int
 
+class ModelUsageStats(BaseModel):
+    model_name: str
+    response_count: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    avg_tokens_per_second: Optional[float] = None
+    avg_latency_ms: Optional[float] = None
+    avg_prompt_eval_ms: Optional[float] = None
+
+class ModelUsageResponse(BaseModel):
+    models: List[ModelUsageStats]
+    since: Optional[datetime] = None
+
 # Template Models
 class TemplateCreate(BaseModel):
     title: Optional[str] = None  # Boşsa otomatik üretilecek
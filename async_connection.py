@@ -0,0 +1,89 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from connection import CheckoutTimingMixin, track_connection_hold, ReadOnlySession, engine, read_engine
+from slow_query_log import install_slow_query_log
+from read_your_writes import prefer_primary, record_read_route
+from config import (
+    DATABASE_URL,
+    DATABASE_READ_URL,
+    POSTGRES_SCHEMA_NAME,
+    DB_ASYNC_POOL_SIZE,
+    DB_ASYNC_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+)
+
+class TimedAsyncQueuePool(CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+def _async_database_url(url: str):
+    """psycopg2 URL'ini asyncpg'ye çevir; asyncpg ?options= parametresini tanımaz (search_path server_settings ile)"""
+    return make_url(url).set(drivername="postgresql+asyncpg").difference_update_query(["options"])
+
+# connection.py ile aynı search_path kuralı
+_connect_args = {}
+if POSTGRES_SCHEMA_NAME != "ai_helper":
+    _connect_args = {"server_settings": {"search_path": POSTGRES_SCHEMA_NAME}}
+
+def _create_async_engine(url: str, explain_engine):
+    # Sync pool'dan ayrı bütçe (DB_ASYNC_*); timeout/recycle/pre-ping ayarları ortak
+    async_engine = create_async_engine(
+        _async_database_url(url),
+        connect_args=_connect_args,
+        poolclass=TimedAsyncQueuePool,
+        pool_size=DB_ASYNC_POOL_SIZE,
+        max_overflow=DB_ASYNC_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    track_connection_hold(async_engine.sync_engine.pool)
+    # Yavaş sorgu EXPLAIN'i aynı veritabanının psycopg2 engine'inden (primary -> primary, replika -> replika)
+    install_slow_query_log(async_engine.sync_engine, explain_engine)
+    return async_engine
+
+async_engine = _create_async_engine(DATABASE_URL, engine)
+# Okuma replikası (DATABASE_READ_URL); ayarlı değilse primary
+async_read_engine = _create_async_engine(DATABASE_READ_URL, read_engine) if DATABASE_READ_URL else async_engine
+
+# expire_on_commit=False: commit sonrası nesne alanlarına erişim lazy load (await dışı IO) tetiklemesin
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, class_=AsyncSession, sync_session_class=ReadOnlySession, autoflush=False, expire_on_commit=False
+)
+
+# Dependency for async database sessions
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency for async read-only sessions
+async def get_async_read_db():
+    """get_read_db'nin async karşılığı (replika, read-your-writes penceresinde primary)"""
+    use_primary = prefer_primary()
+    record_read_route("primary" if use_primary else "replica")
+    session_factory = AsyncSessionLocal if use_primary else AsyncReadSessionLocal
+    async with session_factory() as db:
+        yield db
+
+async def release_async_connection(db: AsyncSession):
+    """release_connection'ın async karşılığı: uzun await'lerden önce bağlantıyı pool'a iade et"""
+    await db.close()
+
+async def prewarm_async_pool(count: int = DB_ASYNC_POOL_SIZE):
+    for target in [async_engine] + ([async_read_engine] if async_read_engine is not async_engine else []):
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(await target.connect())
+        finally:
+            for connection in connections:
+                await connection.close()
+        print(f"✅ Async DB pool hazır ({target.url.host}): {len(connections)} bağlantı ({target.pool.status()})")
+
+async def dispose_async_engines():
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
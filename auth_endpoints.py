@@ -10,9 +10,9 @@ import hashlib
 import secrets
 import os
 
-from connection import get_db
+from connection import get_db, get_read_db
 from models import User, LoginToken, LoginAttempt, Request as DBRequest, Response as DBResponse
-from auth_system import auth_service, get_current_user, get_client_ip, security
+from auth_system import auth_service, get_current_user, get_current_user_async, get_client_ip, security
 from api_models import (
     LoginRequest, 
     LoginResponse, 
@@ -21,10 +21,13 @@ from api_models import (
     TokenConsumeRequest,
     TokenConsumeResponse,
     UserProfile,
+    UserPreferencesUpdate,
     ProfileCompletionRequest,
     AdminStats,
     AdminUsersResponse,
     UserStats,
+    ModelUsageStats,
+    ModelUsageResponse,
 )
 from config import PRODUCTION_URL, FRONTEND_URL
 
@@ -388,7 +391,42 @@ async def get_user_profile(current_user: User = Depends(get_current_user)):
         is_active=current_user.is_active,
         created_at=current_user.created_at,
         last_login=current_user.last_login,
-        profile_completed=current_user.profile_completed or False
+        profile_completed=current_user.profile_completed or False,
+        default_model=current_user.default_model,
+        speculative_generation=current_user.speculative_generation or False
+    )
+
+@auth_router.put("/preferences", response_model=UserProfile)
+async def update_user_preferences(
+    preferences: UserPreferencesUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Varsayılan model ve spekülatif ön üretim tercihini güncelle
+    """
+    user = db.query(User).filter(User.id == current_user.id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
+    
+    if preferences.default_model is not None:
+        user.default_model = preferences.default_model or None
+    if preferences.speculative_generation is not None:
+        user.speculative_generation = preferences.speculative_generation
+    db.commit()
+    db.refresh(user)
+    
+    return UserProfile(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name,
+        department=user.department,
+        is_active=user.is_active,
+        created_at=user.created_at,
+        last_login=user.last_login,
+        profile_completed=user.profile_completed or False,
+        default_model=user.default_model,
+        speculative_generation=user.speculative_generation or False
     )
 
 @auth_router.post("/verify-code", response_model=CodeVerifyResponse)
@@ -614,7 +652,7 @@ async def get_rate_limit_status(email: str):
 @auth_router.get("/admin/stats", response_model=AdminStats)
 async def get_admin_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get admin statistics (only for admin users)
@@ -634,11 +672,13 @@ async def get_admin_stats(
         # Yeni istek öneri sayısı (cevaplanan istek öneri sayısı)
         new_requests = db.query(DBRequest).filter(DBRequest.is_new_request == True).count()
         
+        total_tokens = db.query(func.coalesce(func.sum(DBResponse.tokens_used), 0)).scalar()
+        
         return AdminStats(
             total_users=total_users,
             total_requests=total_requests,
             total_responses=new_requests,  # Yeni istek öneri sayısı
-            total_tokens=0,  # Token kullanımı kaldırıldı
+            total_tokens=int(total_tokens or 0),
             active_users_today=0,  # Kaldırıldı
             requests_today=0  # Kaldırıldı
         )
@@ -653,7 +693,7 @@ async def get_admin_stats(
 @auth_router.get("/admin/users", response_model=AdminUsersResponse)
 async def get_admin_users(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     skip: int = 0,
     limit: int = 100
 ):
@@ -673,34 +713,46 @@ async def get_admin_users(
         # Kullanıcıları ve istatistiklerini al
         users = db.query(User).offset(skip).limit(limit).all()
         
+        # Kullanıcı başına yanıt sayısı, token toplamı ve son yanıt zamanı tek sorguda
+        user_ids = [user.id for user in users]
+        response_stats = {
+            user_id: (response_count, tokens, last_response_at)
+            for user_id, response_count, tokens, last_response_at in (
+                db.query(
+                    DBRequest.user_id,
+                    func.count(DBResponse.id),
+                    func.coalesce(func.sum(DBResponse.tokens_used), 0),
+                    func.max(DBResponse.created_at)
+                )
+                .join(DBResponse, DBResponse.request_id == DBRequest.id)
+                .filter(DBRequest.user_id.in_(user_ids))
+                .group_by(DBRequest.user_id)
+                .all()
+            )
+        } if user_ids else {}
+        # Kullanıcı başına son istek zamanı
+        last_request_at = dict(
+            db.query(DBRequest.user_id, func.max(DBRequest.created_at))
+            .filter(DBRequest.user_id.in_(user_ids))
+            .group_by(DBRequest.user_id)
+            .all()
+        ) if user_ids else {}
+        
+        from datetime import timezone
+        
         user_stats = []
         for user in users:
             # Kullanıcının ürettiği yanıt sayısı (veritabanındaki total_requests field'inden)
             total_requests = user.total_requests
 
-            # Kullanıcının ürettiği Response satırları sayısı
-            total_responses = (
-                db.query(DBResponse)
-                .join(DBRequest, DBRequest.id == DBResponse.request_id)
-                .filter(DBRequest.user_id == user.id)
-                .count()
-            )
+            # Kullanıcının ürettiği Response satırları sayısı, token toplamı, son yanıt
+            total_responses, total_tokens, last_response = response_stats.get(user.id, (0, 0, None))
 
             # Kullanıcının cevapladığı istek sayısı (veritabanındaki answered_requests field'inden)
             answered_requests = user.answered_requests
             
-            logger.info(f"User {user.email}: total_requests={total_requests}, answered_requests={answered_requests}")
-            
             # Son aktivite (en son istek veya yanıt)
-            from datetime import timezone, datetime as dt
-            
-            last_request = db.query(DBRequest).filter(DBRequest.user_id == user.id).order_by(
-                DBRequest.created_at.desc()
-            ).first()
-            
-            last_response = db.query(DBResponse).join(DBRequest).filter(
-                DBRequest.user_id == user.id
-            ).order_by(DBResponse.created_at.desc()).first()
+            last_request = last_request_at.get(user.id)
             
             # Datetime'ları timezone-aware yap
             def make_aware(dt_val):
@@ -714,9 +766,9 @@ async def get_admin_users(
             if user.last_login:
                 dates.append(make_aware(user.last_login))
             if last_request:
-                dates.append(make_aware(last_request.created_at))
+                dates.append(make_aware(last_request))
             if last_response:
-                dates.append(make_aware(last_response.created_at))
+                dates.append(make_aware(last_response))
             
             last_activity = max(dates) if dates else datetime.min.replace(tzinfo=timezone.utc)
             
@@ -728,7 +780,7 @@ async def get_admin_users(
                 total_requests=total_requests,
                 total_responses=total_responses,
                 answered_requests=answered_requests,  # Cevapladığı istek sayısı
-                total_tokens=0,  # Token kullanımı kaldırıldı
+                total_tokens=int(total_tokens),
                 last_activity=last_activity,
                 is_active=user.is_active
             ))
@@ -746,6 +798,65 @@ async def get_admin_users(
         )
 
 
+@auth_router.get("/admin/usage/models", response_model=ModelUsageResponse)
+async def get_model_usage(
+    days: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Model bazında token kullanımı ve üretim hızı (only for admin users)
+    
+    days verilirse sadece son N gündeki yanıtlar sayılır.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Bu işlem için admin yetkisi gerekli"
+        )
+    
+    try:
+        query = db.query(
+            DBResponse.model_name,
+            func.count(DBResponse.id),
+            func.coalesce(func.sum(DBResponse.prompt_tokens), 0),
+            func.coalesce(func.sum(DBResponse.completion_tokens), 0),
+            func.coalesce(func.sum(DBResponse.tokens_used), 0),
+            func.avg(DBResponse.tokens_per_second),
+            func.avg(DBResponse.latency_ms),
+            func.avg(DBResponse.prompt_eval_ms)
+        )
+        since = None
+        if days:
+            since = datetime.utcnow() - timedelta(days=days)
+            query = query.filter(DBResponse.created_at >= since)
+        rows = query.group_by(DBResponse.model_name).order_by(
+            func.coalesce(func.sum(DBResponse.tokens_used), 0).desc()
+        ).all()
+        
+        return ModelUsageResponse(
+            models=[
+                ModelUsageStats(
+                    model_name=model_name,
+                    response_count=response_count,
+                    prompt_tokens=int(prompt_tokens),
+                    completion_tokens=int(completion_tokens),
+                    total_tokens=int(total_tokens),
+                    avg_tokens_per_second=round(float(avg_tps), 2) if avg_tps is not None else None,
+                    avg_latency_ms=round(float(avg_latency), 1) if avg_latency is not None else None,
+                    avg_prompt_eval_ms=round(float(avg_prompt_eval), 1) if avg_prompt_eval is not None else None
+                )
+                for model_name, response_count, prompt_tokens, completion_tokens, total_tokens, avg_tps, avg_latency, avg_prompt_eval in rows
+            ],
+            since=since
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in get_model_usage: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Model kullanım bilgileri alınırken hata oluştu"
+        )
 
 @auth_router.post("/verify-token")
 async def verify_token(request: dict, db: Session = Depends(get_db)):
@@ -9,7 +9,9 @@ from fastapi.security import HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from connection import get_db
+from async_connection import get_async_db
 from models import User, LoginAttempt, LoginToken
 import smtplib
 from email.mime.multipart import MIMEMultipart
@@ -18,6 +20,7 @@ from email.mime.base import MIMEBase
 from email import encoders
 import logging
 from config import settings, PRODUCTION_URL, RATE_LIMIT_LOGIN_SECONDS, RATE_LIMIT_DAILY_LOGINS
+from metrics import smtp_send_timer
 
 # Logging configuration
 logging.basicConfig(level=logging.INFO)
@@ -249,21 +252,22 @@ class AuthService:
             logger.debug("Email content prepared, attempting SMTP connection...")
             
             # SMTP connection
-            server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
-            logger.debug(f"SMTP connection established to {SMTP_HOST}:{SMTP_PORT}")
-            
-            server.starttls()
-            logger.debug("TLS started")
-            
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            logger.debug("SMTP authentication successful")
-            
-            text = msg.as_string()
-            server.sendmail(SENDER_EMAIL, email, text)
-            logger.debug(f"Email sent successfully to {email}")
-            
-            server.quit()
-            logger.debug("SMTP connection closed")
+            with smtp_send_timer():
+                server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+                logger.debug(f"SMTP connection established to {SMTP_HOST}:{SMTP_PORT}")
+                
+                server.starttls()
+                logger.debug("TLS started")
+                
+                server.login(SMTP_USERNAME, SMTP_PASSWORD)
+                logger.debug("SMTP authentication successful")
+                
+                text = msg.as_string()
+                server.sendmail(SENDER_EMAIL, email, text)
+                logger.debug(f"Email sent successfully to {email}")
+                
+                server.quit()
+                logger.debug("SMTP connection closed")
             
             logger.info(f"Magic link email sent to {email}")
             return True
@@ -401,7 +405,7 @@ class AuthService:
             msg.attach(MIMEText(html_content, 'html', 'utf-8'))
             
             # Send email
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
+            with smtp_send_timer(), smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
                 server.starttls()
                 server.login(SMTP_USERNAME, SMTP_PASSWORD)
                 server.send_message(msg)
@@ -505,6 +509,32 @@ def get_current_user(token = Depends(security), db: Session = Depends(get_db)):
         logger.error(f"Error in get_current_user: {str(e)}")
         raise credentials_exception
 
+async def get_current_user_async(token = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    """get_current_user'ın AsyncSession karşılığı (event loop'u bloklamaz)"""
+    credentials_exception = HTTPException(
+        status_code=401,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    payload = auth_service.verify_token(token.credentials)
+    if payload is None or payload.get("sub") is None:
+        raise credentials_exception
+    
+    try:
+        user = await db.get(User, int(payload["sub"]))
+    except ValueError:
+        logger.error(f"Invalid user ID format: {payload['sub']}")
+        raise credentials_exception
+    except Exception as e:
+        logger.error(f"Error in get_current_user_async: {str(e)}")
+        raise credentials_exception
+    
+    if user is None:
+        logger.error(f"User with ID {payload['sub']} not found in database")
+        raise credentials_exception
+    return user
+
 def get_client_ip(request: Request) -> str:
     """Get client IP address"""
     # Check for forwarded headers (Cloudflare)
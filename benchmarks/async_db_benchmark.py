@@ -0,0 +1,136 @@
+"""
+Sync vs async DB katmanı - worker başına eşzamanlılık karşılaştırması.
+
+Tek event loop'ta (bir uvicorn worker'ı gibi) artan sayıda eşzamanlı "istek" çalıştırılır.
+Her istek, /templates benzeri sorgular yapar:
+- sync:  async fonksiyon içinde SessionLocal ile (eski endpoint'ler gibi; loop sorgu boyunca bloklanır)
+- async: AsyncSessionLocal ile (asyncpg; sorgu beklerken loop diğer istekleri çalıştırır)
+
+Her eşzamanlılık seviyesi için throughput, p50/p95 gecikme ve en büyük event loop gecikmesi raporlanır.
+--rtt-ms, her sorguya pg_sleep ile ağ gecikmesi ekler (yerel PostgreSQL'de uzak DB'yi taklit eder).
+
+Örnek (yerel PostgreSQL):
+    python benchmarks/async_db_benchmark.py --concurrency 1 8 32 64 --requests 400 --rtt-ms 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, Any, List
+
+# Proje kök dizinindeki modüller (connection, async_connection, models) için
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import percentile
+
+def build_queries(rtt_ms: float):
+    from sqlalchemy import select, text
+    from sqlalchemy.orm import joinedload
+    from models import Template
+
+    queries = [
+        select(Template).options(joinedload(Template.owner), joinedload(Template.category))
+        .where(Template.is_active == True).order_by(Template.created_at.desc()).limit(50)
+    ]
+    if rtt_ms > 0:
+        queries.insert(0, text("SELECT pg_sleep(:seconds)").bindparams(seconds=rtt_ms / 1000))
+    return queries
+
+async def run_sync_request(queries, repeat: int):
+    from connection import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for _ in range(repeat):
+            for query in queries:
+                db.execute(query).all()
+    finally:
+        db.close()
+
+async def run_async_request(queries, repeat: int):
+    from async_connection import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeat):
+            for query in queries:
+                (await db.execute(query)).all()
+
+async def measure_loop_lag(stop: asyncio.Event, lags: List[float], interval: float = 0.01):
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - before - interval))
+
+async def run_level(mode: str, concurrency: int, total_requests: int, queries, repeat: int) -> Dict[str, Any]:
+    runner = run_sync_request if mode == "sync" else run_async_request
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    lags: List[float] = []
+
+    async def one_request():
+        async with semaphore:
+            start = time.perf_counter()
+            await runner(queries, repeat)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(total_requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "rps": round(total_requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "max_loop_lag_ms": round(max(lags, default=0.0) * 1000, 1),
+    }
+
+async def run(args) -> List[Dict[str, Any]]:
+    from async_connection import async_engine
+
+    queries = build_queries(args.rtt_ms)
+    # Isınma: iki pool da bağlantı açmış olsun
+    await run_sync_request(queries, 1)
+    await run_async_request(queries, 1)
+
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            for mode in ("sync", "async"):
+                result = await run_level(mode, concurrency, args.requests, queries, args.repeat)
+                results.append(result)
+                print(f"{mode:<6} c={concurrency:<4} {result['rps']:>8} req/s  p50={result['p50_ms']:>7} ms  "
+                      f"p95={result['p95_ms']:>7} ms  max loop lag={result['max_loop_lag_ms']:>7} ms")
+    finally:
+        await async_engine.dispose()
+    return results
+
+def print_summary(results: List[Dict[str, Any]]):
+    print(f"\n{'concurrency':>11} {'sync req/s':>11} {'async req/s':>12} {'speedup':>8}")
+    by_level: Dict[int, Dict[str, Dict[str, Any]]] = {}
+    for result in results:
+        by_level.setdefault(result["concurrency"], {})[result["mode"]] = result
+    for concurrency, modes in sorted(by_level.items()):
+        sync_rps, async_rps = modes["sync"]["rps"], modes["async"]["rps"]
+        speedup = async_rps / sync_rps if sync_rps else 0.0
+        print(f"{concurrency:>11} {sync_rps:>11} {async_rps:>12} {speedup:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async DB katmanı eşzamanlılık karşılaştırması")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=400, help="Seviye başına toplam istek")
+    parser.add_argument("--repeat", type=int, default=2, help="İstek başına sorgu turu (auth + liste gibi)")
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="Sorgu başına eklenen ağ gecikmesi (pg_sleep)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_summary(results)
+
+if __name__ == "__main__":
+    main()
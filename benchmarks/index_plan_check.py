@@ -0,0 +1,242 @@
+"""
+İndeks planı kontrolü - sıcak sorguların milyon satırlık veride indeks kullandığını doğrular.
+
+requests / responses / login_tokens tablolarına generate_series ile test verisi eklenir
+(varsayılan: 1.000.000 yanıt, 500.000 talep, 1.000.000 login token), ANALYZE çalıştırılır ve
+endpoint'lerdeki sorguların EXPLAIN (FORMAT JSON) planı incelenir:
+- Beklenen indeks bir Index Scan / Index Only Scan / Bitmap Index Scan düğümünde kullanılmalı
+- Sıcak tablolarda Seq Scan olmamalı
+- Sıralı sorgularda (geçmiş, son yanıt) ayrı Sort düğümü olmamalı (bileşik indeks sırayı verir)
+
+Önce migration'ı çalıştırın (python migrate_performance.py). Plan beklentiyi karşılamazsa
+çıkış kodu 1 olur (CI için).
+
+Örnek:
+    python benchmarks/index_plan_check.py
+    python benchmarks/index_plan_check.py --rows 200000 --users 500
+
+Script DATABASE_URL veritabanına test verisi yazar; production veritabanına karşı çalıştırmayın.
+"""
+import argparse
+import hashlib
+import os
+import sys
+from typing import Dict, Any, List, Optional, Tuple
+
+# Proje kök dizinindeki modüller (connection, models) için
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_EMAIL_PREFIX = "indexplan"
+BENCH_EMAIL_DOMAIN = "nilufer.bel.tr"
+BENCH_DEPARTMENT = "İndeks Planı Müdürlüğü"
+BENCH_MODEL = "index-plan-model"
+
+INDEX_NODE_TYPES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+HOT_TABLES = {"requests", "responses", "login_tokens"}
+
+SEED_USERS_SQL = """
+    INSERT INTO users (email, full_name, department, is_active, profile_completed, is_admin, speculative_generation)
+    SELECT :prefix || '-' || g || '@' || :domain, 'İndeks Planı ' || g, :department, true, true, false, false
+    FROM generate_series(1, :users) g
+    ON CONFLICT (email) DO NOTHING
+"""
+
+SEED_REQUESTS_SQL = """
+    INSERT INTO requests (user_id, original_text, response_type, created_at, is_new_request)
+    SELECT u.ids[1 + g % u.n], 'Sokağımızdaki lambalar yanmıyor (' || g || ')', 'informative',
+           now() - g * interval '1 second', false
+    FROM generate_series(1, :requests) g,
+         (SELECT array_agg(id ORDER BY id) AS ids, count(*) AS n FROM users WHERE department = :department) u
+"""
+
+# Talep başına iki yanıt; yaklaşık %1'i kopyalanmış (kısmi indeks küçük kalır)
+SEED_RESPONSES_SQL = """
+    INSERT INTO responses (request_id, model_name, response_text, temperature, top_p, repetition_penalty,
+                           is_selected, copied, created_at, latency_ms, tokens_used)
+    SELECT r.id, :model, 'Ekiplerimiz bölgeye yönlendirildi.', 0.7, 0.9, 1.1,
+           false, (r.id % 50 = 0 AND v = 1), r.created_at + v * interval '1 second', 100, 50
+    FROM requests r
+    JOIN users u ON u.id = r.user_id
+    CROSS JOIN generate_series(1, 2) v
+    WHERE u.department = :department
+"""
+
+SEED_TOKENS_SQL = """
+    INSERT INTO login_tokens (email, token_hash, code_hash, expires_at, ip_created, attempt_count)
+    SELECT :prefix || '-' || (g % :users) || '@' || :domain, md5('token-' || g), md5('code-' || g),
+           now() + (g % 600 - 300) * interval '1 second', '127.0.0.1', 0
+    FROM generate_series(1, :tokens) g
+"""
+
+def md5_hex(value: str) -> str:
+    return hashlib.md5(value.encode()).hexdigest()
+
+def seed_dataset(conn, args):
+    """Test verisi yoksa ekle (tekrar çalıştırmada mevcut veri kullanılır)"""
+    from sqlalchemy import text
+
+    params = {
+        "prefix": BENCH_EMAIL_PREFIX,
+        "domain": BENCH_EMAIL_DOMAIN,
+        "department": BENCH_DEPARTMENT,
+        "model": BENCH_MODEL,
+        "users": args.users,
+        "requests": args.rows // 2,
+        "tokens": args.token_rows,
+    }
+
+    conn.execute(
+        text("INSERT INTO models (name, display_name, supports_embedding, supports_chat) "
+             "VALUES (:model, :model, false, true) ON CONFLICT (name) DO NOTHING"),
+        params
+    )
+    conn.execute(text(SEED_USERS_SQL), params)
+
+    existing = conn.execute(
+        text("SELECT count(*) FROM requests r JOIN users u ON u.id = r.user_id WHERE u.department = :department"),
+        params
+    ).scalar()
+    if existing == 0:
+        print(f"➡️  {params['requests']} talep ve {params['requests'] * 2} yanıt ekleniyor...")
+        conn.execute(text(SEED_REQUESTS_SQL), params)
+        conn.execute(text(SEED_RESPONSES_SQL), params)
+
+    existing = conn.execute(
+        text("SELECT count(*) FROM login_tokens WHERE email LIKE :prefix || '-%@' || :domain"), params
+    ).scalar()
+    if existing == 0:
+        print(f"➡️  {params['tokens']} login token ekleniyor...")
+        conn.execute(text(SEED_TOKENS_SQL), params)
+
+    for table in sorted(HOT_TABLES):
+        conn.execute(text(f"ANALYZE {table}"))
+
+def build_checks(conn) -> List[Tuple[str, Any, str, bool]]:
+    """(ad, sorgu, beklenen indeks, Sort olmamalı mı) - sorgular endpoint'lerdekiyle aynı biçimde"""
+    from sqlalchemy import select, func, text
+    from models import Request, Response, LoginToken, User
+
+    user_ids = conn.execute(
+        select(User.id).where(User.department == BENCH_DEPARTMENT).order_by(User.id).limit(20)
+    ).scalars().all()
+    user_id = user_ids[0]
+    request_ids = conn.execute(
+        select(Request.id).where(Request.user_id == user_id).order_by(Request.created_at.desc()).limit(50)
+    ).scalars().all()
+    copied_request_id = conn.execute(
+        text("SELECT request_id FROM responses WHERE copied = true AND model_name = :model LIMIT 1"),
+        {"model": BENCH_MODEL}
+    ).scalar()
+
+    return [
+        (
+            "history: kullanıcının talepleri",
+            select(Request.id).where(Request.user_id == user_id)
+            .order_by(Request.created_at.desc()).offset(0).limit(50),
+            "idx_requests_user_created", True,
+        ),
+        (
+            "history: sayfadaki yanıtlar",
+            select(Response).where(Response.request_id.in_(request_ids)).order_by(Response.created_at.desc()),
+            "idx_responses_request_created", False,
+        ),
+        (
+            "generate: önceki yanıt (devam)",
+            select(Response).where(Response.request_id == request_ids[0])
+            .order_by(Response.created_at.desc()).limit(1),
+            "idx_responses_request_created", True,
+        ),
+        (
+            "has-copied-response",
+            select(Response).where(Response.request_id == copied_request_id, Response.copied == True).limit(1),
+            "idx_responses_request_copied", False,
+        ),
+        (
+            "admin/users: son talep zamanı",
+            select(Request.user_id, func.max(Request.created_at))
+            .where(Request.user_id.in_(user_ids)).group_by(Request.user_id),
+            "idx_requests_user_created", False,
+        ),
+        (
+            "admin/users: yanıt istatistikleri (join)",
+            select(Request.user_id, func.count(Response.id), func.max(Response.created_at))
+            .join(Response, Response.request_id == Request.id)
+            .where(Request.user_id.in_(user_ids)).group_by(Request.user_id),
+            "idx_responses_request_created", False,
+        ),
+        (
+            "login: token doğrulama",
+            select(LoginToken).where(LoginToken.token_hash == md5_hex("token-1"), LoginToken.expires_at > func.now())
+            .limit(1),
+            "idx_login_tokens_token_hash", False,
+        ),
+        (
+            "login: kod doğrulama",
+            select(LoginToken).where(
+                LoginToken.code_hash == md5_hex("code-1"),
+                LoginToken.email == f"{BENCH_EMAIL_PREFIX}-1@{BENCH_EMAIL_DOMAIN}",
+                LoginToken.expires_at > func.now(),
+                LoginToken.used_at.is_(None)
+            ).limit(1),
+            "idx_login_tokens_code_hash", False,
+        ),
+    ]
+
+def walk_plan(node: Dict[str, Any], found: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    found = [] if found is None else found
+    found.append(node)
+    for child in node.get("Plans", []):
+        walk_plan(child, found)
+    return found
+
+def explain(conn, statement) -> List[Dict[str, Any]]:
+    from sqlalchemy import text
+
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    return walk_plan(plan[0]["Plan"])
+
+def check_plan(nodes: List[Dict[str, Any]], expected_index: str, forbid_sort: bool) -> List[str]:
+    problems = []
+    used = {node.get("Index Name") for node in nodes if node["Node Type"] in INDEX_NODE_TYPES}
+    if expected_index not in used:
+        problems.append(f"{expected_index} kullanılmadı")
+    seq_scans = sorted({node.get("Relation Name") for node in nodes
+                        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in HOT_TABLES})
+    if seq_scans:
+        problems.append(f"Seq Scan: {', '.join(seq_scans)}")
+    if forbid_sort and any(node["Node Type"] in ("Sort", "Incremental Sort") for node in nodes):
+        problems.append("Sort düğümü var (indeks sırası kullanılmadı)")
+    return problems
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sıcak sorguların indeks kullanımı (EXPLAIN) kontrolü")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Yanıt satırı (talep = rows / 2)")
+    parser.add_argument("--token-rows", type=int, default=1_000_000, help="login_tokens satırı")
+    parser.add_argument("--users", type=int, default=1000, help="Test kullanıcısı sayısı")
+    args = parser.parse_args()
+
+    from connection import engine
+
+    with engine.begin() as conn:
+        seed_dataset(conn, args)
+
+    failures = []
+    with engine.connect() as conn:
+        for name, statement, expected_index, forbid_sort in build_checks(conn):
+            nodes = explain(conn, statement)
+            problems = check_plan(nodes, expected_index, forbid_sort)
+            indexes = sorted({node["Index Name"] for node in nodes if node.get("Index Name")})
+            print(f"{'✅' if not problems else '❌'} {name:<42} {', '.join(indexes) or '-'}")
+            failures.extend(f"{name}: {problem}" for problem in problems)
+
+    if failures:
+        print("\n❌ İndeks planı beklentiyi karşılamadı:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\n✅ Tüm sıcak sorgular indeks kullanıyor")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
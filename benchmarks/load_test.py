@@ -0,0 +1,339 @@
+"""
+Uçtan uca yük testi - gerçekçi belediye iş akışlarını çalışan uygulamaya karşı oynatır.
+
+Akışlar (her sanal kullanıcı için):
+- Giriş: /auth/send + /auth/verify-code (kod, test veritabanına bilinen değerle yazılır)
+- Talep: /requests -> /generate xN -> /responses/{id}/mark-copied
+- Şablon gezinme: /templates?q= ve /categories
+- Admin panelleri (admin sanal kullanıcılar): /auth/admin/stats, /auth/admin/users, ...
+
+Rota başına throughput ve p50/p95/p99 raporlanır; --baseline ile kayıtlı sonuçla
+karşılaştırılır, gerileme varsa çıkış kodu 1 olur (CI için).
+
+Örnek (yerel veritabanı + stub_llm_server.py ile):
+    python stub_llm_server.py --port 11435 &
+    OLLAMA_HOST=http://localhost:11435 uvicorn main:app --port 8000 &
+    python benchmarks/load_test.py --users 20 --duration 60 --save-baseline benchmarks/baseline.json
+    python benchmarks/load_test.py --users 20 --duration 60 --baseline benchmarks/baseline.json
+
+Script, uygulamayla aynı DATABASE_URL'e bağlanır (test kullanıcıları ve giriş kodları için);
+production veritabanına karşı çalıştırmayın.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import secrets
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import httpx
+
+# Proje kök dizinindeki modüller (connection, models) için
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_EMAIL_PREFIX = "loadtest"
+BENCH_EMAIL_DOMAIN = "nilufer.bel.tr"
+BENCH_DEPARTMENT = "Yük Testi Müdürlüğü"
+
+# Vatandaş talepleri ve personel taslakları (gerçekçi uzunlukta örnekler)
+SAMPLE_REQUESTS = [
+    "Sokağımızdaki sokak lambaları iki haftadır yanmıyor, akşamları yürümek tehlikeli hale geldi.",
+    "Parkta bulunan çocuk oyun gruplarının bazı parçaları kırık, çocuklar için risk oluşturuyor.",
+    "Mahallemizde çöpler düzenli toplanmıyor, konteynerlerin etrafı kötü kokuyor.",
+    "Evimizin önündeki kaldırım taşları yerinden çıkmış, yaşlılar düşme tehlikesi yaşıyor.",
+    "Caddemizdeki yol çalışması uzun süredir bitmedi, trafik ve toz sorunu yaşıyoruz.",
+    "Sokak hayvanları için mahallemize mama ve su kabı konulmasını talep ediyoruz.",
+]
+SAMPLE_DRAFTS = [
+    "Ekiplerimiz bölgeye yönlendirildi, arıza en kısa sürede giderilecek.",
+    "Talebiniz ilgili müdürlüğe iletildi, yerinde inceleme yapılacak.",
+    "Konu programımıza alındı, çalışma önümüzdeki hafta tamamlanacak.",
+    "Bildiriminiz için teşekkür ederiz, gerekli düzenleme yapılacaktır.",
+]
+TEMPLATE_QUERIES = ["lamba", "çöp", "park", "yol", "kaldırım", "teşekkür", "inceleme"]
+
+class Recorder:
+    """Rota başına gecikme örnekleri, durum kodları ve hatalar"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client: httpx.AsyncClient, method: str, route: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """İsteği gönder ve rota etiketiyle ölç (route: '/responses/{id}/mark-copied' gibi şablon)"""
+        label = f"{method} {route}"
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.samples[label].append((time.perf_counter() - start) * 1000)
+            self.errors[label] += 1
+            self.status_codes[label][0] += 1
+            print(f"⚠️ {label}: {type(e).__name__}: {e}")
+            return None
+        self.samples[label].append((time.perf_counter() - start) * 1000)
+        self.status_codes[label][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank yüzdelik"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+def summarize(recorder: Recorder, duration_sec: float) -> Dict[str, Any]:
+    routes = {}
+    for label, values in sorted(recorder.samples.items()):
+        routes[label] = {
+            "count": len(values),
+            "errors": recorder.errors.get(label, 0),
+            "error_rate": round(recorder.errors.get(label, 0) / len(values), 4),
+            "rps": round(len(values) / duration_sec, 2),
+            "mean_ms": round(sum(values) / len(values), 1),
+            "p50_ms": round(percentile(values, 50), 1),
+            "p95_ms": round(percentile(values, 95), 1),
+            "p99_ms": round(percentile(values, 99), 1),
+            "max_ms": round(max(values), 1),
+            "status_codes": {str(code): count for code, count in sorted(recorder.status_codes[label].items())}
+        }
+    total = sum(route["count"] for route in routes.values())
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "duration_sec": round(duration_sec, 1),
+        "total_requests": total,
+        "throughput_rps": round(total / duration_sec, 2) if duration_sec else 0.0,
+        "routes": routes
+    }
+
+def print_report(summary: Dict[str, Any]):
+    print()
+    print(f"Süre: {summary['duration_sec']} sn | Toplam istek: {summary['total_requests']} | Throughput: {summary['throughput_rps']} req/s")
+    header = f"{'Rota':<45} {'adet':>6} {'hata':>5} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(header)
+    print("-" * len(header))
+    for label, route in summary["routes"].items():
+        print(f"{label:<45} {route['count']:>6} {route['errors']:>5} {route['rps']:>7} "
+              f"{route['p50_ms']:>8} {route['p95_ms']:>8} {route['p99_ms']:>8} {route['max_ms']:>8}")
+
+def compare_with_baseline(summary: Dict[str, Any], baseline: Dict[str, Any], threshold_pct: float, min_delta_ms: float) -> List[str]:
+    """Baseline'a göre p95/p99 artışı, hata oranı artışı ve throughput düşüşünü listele"""
+    regressions = []
+    factor = 1 + threshold_pct / 100
+    for label, route in summary["routes"].items():
+        base = baseline.get("routes", {}).get(label)
+        if base is None:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if route[metric] > base[metric] * factor and route[metric] - base[metric] >= min_delta_ms:
+                regressions.append(f"{label} {metric}: {base[metric]} -> {route[metric]} ms")
+        if route["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{label} error_rate: {base['error_rate']} -> {route['error_rate']}")
+    base_rps = baseline.get("throughput_rps") or 0
+    if base_rps and summary["throughput_rps"] < base_rps / factor:
+        regressions.append(f"throughput: {base_rps} -> {summary['throughput_rps']} req/s")
+    return regressions
+
+# ---- Test verisi (uygulamanın veritabanına doğrudan yazılır) ----
+
+def bench_email(kind: str, index: int) -> str:
+    return f"{BENCH_EMAIL_PREFIX}-{kind}-{index}@{BENCH_EMAIL_DOMAIN}"
+
+def seed_users(staff_emails: List[str], admin_emails: List[str]):
+    """Profili tamamlanmış test kullanıcıları (admin bayrağıyla birlikte)"""
+    import models
+    from connection import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for email in staff_emails + admin_emails:
+            user = db.query(models.User).filter(models.User.email == email).first()
+            if user is None:
+                user = models.User(email=email, full_name="", department="")
+                db.add(user)
+            user.full_name = email.split("@")[0]
+            user.department = BENCH_DEPARTMENT
+            user.is_active = True
+            user.profile_completed = True
+            user.is_admin = email in admin_emails
+        db.commit()
+    finally:
+        db.close()
+
+def seed_login_code(email: str) -> str:
+    """/auth/verify-code için bilinen bir kod yaz (e-postadaki kod okunamadığından)"""
+    import models
+    from connection import SessionLocal
+
+    code = secrets.token_hex(3)[:6].upper()
+    db = SessionLocal()
+    try:
+        db.add(models.LoginToken(
+            email=email,
+            token_hash=hashlib.sha256(secrets.token_urlsafe(32).encode()).hexdigest(),
+            code_hash=hashlib.sha256(code.encode()).hexdigest(),
+            expires_at=datetime.utcnow() + timedelta(hours=1),
+            ip_created="127.0.0.1",
+            user_agent_created="load_test",
+            attempt_count=0
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return code
+
+# ---- İş akışları ----
+
+async def login(client: httpx.AsyncClient, recorder: Recorder, email: str, send_email: bool) -> Optional[str]:
+    if send_email:
+        # SMTP yerel bir sink'e (ör. MailHog) yönlendirilmediyse 500 döner; kod yine de veritabanından gelir
+        await recorder.call(client, "POST", "/auth/send", "/auth/send", json={"email": email})
+    code = await asyncio.to_thread(seed_login_code, email)
+    response = await recorder.call(client, "POST", "/auth/verify-code", "/auth/verify-code", json={"email": email, "code": code})
+    if response is None or response.status_code != 200:
+        print(f"❌ Giriş başarısız: {email} ({response.status_code if response is not None else 'bağlantı hatası'})")
+        return None
+    return response.json()["access_token"]
+
+async def setup_templates(client: httpx.AsyncClient, headers: Dict[str, str], rng: random.Random):
+    """Şablon aramalarının boş dönmemesi için birkaç kategori/şablon oluştur (ölçülmez)"""
+    category = await client.post("/categories", json={"name": f"Yük testi {secrets.token_hex(3)}"}, headers=headers)
+    category_id = category.json().get("id") if category.status_code == 200 else None
+    for draft in rng.sample(SAMPLE_DRAFTS, 2):
+        await client.post("/templates", json={"content": draft, "category_id": category_id}, headers=headers)
+
+async def request_workflow(client: httpx.AsyncClient, recorder: Recorder, headers: Dict[str, str], args, rng: random.Random):
+    """Talep oluştur -> N kez yanıt üret -> son yanıtı kopyalandı işaretle"""
+    response = await recorder.call(client, "POST", "/requests", "/requests", headers=headers, json={
+        "original_text": rng.choice(SAMPLE_REQUESTS),
+        "response_type": "informative",
+        "is_new_request": True
+    })
+    if response is None or response.status_code != 200:
+        return
+    request_id = response.json()["id"]
+
+    response_id = None
+    custom_input = rng.choice(SAMPLE_DRAFTS)
+    for _ in range(args.generations):
+        await asyncio.sleep(args.think_ms / 1000)
+        response = await recorder.call(client, "POST", "/generate", "/generate", headers=headers, json={
+            "request_id": request_id,
+            "model_name": args.model,
+            "custom_input": custom_input,
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "repetition_penalty": 1.2,
+            "system_prompt": "",
+            "is_sms": rng.random() < args.sms_ratio,
+            "no_cache": args.no_cache
+        })
+        if response is not None and response.status_code == 200:
+            response_id = response.json()["id"]
+
+    if response_id is not None:
+        await asyncio.sleep(args.think_ms / 1000)
+        await recorder.call(client, "PUT", "/responses/{id}/mark-copied", f"/responses/{response_id}/mark-copied", headers=headers)
+
+async def browse_templates(client: httpx.AsyncClient, recorder: Recorder, headers: Dict[str, str], args, rng: random.Random):
+    await recorder.call(client, "GET", "/categories", "/categories", headers=headers)
+    await asyncio.sleep(args.think_ms / 1000)
+    await recorder.call(client, "GET", "/templates?q=", "/templates", headers=headers, params={"q": rng.choice(TEMPLATE_QUERIES)})
+
+async def admin_dashboards(client: httpx.AsyncClient, recorder: Recorder, headers: Dict[str, str], args):
+    for route in ("/auth/admin/stats", "/auth/admin/users", "/auth/admin/usage/models", "/admin/departments"):
+        await recorder.call(client, "GET", route, route, headers=headers)
+        await asyncio.sleep(args.think_ms / 1000)
+
+async def virtual_user(email: str, is_admin: bool, args, recorder: Recorder, deadline: float, seed: int):
+    rng = random.Random(seed)
+    async with httpx.AsyncClient(base_url=args.base_url.rstrip("/") + "/api/v1", timeout=args.timeout) as client:
+        token = await login(client, recorder, email, args.send_email)
+        if token is None:
+            return
+        headers = {"Authorization": f"Bearer {token}"}
+        if not is_admin:
+            await setup_templates(client, headers, rng)
+
+        iterations = 0
+        while time.monotonic() < deadline and (not args.iterations or iterations < args.iterations):
+            if is_admin:
+                await admin_dashboards(client, recorder, headers, args)
+            else:
+                await request_workflow(client, recorder, headers, args, rng)
+                await browse_templates(client, recorder, headers, args, rng)
+            iterations += 1
+            await asyncio.sleep(args.think_ms / 1000)
+
+async def run(args) -> Dict[str, Any]:
+    staff_emails = [bench_email("staff", index) for index in range(args.users)]
+    admin_emails = [bench_email("admin", index) for index in range(args.admins)]
+    await asyncio.to_thread(seed_users, staff_emails, admin_emails)
+
+    recorder = Recorder()
+    start = time.monotonic()
+    deadline = start + args.duration
+    users = [(email, False) for email in staff_emails] + [(email, True) for email in admin_emails]
+    tasks = []
+    for index, (email, is_admin) in enumerate(users):
+        # Başlangıç yükünü yaymak için kademeli başlat
+        tasks.append(asyncio.create_task(virtual_user(email, is_admin, args, recorder, deadline, args.seed + index)))
+        await asyncio.sleep(args.ramp_up / max(1, len(users)))
+    await asyncio.gather(*tasks)
+    return summarize(recorder, time.monotonic() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Helper end-to-end load test")
+    parser.add_argument("--base-url", default=os.getenv("BENCH_BASE_URL", "http://localhost:8000"))
+    parser.add_argument("--users", type=int, default=10, help="Personel sanal kullanıcı sayısı")
+    parser.add_argument("--admins", type=int, default=1, help="Admin panellerini gezen sanal kullanıcı sayısı")
+    parser.add_argument("--duration", type=float, default=60, help="Test süresi (sn)")
+    parser.add_argument("--iterations", type=int, default=0, help="Kullanıcı başına tur sayısı (0 = süre boyunca)")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Tüm kullanıcıların başlatılma süresi (sn)")
+    parser.add_argument("--generations", type=int, default=2, help="Talep başına /generate sayısı")
+    parser.add_argument("--model", default=os.getenv("BENCH_MODEL", "llama3:8b"))
+    parser.add_argument("--sms-ratio", type=float, default=0.2, help="SMS modunda üretim oranı")
+    parser.add_argument("--no-cache", action="store_true", help="/generate'te üretim önbelleğini atla")
+    parser.add_argument("--think-ms", type=float, default=200, help="Adımlar arası bekleme")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--send-email", action="store_true", help="Girişte /auth/send'i de çağır (SMTP sink gerekir)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Sonuçları JSON olarak yaz")
+    parser.add_argument("--baseline", help="Karşılaştırılacak baseline JSON")
+    parser.add_argument("--save-baseline", help="Sonuçları yeni baseline olarak kaydet")
+    parser.add_argument("--threshold-pct", type=float, default=20, help="p95/p99 için izin verilen artış yüzdesi")
+    parser.add_argument("--min-delta-ms", type=float, default=5, help="Bundan küçük farklar gerileme sayılmaz")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print_report(summary)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+            print(f"💾 Sonuçlar yazıldı: {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(summary, baseline, args.threshold_pct, args.min_delta_ms)
+        if regressions:
+            print("\n❌ Baseline'a göre gerileme:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\n✅ Baseline'a göre gerileme yok")
+
+if __name__ == "__main__":
+    main()
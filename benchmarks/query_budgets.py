@@ -0,0 +1,191 @@
+"""
+SQL sorgu bütçesi kontrolü - liste endpoint'lerinde N+1 gerilemelerini yakalar.
+
+Her endpoint, X-DB-Query-Count başlığından okunan sorgu sayısıyla çağrılır:
+- Sayı, endpoint'in bütçesini (QUERY_BUDGETS) aşmamalı
+- Veri büyüdüğünde (küçük -> büyük veri seti) sayı artmamalı; artıyorsa satır başına sorgu vardır
+
+Uygulama lifespan'ı çalıştırılmaz (LLM/katalog servisleri gerekmez); istekler TestClient ile
+aynı process ve tek event loop içinde yapılır (asyncpg bağlantıları loop'a bağlıdır).
+Bütçe aşılırsa çıkış kodu 1 olur (CI için).
+
+Örnek:
+    python benchmarks/query_budgets.py
+    python benchmarks/query_budgets.py --small 3 --large 30
+
+Script DATABASE_URL veritabanına test verisi yazar; production veritabanına karşı çalıştırmayın.
+"""
+import argparse
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
+
+# Sorgu sayısı başlığı, main import edilmeden önce açılmalı (config import anında okunur)
+os.environ["QUERY_DEBUG_HEADERS"] = "true"
+
+# Proje kök dizinindeki modüller (main, connection, models) için
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_EMAIL_PREFIX = "querybudget"
+BENCH_EMAIL_DOMAIN = "nilufer.bel.tr"
+BENCH_DEPARTMENT = "Sorgu Bütçesi Müdürlüğü"
+BENCH_MODEL = "query-budget-model"
+
+# Endpoint başına izin verilen en fazla SQL sorgusu (kimlik doğrulama sorgusu dahil)
+QUERY_BUDGETS: Dict[str, int] = {
+    "/api/v1/templates": 4,
+    "/api/v1/categories": 4,
+    "/api/v1/responses/history": 4,
+    "/api/v1/auth/admin/users": 5,
+    "/api/v1/auth/admin/stats": 7,
+}
+
+# (endpoint, admin token'ı mı kullanılsın)
+CHECKS: List[Tuple[str, bool]] = [
+    ("/api/v1/templates", False),
+    ("/api/v1/categories", False),
+    ("/api/v1/responses/history", False),
+    ("/api/v1/auth/admin/users", True),
+    ("/api/v1/auth/admin/stats", True),
+]
+
+def seed_dataset(size: int) -> Tuple[int, int]:
+    """
+    Test verisini en az `size` ölçeğine tamamla.
+
+    Personel kullanıcısı için `size` kategori, kategori başına `size` şablon ve
+    `size` talep (her birine iki yanıt) bulunur; ayrıca `size` ek kullanıcı eklenir.
+    (staff_id, admin_id) döner.
+    """
+    import models
+    from connection import SessionLocal
+
+    db = SessionLocal()
+    try:
+        def get_user(email: str, is_admin: bool) -> models.User:
+            user = db.query(models.User).filter(models.User.email == email).first()
+            if user is None:
+                user = models.User(email=email, full_name=email.split("@")[0], department=BENCH_DEPARTMENT)
+                db.add(user)
+            user.is_active = True
+            user.profile_completed = True
+            user.is_admin = is_admin
+            db.flush()
+            return user
+
+        staff = get_user(f"{BENCH_EMAIL_PREFIX}-staff@{BENCH_EMAIL_DOMAIN}", False)
+        admin = get_user(f"{BENCH_EMAIL_PREFIX}-admin@{BENCH_EMAIL_DOMAIN}", True)
+        for index in range(size):
+            get_user(f"{BENCH_EMAIL_PREFIX}-user{index}@{BENCH_EMAIL_DOMAIN}", False)
+
+        if db.query(models.Model).filter(models.Model.name == BENCH_MODEL).first() is None:
+            db.add(models.Model(name=BENCH_MODEL, display_name=BENCH_MODEL, supports_chat=True))
+            db.flush()
+
+        categories = db.query(models.TemplateCategory).filter(
+            models.TemplateCategory.department == BENCH_DEPARTMENT
+        ).all()
+        for index in range(len(categories), size):
+            category = models.TemplateCategory(
+                name=f"Kategori {index}", department=BENCH_DEPARTMENT, owner_user_id=staff.id
+            )
+            db.add(category)
+            categories.append(category)
+        db.flush()
+
+        for category in categories:
+            existing = db.query(models.Template).filter(models.Template.category_id == category.id).count()
+            for index in range(existing, size):
+                db.add(models.Template(
+                    title=f"{category.name} şablon {index}",
+                    content="Talebiniz ilgili müdürlüğe iletildi, yerinde inceleme yapılacak.",
+                    department=BENCH_DEPARTMENT,
+                    owner_user_id=(staff.id if index % 2 else admin.id),
+                    category_id=category.id
+                ))
+
+        existing = db.query(models.Request).filter(models.Request.user_id == staff.id).count()
+        for index in range(existing, size):
+            request = models.Request(
+                user_id=staff.id,
+                original_text=f"Sokağımızdaki lambalar yanmıyor ({index})",
+                response_type="informative"
+            )
+            db.add(request)
+            db.flush()
+            for variant in range(2):
+                db.add(models.Response(
+                    request_id=request.id,
+                    model_name=BENCH_MODEL,
+                    response_text=f"Ekiplerimiz bölgeye yönlendirildi ({variant}).",
+                    temperature=0.7,
+                    top_p=0.9,
+                    repetition_penalty=1.1,
+                    latency_ms=100,
+                    tokens_used=50
+                ))
+
+        db.commit()
+        return staff.id, admin.id
+    finally:
+        db.close()
+
+def measure(client, tokens: Dict[bool, str]) -> Dict[str, int]:
+    from query_counter import QUERY_COUNT_HEADER
+
+    counts = {}
+    for path, as_admin in CHECKS:
+        response = client.get(path, headers={"Authorization": f"Bearer {tokens[as_admin]}"})
+        if response.status_code != 200:
+            raise RuntimeError(f"{path}: HTTP {response.status_code} {response.text[:200]}")
+        counts[path] = int(response.headers[QUERY_COUNT_HEADER])
+    return counts
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Liste endpoint'leri için SQL sorgu bütçesi kontrolü")
+    parser.add_argument("--small", type=int, default=2, help="Küçük veri seti ölçeği")
+    parser.add_argument("--large", type=int, default=20, help="Büyük veri seti ölçeği")
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from auth_system import auth_service
+    from main import app
+
+    # Lifespan (LLM sağlayıcıları, katalog, warmup) başlatılmaz; context manager sadece tek loop içindir
+    @asynccontextmanager
+    async def no_lifespan(app):
+        yield
+
+    app.router.lifespan_context = no_lifespan
+
+    results = {}
+    with TestClient(app) as client:
+        for label, size in (("small", args.small), ("large", args.large)):
+            staff_id, admin_id = seed_dataset(size)
+            tokens = {
+                False: auth_service.create_access_token({"sub": str(staff_id)}),
+                True: auth_service.create_access_token({"sub": str(admin_id)}),
+            }
+            results[label] = measure(client, tokens)
+
+    failures = []
+    print(f"{'endpoint':<32} {'small':>6} {'large':>6} {'budget':>7}")
+    for path, _ in CHECKS:
+        small, large, budget = results["small"][path], results["large"][path], QUERY_BUDGETS[path]
+        print(f"{path:<32} {small:>6} {large:>6} {budget:>7}")
+        if large > budget:
+            failures.append(f"{path}: {large} sorgu, bütçe {budget}")
+        if large > small:
+            failures.append(f"{path}: veri büyüyünce sorgu sayısı arttı ({small} -> {large}), N+1 olabilir")
+
+    if failures:
+        print("\n❌ Sorgu bütçesi aşıldı:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\n✅ Tüm endpoint'ler sorgu bütçesi içinde")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Okuma replikası yönlendirme ve read-your-writes kontrolü (iki yerel veritabanıyla).
+
+DATABASE_URL primary, DATABASE_READ_URL ikinci veritabanıdır (gerçek bir streaming replika veya
+aynı şemaya sahip ayrı bir veritabanı). Kontroller:
+1. Cookie'siz GET /templates replikaya gider (X-DB-Read-Route: replica)
+2. POST /templates son yazma cookie'sini set eder
+3. Cookie ile GET /templates primary'ye gider ve yeni şablonu döner (read-your-writes)
+4. Cookie olmadan tekrar replikaya gidilir
+
+Örnek (iki yerel veritabanı):
+    createdb ai_helper_replica
+    DATABASE_URL=postgresql://localhost/ai_helper \\
+    DATABASE_READ_URL=postgresql://localhost/ai_helper_replica \\
+    python benchmarks/read_replica_check.py
+
+Ayrı veritabanlarında replika yeni şablonu görmez; bu da yönlendirmenin gerçekten ayrıldığını gösterir.
+Script her iki veritabanına test verisi yazar; production veritabanına karşı çalıştırmayın.
+"""
+import os
+import secrets
+import sys
+from contextlib import asynccontextmanager
+from typing import List
+
+# Okuma rotası başlığı, main import edilmeden önce açılmalı (config import anında okunur)
+os.environ["QUERY_DEBUG_HEADERS"] = "true"
+
+# Proje kök dizinindeki modüller (main, connection, models) için
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_EMAIL = "replicacheck@nilufer.bel.tr"
+BENCH_DEPARTMENT = "Replika Kontrol Müdürlüğü"
+
+def seed_user(session_factory) -> int:
+    """Primary'de kimlik doğrulama, replikada departman filtresi için aynı kullanıcı"""
+    import models
+
+    db = session_factory()
+    try:
+        user = db.query(models.User).filter(models.User.email == BENCH_EMAIL).first()
+        if user is None:
+            user = models.User(email=BENCH_EMAIL, full_name="Replika Kontrol", department=BENCH_DEPARTMENT)
+            db.add(user)
+        user.is_active = True
+        user.profile_completed = True
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+def main() -> int:
+    from fastapi.testclient import TestClient
+    from sqlalchemy.orm import sessionmaker
+    import models
+    from connection import engine, read_engine, SessionLocal
+    from read_your_writes import LAST_WRITE_COOKIE, READ_ROUTE_HEADER
+    from auth_system import auth_service
+    from main import app
+
+    if read_engine is engine:
+        print("❌ DATABASE_READ_URL ayarlı değil")
+        return 1
+
+    models.Base.metadata.create_all(bind=read_engine)
+    user_id = seed_user(SessionLocal)
+    seed_user(sessionmaker(bind=read_engine))
+    headers = {"Authorization": f"Bearer {auth_service.create_access_token({'sub': str(user_id)})}"}
+    marker = f"replika-{secrets.token_hex(4)}"
+
+    @asynccontextmanager
+    async def no_lifespan(app):
+        yield
+
+    app.router.lifespan_context = no_lifespan
+
+    failures: List[str] = []
+
+    def expect(condition: bool, message: str):
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            failures.append(message)
+
+    with TestClient(app) as client:
+        response = client.get("/api/v1/templates", params={"q": marker}, headers=headers)
+        expect(response.headers.get(READ_ROUTE_HEADER) == "replica", "Cookie'siz okuma replikaya gider")
+
+        response = client.post("/api/v1/templates", json={"content": f"{marker} şablonu"}, headers=headers)
+        expect(response.status_code == 200, f"POST /templates başarılı (HTTP {response.status_code})")
+        expect(LAST_WRITE_COOKIE in response.cookies, "Yazma sonrası son yazma cookie'si set edilir")
+
+        response = client.get("/api/v1/templates", params={"q": marker}, headers=headers)
+        expect(response.headers.get(READ_ROUTE_HEADER) == "primary", "Yazma penceresinde okuma primary'ye gider")
+        titles = [template["title"] for template in response.json().get("templates", [])]
+        expect(any(marker in title for title in titles), "Yeni şablon hemen okunur (read-your-writes)")
+
+        client.cookies.clear()
+        response = client.get("/api/v1/templates", params={"q": marker}, headers=headers)
+        expect(response.headers.get(READ_ROUTE_HEADER) == "replica", "Cookie olmadan okuma tekrar replikaya gider")
+
+    if failures:
+        print(f"\n❌ {len(failures)} kontrol başarısız")
+        return 1
+    print("\n✅ Replika yönlendirme ve read-your-writes çalışıyor")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
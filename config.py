@@ -25,10 +25,89 @@ REDIS_PORT = os.getenv("REDIS_PORT", "6379")
 # Ollama configuration
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 
+# Çoklu Ollama node'u (virgülle ayrılmış URL listesi, boşsa OLLAMA_HOST)
+OLLAMA_HOSTS = [h.strip().rstrip("/") for h in os.getenv("OLLAMA_HOSTS", "").split(",") if h.strip()] or [OLLAMA_HOST.rstrip("/")]
+OLLAMA_HEALTH_CHECK_INTERVAL_SEC = float(os.getenv("OLLAMA_HEALTH_CHECK_INTERVAL_SEC", "15"))
+OLLAMA_NODE_MAX_FAILURES = int(os.getenv("OLLAMA_NODE_MAX_FAILURES", "2"))  # Ardışık hata sonrası node devre dışı
+OLLAMA_ROUTE_MAX_ATTEMPTS = int(os.getenv("OLLAMA_ROUTE_MAX_ATTEMPTS", "2"))  # Bağlantı hatasında denenecek node sayısı
+
+# Ollama chat API: system mesajı ayrı gönderilir, ortak prefix KV-cache'ten tekrar kullanılır
+OLLAMA_USE_CHAT_API = os.getenv("OLLAMA_USE_CHAT_API", "true").lower() == "true"
+
+# Ollama model warm-up / keep-alive
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # Model bellekte ne kadar tutulsun
+OLLAMA_WARMUP_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARMUP_MODELS", "").split(",") if m.strip()]  # Startup'ta yüklenecekler
+OLLAMA_KEEPALIVE_INTERVAL_SEC = int(os.getenv("OLLAMA_KEEPALIVE_INTERVAL_SEC", "240"))  # Ping aralığı
+OLLAMA_KEEPALIVE_RECENT_MIN = int(os.getenv("OLLAMA_KEEPALIVE_RECENT_MIN", "30"))  # Son N dakikada kullanılan modeller
+
 # Gemini API configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_API_URL = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models")
 
+# LLM HTTP client pool configuration (shared httpx.AsyncClient per provider)
+OLLAMA_POOL_MAX_CONNECTIONS = int(os.getenv("OLLAMA_POOL_MAX_CONNECTIONS", "20"))
+OLLAMA_POOL_MAX_KEEPALIVE = int(os.getenv("OLLAMA_POOL_MAX_KEEPALIVE", "10"))
+GEMINI_POOL_MAX_CONNECTIONS = int(os.getenv("GEMINI_POOL_MAX_CONNECTIONS", "50"))
+GEMINI_POOL_MAX_KEEPALIVE = int(os.getenv("GEMINI_POOL_MAX_KEEPALIVE", "20"))
+GEMINI_HTTP2 = os.getenv("GEMINI_HTTP2", "true").lower() == "true"
+LLM_KEEPALIVE_EXPIRY_SEC = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SEC", "60"))
+LLM_CONNECT_TIMEOUT_SEC = float(os.getenv("LLM_CONNECT_TIMEOUT_SEC", "10"))
+LLM_READ_TIMEOUT_SEC = float(os.getenv("LLM_READ_TIMEOUT_SEC", "300"))  # Uzun üretimler için
+LLM_WRITE_TIMEOUT_SEC = float(os.getenv("LLM_WRITE_TIMEOUT_SEC", "30"))
+LLM_POOL_TIMEOUT_SEC = float(os.getenv("LLM_POOL_TIMEOUT_SEC", "30"))
+
+# Admission control - sağlayıcı/model başına eşzamanlı LLM çağrısı ve bekleme kuyruğu (worker başına)
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "20"))
+GENERATION_QUEUE_MAX = int(os.getenv("GENERATION_QUEUE_MAX", "20"))
+# Format: "llama3:8b=1,gemma2:9b=2"
+MODEL_MAX_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, limit in (
+        item.rsplit("=", 1) for item in os.getenv("MODEL_MAX_CONCURRENCY", "").split(",") if "=" in item
+    )
+}
+
+# LLM provider politikaları (llm_providers.py)
+OLLAMA_TIMEOUT_SEC = float(os.getenv("OLLAMA_TIMEOUT_SEC", str(LLM_READ_TIMEOUT_SEC)))  # Tek üretimin toplam süresi
+GEMINI_TIMEOUT_SEC = float(os.getenv("GEMINI_TIMEOUT_SEC", str(LLM_READ_TIMEOUT_SEC)))  # Uzun resmi yazılar için okuma timeout'u kadar
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "0"))  # Node pool zaten başka node'a geçer
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))  # 429 / 503 için
+LLM_RETRY_BACKOFF_SEC = float(os.getenv("LLM_RETRY_BACKOFF_SEC", "0.5"))  # Üstel geri çekilme başlangıcı
+OLLAMA_MAX_CONTEXT_TOKENS = int(os.getenv("OLLAMA_MAX_CONTEXT_TOKENS", "8192"))
+GEMINI_MAX_CONTEXT_TOKENS = int(os.getenv("GEMINI_MAX_CONTEXT_TOKENS", "1000000"))
+
+# Moda göre çıktı token bütçesi (num_predict / maxOutputTokens)
+# SMS: 450 karakter ≈ 150 token (Türkçe ~3 karakter/token); resmi yazı: 150-300 kelime ≈ 600 token
+SMS_MAX_OUTPUT_TOKENS = int(os.getenv("SMS_MAX_OUTPUT_TOKENS", "150"))
+LETTER_MAX_OUTPUT_TOKENS = int(os.getenv("LETTER_MAX_OUTPUT_TOKENS", "600"))
+
+# Multi-model fan-out (/generate/batch) - tek istekte en fazla model sayısı
+GENERATE_BATCH_MAX_MODELS = int(os.getenv("GENERATE_BATCH_MAX_MODELS", "5"))
+
+# Asenkron üretim işleri (/generate/jobs)
+GENERATION_JOB_WORKERS = int(os.getenv("GENERATION_JOB_WORKERS", "4"))  # Process başına worker
+GENERATION_JOB_HEARTBEAT_SEC = int(os.getenv("GENERATION_JOB_HEARTBEAT_SEC", "15"))  # Çalışan işlerin heartbeat ve kurtarma taraması aralığı
+GENERATION_JOB_STALE_SEC = int(os.getenv("GENERATION_JOB_STALE_SEC", "60"))  # Bu süredir heartbeat gelmeyen "running" iş yeniden kuyruğa alınır
+
+# Spekülatif ön üretim: talep oluşturulunca kullanıcının varsayılan modeliyle arka planda üretim (kullanıcı bazında opt-in)
+SPECULATIVE_GENERATION_ENABLED = os.getenv("SPECULATIVE_GENERATION_ENABLED", "true").lower() == "true"
+SPECULATIVE_DEFAULT_MODEL = os.getenv("SPECULATIVE_DEFAULT_MODEL", "")  # Kullanıcının varsayılan modeli yoksa
+SPECULATIVE_MAX_INFLIGHT = int(os.getenv("SPECULATIVE_MAX_INFLIGHT", "2"))  # Process başına eşzamanlı spekülasyon
+SPECULATIVE_TTL_SEC = int(os.getenv("SPECULATIVE_TTL_SEC", "300"))  # Bu sürede kullanılmayan sonuç boşa gitmiş sayılır
+
+# Generation cache configuration (aynı prompt + parametreler için LLM çağrısını tekrarlama)
+GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "true").lower() == "true"
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "500"))
+GENERATION_CACHE_TTL_SEC = int(os.getenv("GENERATION_CACHE_TTL_SEC", "3600"))  # 1 hour
+GENERATION_CACHE_PERSISTENT = os.getenv("GENERATION_CACHE_PERSISTENT", "false").lower() == "true"  # DB katmanı
+
+# Prometheus /metrics (çoklu worker için PROMETHEUS_MULTIPROC_DIR ortam değişkeni ayarlanmalı)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Model catalog configuration (/models bellekten servis edilir, arka planda yenilenir)
+MODEL_CATALOG_TTL_SEC = int(os.getenv("MODEL_CATALOG_TTL_SEC", "300"))  # 5 minutes
+
 # Authentication configuration
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "")
 JWT_ALGORITHM = "HS256"
@@ -65,6 +144,30 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_TO_FILE = os.getenv("LOG_TO_FILE", "false").lower() == "true"
 LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", "logs/app.log")
 
+# İstek başına SQL sorgu sayacı (query_counter.py)
+QUERY_DEBUG_HEADERS = os.getenv("QUERY_DEBUG_HEADERS", str(DEBUG_MODE)).lower() == "true"  # X-DB-Query-Count / X-DB-Query-Time-Ms
+QUERY_COUNT_WARN_THRESHOLD = int(os.getenv("QUERY_COUNT_WARN_THRESHOLD", "25"))  # Aşılınca tekrar eden sorgular loglanır
+
+# Yavaş sorgu kaydı (slow_query_log.py) - opt-in
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "false").lower() == "true"
+SLOW_QUERY_THRESHOLD_MS = int(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_MAX_ENTRIES = int(os.getenv("SLOW_QUERY_MAX_ENTRIES", "200"))  # Process başına tutulan farklı sorgu
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"  # SELECT'ler için EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "10000"))  # ANALYZE sorguyu tekrar çalıştırır
+
+# İstek bazlı profil (profiling.py) - sadece admin, X-Profile: 1 başlığı veya ?_profile=1 ile
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+PROFILE_MAX_DURATION_SEC = int(os.getenv("PROFILE_MAX_DURATION_SEC", "300"))  # Örnekleme bu süreden sonra durur
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "logs/profiles")  # Worker'lar arası paylaşılan dizin
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "100"))  # En eski profiller silinir
+
+# Event loop bloklanma dedektörü (loop_watchdog.py)
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "true").lower() == "true"
+LOOP_STALL_THRESHOLD_MS = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))  # Bu süreden uzun bloklanma stall sayılır
+LOOP_HEARTBEAT_INTERVAL_MS = int(os.getenv("LOOP_HEARTBEAT_INTERVAL_MS", "50"))
+LOOP_STALL_HISTORY = int(os.getenv("LOOP_STALL_HISTORY", "50"))  # Stack'iyle saklanan son stall sayısı
+
 # Database URL for SQLAlchemy (PostgreSQL ONLY)
 # Priority:
 # 1) DATABASE_URL (must be postgresql scheme)
@@ -104,6 +207,26 @@ else:
             "PostgreSQL configuration missing. Set DATABASE_URL (postgresql) or POSTGRES_* env vars."
         )
 
+# Opsiyonel okuma replikası: GET listeleri ve admin raporları buraya gider (boşsa primary kullanılır)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+# Yazma yapan istemci bu süre boyunca primary'den okur (replika gecikmesine karşı read-your-writes)
+READ_YOUR_WRITES_WINDOW_SEC = int(os.getenv("READ_YOUR_WRITES_WINDOW_SEC", "10"))
+
+# SQLAlchemy connection pool'ları (worker başına, veritabanı başına). Sync (psycopg2) ve async (asyncpg)
+# engine'ler ayrı pool açar; bütçe ikisi arasında bölünür:
+#   worker başına en fazla = DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW
+#   (varsayılan 5 + 5 + 5 + 5 = 20; DATABASE_READ_URL ayarlıysa replikada da aynı kadar)
+#   toplam = worker sayısı x bu değer <= max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "5"))  # Async endpoint'ler (generate, requests, templates...)
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))  # Boş bağlantı bekleme süresi (saniye), sonra hata
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Bu süreden eski bağlantılar yenilenir (saniye)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"  # Checkout'ta kopmuş bağlantıyı yakala
+DB_POOL_PREWARM = os.getenv("DB_POOL_PREWARM", "true").lower() == "true"  # Başlangıçta DB_POOL_SIZE + DB_ASYNC_POOL_SIZE bağlantı aç
+DB_POOL_SLOW_CHECKOUT_MS = int(os.getenv("DB_POOL_SLOW_CHECKOUT_MS", "500"))  # Aşılınca pool tükenmesi uyarısı
+
 # Settings class for easy access
 class Settings:
     def __init__(self):
@@ -1,8 +1,24 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 import os
-from config import DATABASE_URL, POSTGRES_SCHEMA_NAME
+from config import (
+    DATABASE_URL,
+    DATABASE_READ_URL,
+    POSTGRES_SCHEMA_NAME,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_POOL_SLOW_CHECKOUT_MS,
+)
+from metrics import observe_pool_checkout, observe_connection_hold
+from query_counter import current_route
+from slow_query_log import install_slow_query_log
+from read_your_writes import prefer_primary, record_read_route
 
 # Prepare connect_args for PostgreSQL schema
 _connect_args = {}
@@ -13,14 +29,79 @@ elif DATABASE_URL.startswith("postgresql") and POSTGRES_SCHEMA_NAME != "ai_helpe
     # Format: "-c option=value" for PostgreSQL connection options
     _connect_args = {"options": f"-csearch_path={POSTGRES_SCHEMA_NAME}"}
 
+class CheckoutTimingMixin:
+    """Pool checkout bekleme süresi (pool tükenince istekler burada bekler)"""
+
+    def connect(self):
+        start = time.perf_counter()
+        connection = super().connect()
+        wait = time.perf_counter() - start
+        route = current_route() or "background"
+        observe_pool_checkout(route, wait)
+        if wait * 1000 >= DB_POOL_SLOW_CHECKOUT_MS:
+            print(f"⚠️ DB pool checkout {wait * 1000:.0f} ms bekledi [{route}] ({self.status()})")
+        return connection
+
+class TimedQueuePool(CheckoutTimingMixin, QueuePool):
+    pass
+
+def track_connection_hold(pool):
+    """Bağlantı tutma süresi: checkout'taki rotaya yazılır (uzun await'ler boyunca tutulan bağlantıları gösterir)"""
+
+    @event.listens_for(pool, "checkout")
+    def record_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        connection_record.info["checked_out_route"] = current_route() or "background"
+
+    @event.listens_for(pool, "checkin")
+    def record_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            observe_connection_hold(connection_record.info.pop("checked_out_route", "background"),
+                                    time.perf_counter() - checked_out_at)
+
+# Pool ayarları config.py'den (DB_POOL_*); sqlite'ta varsayılan pool kullanılır
+_pool_args = {}
+if not DATABASE_URL.startswith("sqlite"):
+    _pool_args = {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
 # Create engine
 engine = create_engine(
     DATABASE_URL,
-    connect_args=_connect_args
+    connect_args=_connect_args,
+    **_pool_args
 )
 
+track_connection_hold(engine.pool)
+
+# Opt-in yavaş sorgu kaydı (SLOW_QUERY_LOG_ENABLED); script'ler dahil tüm engine kullanıcılarını kapsar
+install_slow_query_log(engine)
+
+# Okuma replikası (DATABASE_READ_URL); ayarlı değilse okumalar da primary engine'den
+if DATABASE_READ_URL:
+    read_engine = create_engine(DATABASE_READ_URL, connect_args=_connect_args, **_pool_args)
+    track_connection_hold(read_engine.pool)
+    install_slow_query_log(read_engine)
+else:
+    read_engine = engine
+
+class ReadOnlySession(Session):
+    """Replika salt okunur: okuma session'ında yazma denemesi hemen hata verir (primary'de olsa bile)"""
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def _reject_read_session_writes(session, flush_context, instances):
+    raise RuntimeError("get_read_db session'ında yazma yapılamaz; get_db kullanın")
+
 # Create session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(class_=ReadOnlySession, autocommit=False, autoflush=False, bind=read_engine)
 
 # Base class for models
 Base = declarative_base()
@@ -33,3 +114,36 @@ def get_db():
     finally:
         db.close()
 
+# Dependency for read-only sessions (GET listeleri, admin raporları)
+def get_read_db():
+    """Replikadan oku; istemci yakın zamanda yazdıysa (read-your-writes) primary'den"""
+    use_primary = prefer_primary()
+    record_read_route("primary" if use_primary else "replica")
+    db = SessionLocal() if use_primary else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def release_connection(db: Session):
+    """
+    Uzun bir await'ten (LLM çağrısı, SSE stream) önce session'ın bağlantısını pool'a iade et.
+
+    Açık transaction biter; yüklenmiş nesneler (current_user, request) okunabilir kalır.
+    Session sonradan tekrar kullanılırsa yeni bir bağlantı alır.
+    """
+    db.close()
+
+def prewarm_pool(count: int = DB_POOL_SIZE):
+    """Başlangıçta pool'u doldur: ilk isteklerde bağlantı kurma (TCP + auth) gecikmesi olmasın"""
+    if DATABASE_URL.startswith("sqlite"):
+        return
+    for target in [engine] + ([read_engine] if read_engine is not engine else []):
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(target.connect())
+        finally:
+            for connection in connections:
+                connection.close()
+        print(f"✅ DB pool hazır ({target.url.host}): {len(connections)} bağlantı ({target.pool.status()})")
@@ -1,71 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, func, select
 from typing import List, Optional
 import models
 import api_models
-from connection import get_db
-from ollama_client import OllamaClient
-from gemini_client import GeminiClient
-from auth_endpoints import get_current_user
+from connection import get_db, get_read_db, SessionLocal, release_connection
+from async_connection import get_async_db, get_async_read_db, release_async_connection
+from generation_service import (
+    ollama_client,
+    generate_with_cache,
+    stream_with_cache,
+    get_provider_name,
+    build_prompt,
+    format_sms_response,
+    sse_event,
+    usage_columns,
+    previous_context_async,
+)
+from llm_providers import provider_registry
+from model_catalog import model_catalog
+from generation_cache import generation_cache
+from admission import admission_controller, QueueFullError
+from generation_jobs import generation_job_manager
+from speculative import speculative_generator
+from slow_query_log import slow_query_log
+from profiling import profile_store
+from loop_watchdog import loop_watchdog
+from model_warmup import model_warmup_scheduler
+from config import GENERATE_BATCH_MAX_MODELS
+from auth_endpoints import get_current_user, get_current_user_async
 from models import User, Template, TemplateCategory
 
 router = APIRouter()
-ollama_client = OllamaClient()
-gemini_client = GeminiClient()
 
 @router.get("/models", response_model=List[api_models.ModelInfo])
-async def get_models(db: Session = Depends(get_db)):
-    """Get available models from Ollama and Gemini, sync with database"""
+async def get_models(request: Request):
+    """Get available models from the in-memory catalog (ETag / 304 destekli)"""
     try:
-        all_models = []
-        
-        # Get models from Ollama
-        ollama_models = ollama_client.get_models()
-        all_models.extend(ollama_models)
-        
-        # Get models from Gemini
-        gemini_models = await gemini_client.get_models()
-        all_models.extend(gemini_models)
-        
-        # Sync with database
-        for model_data in all_models:
-            # Check if model exists in database
-            existing_model = db.query(models.Model).filter(models.Model.name == model_data['name']).first()
-            
-            if existing_model:
-                # Update existing model
-                existing_model.display_name = model_data['display_name']
-                existing_model.supports_embedding = model_data['supports_embedding']
-                existing_model.supports_chat = model_data['supports_chat']
-            else:
-                # Create new model
-                new_model = models.Model(
-                    name=model_data['name'],
-                    display_name=model_data['display_name'],
-                    supports_embedding=model_data['supports_embedding'],
-                    supports_chat=model_data['supports_chat']
-                )
-                db.add(new_model)
-        
-        db.commit()
-        
-        # Return models from database
-        db_models = db.query(models.Model).all()
-        return [
-            api_models.ModelInfo(
-                name=model.name,
-                display_name=model.display_name,
-                supports_embedding=model.supports_embedding,
-                supports_chat=model.supports_chat
-            )
-            for model in db_models
-        ]
+        catalog_models = await model_catalog.get_models()
+        etag = model_catalog.etag
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        
+        # Liste değişmediyse gövde göndermeden 304 dön
+        if etag and request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        
+        return JSONResponse(
+            content=[
+                api_models.ModelInfo(
+                    name=model['name'],
+                    display_name=model['display_name'],
+                    supports_embedding=model['supports_embedding'],
+                    supports_chat=model['supports_chat']
+                ).dict()
+                for model in catalog_models
+            ],
+            headers=headers
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting models: {str(e)}")
 
 @router.post("/requests", response_model=api_models.RequestResponse)
-async def create_request(request: api_models.RequestCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def create_request(request: api_models.RequestCreate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user_async)):
     """Create a new request"""
     try:
         # Validate response_type
@@ -82,8 +81,16 @@ async def create_request(request: api_models.RequestCreate, db: Session = Depend
         )
         
         db.add(new_request)
-        db.commit()
-        db.refresh(new_request)
+        await db.commit()
+        await db.refresh(new_request)
+        
+        # Opt-in kullanıcılar için /generate gelmeden varsayılan modelle arka planda üretime başla
+        speculative_generator.start_for_request(
+            current_user,
+            new_request.id,
+            new_request.original_text,
+            request.speculation.dict() if request.speculation else None
+        )
         
         return api_models.RequestResponse(
             id=new_request.id,
@@ -92,7 +99,7 @@ async def create_request(request: api_models.RequestCreate, db: Session = Depend
             created_at=new_request.created_at
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error creating request: {str(e)}")
 
 @router.put("/requests/{request_id}")
@@ -151,7 +158,7 @@ async def mark_response_as_copied(response_id: int, current_user: User = Depends
         raise HTTPException(status_code=500, detail=f"Error marking response as copied: {str(e)}")
 
 @router.get("/requests/{request_id}/has-copied-response")
-async def check_request_has_copied_response(request_id: int, db: Session = Depends(get_db)):
+async def check_request_has_copied_response(request_id: int, db: Session = Depends(get_read_db)):
     """Check if a request has any copied responses - GELİŞTİRME MODU: auth bypass"""
     try:
         # Request'i bul
@@ -173,61 +180,55 @@ async def check_request_has_copied_response(request_id: int, db: Session = Depen
         raise HTTPException(status_code=500, detail=f"Error checking request: {str(e)}")
 
 @router.post("/generate", response_model=api_models.GenerateResponse)
-async def generate_response(generate_request: api_models.GenerateRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def generate_response(generate_request: api_models.GenerateRequest, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
     """Generate response using Ollama"""
     try:
         # Get the original request
-        original_request = db.query(models.Request).filter(models.Request.id == generate_request.request_id).first()
+        original_request = await db.get(models.Request, generate_request.request_id)
         if not original_request:
             raise HTTPException(status_code=404, detail="Request not found")
         
         # Create prompt - SMS veya normal yanıt
         print(f"🔍 Generate Request: is_sms={generate_request.is_sms}, type={type(generate_request.is_sms)}")
-        if generate_request.is_sms:
-            prompt = f"""Vatandaş talebi: {original_request.original_text}
-
-Personel cevabı: {generate_request.custom_input}
-
-Bu cevabı kısa ve öz bir SMS formatına uygun şekilde hazırla. ÖNEMLİ KURALLAR:
-- Maksimum 450 karakter olmalı
-- Başlık veya başlık benzeri ifadeler ("Resmi Yanıt", "Yanıt:", vb.) kullanma
-- Paragraf kırılmaları yapma, tüm metni tek satırda yaz
-- Gereksiz boşluklar bırakma
-- Kısa, net ve anlaşılır olmalı
-- Sayın ilgili gibi resmi hitap ile başla ama uzatma"""
-            print("📱 SMS mode: Prompt set to SMS format")
-        else:
-            prompt = f"""Vatandaş talebi: {original_request.original_text}
-
-Personel cevabı: {generate_request.custom_input}
-
-Bu cevabı genişlet, daha detaylı ve ikna edici hale getir."""
-            print("📄 Normal mode: Prompt set to normal format")
+        prompt = build_prompt(original_request.original_text, generate_request.custom_input, generate_request.is_sms)
         
         # Sistem promptunu kullan (frontend'den gelen)
         system_prompt = generate_request.system_prompt if generate_request.system_prompt else ""
         
-        # Determine which client to use based on model name
-        if generate_request.model_name.startswith('gemini-'):
-            # Use Gemini client
-            response = await gemini_client.generate_response(
-                generate_request.model_name, 
-                prompt,
-                temperature=generate_request.temperature,
-                top_p=generate_request.top_p,
-                repetition_penalty=generate_request.repetition_penalty,
-                system_prompt=system_prompt  # Sistem promptunu geçir
-            )
-        else:
-            # Use Ollama client
-            response = await ollama_client.generate_response(
-                generate_request.model_name, 
-                prompt,
-                temperature=generate_request.temperature,
-                top_p=generate_request.top_p,
-                repetition_penalty=generate_request.repetition_penalty,
-                system_prompt=system_prompt  # Sistem promptunu geçir
-            )
+        # Devam üretimi: önceki yanıt konuşma geçmişi olarak gönderilir
+        history = await previous_context_async(db, generate_request.request_id, prompt) if generate_request.continue_previous else None
+        
+        # LLM çağrısı boyunca DB bağlantısı tutulmasın; kayıt sonrası session yeni bağlantı alır
+        await release_async_connection(db)
+        
+        # Spekülatif ön üretim: girdiler eşleşirse süren üretime önbellek üzerinden katılınır, eşleşmezse iptal et
+        await speculative_generator.claim(
+            generate_request.request_id,
+            generate_request.model_name,
+            prompt,
+            generate_request.temperature,
+            generate_request.top_p,
+            generate_request.repetition_penalty,
+            system_prompt=system_prompt,
+            history=history,
+            is_sms=generate_request.is_sms,
+            no_cache=generate_request.no_cache
+        )
+        
+        # Model adına göre istemci seçilir; aynı prompt + parametreler önbellekten döner
+        response = await generate_with_cache(
+            generate_request.model_name, 
+            prompt,
+            temperature=generate_request.temperature,
+            top_p=generate_request.top_p,
+            repetition_penalty=generate_request.repetition_penalty,
+            system_prompt=system_prompt,  # Sistem promptunu geçir
+            no_cache=generate_request.no_cache,
+            ticket_id=generate_request.ticket_id,
+            owner_id=current_user.id,
+            history=history,
+            is_sms=generate_request.is_sms
+        )
         
         if not response['success']:
             raise HTTPException(status_code=500, detail=f"Model error: {response['response_text']}")
@@ -236,60 +237,7 @@ Bu cevabı genişlet, daha detaylı ve ikna edici hale getir."""
         response_text = response.get('response_text', '') or ''
         print(f"🔍 DEBUG: is_sms={generate_request.is_sms}, response_length={len(response_text) if response_text else 0}")
         if generate_request.is_sms and response_text:
-            original_length = len(response_text)
-            print(f"📱 SMS Response detected! Original length: {original_length} chars")
-            
-            # 1. Başlık ve benzeri ifadeleri kaldır (baştan)
-            response_text = response_text.strip()
-            # "Resmi Yanıt", "Yanıt:", "**" gibi başlıkları temizle
-            lines = response_text.split('\n')
-            cleaned_lines = []
-            skip_first = True
-            for line in lines:
-                line_stripped = line.strip()
-                # Başlık benzeri ifadeleri atla
-                if skip_first and (line_stripped.startswith('**') or 
-                                   'Resmi Yanıt' in line_stripped or 
-                                   'Yanıt:' in line_stripped or
-                                   len(line_stripped) < 10):
-                    continue
-                skip_first = False
-                if line_stripped:
-                    cleaned_lines.append(line_stripped)
-            
-            # 2. Tüm metni tek satıra çevir (paragraf kırılmalarını kaldır)
-            response_text = ' '.join(cleaned_lines)
-            
-            # 3. Fazla boşlukları temizle (iki veya daha fazla boşluk -> tek boşluk)
-            import re
-            response_text = re.sub(r'\s+', ' ', response_text).strip()
-            
-            # 4. 450 karakter limiti uygula
-            if len(response_text) > 450:
-                # Son nokta, ünlem veya soru işaretinden kes (cümle sınırında)
-                trimmed = response_text[:450]
-                # Son cümle sınırını bul
-                last_period = max(
-                    trimmed.rfind('. '),
-                    trimmed.rfind('! '),
-                    trimmed.rfind('? ')
-                )
-                if last_period > 300:  # En az 300 karakter bırak
-                    response_text = trimmed[:last_period + 1] + '...'
-                else:
-                    # Cümle sınırı bulunamadıysa kelime sınırında kes
-                    last_space = trimmed.rfind(' ')
-                    if last_space > 300:
-                        response_text = trimmed[:last_space] + '...'
-                    else:
-                        # Hiçbir sınır bulunamadıysa direkt kes
-                        response_text = trimmed + '...'
-            
-            # 5. Final kontrol: Kesinlikle 450 karakterden uzun olamaz
-            if len(response_text) > 450:
-                response_text = response_text[:447] + '...'
-            
-            print(f"📱 SMS Response: Original={original_length} chars, Final={len(response_text)} chars")
+            response_text = format_sms_response(response_text)
         
         # Save response to database (store generation params for auditing)
         new_response = models.Response(
@@ -299,18 +247,20 @@ Bu cevabı genişlet, daha detaylı ve ikna edici hale getir."""
             temperature=generate_request.temperature,
             top_p=generate_request.top_p,
             repetition_penalty=generate_request.repetition_penalty,
-            latency_ms=response['latency_ms']
+            latency_ms=response['latency_ms'],
+            load_duration_ms=response.get('load_duration_ms'),
+            **usage_columns(response)
         )
         
         db.add(new_response)
         
         # Request'in sahibini bul ve total_requests sayısını artır
-        request_owner = db.query(models.User).filter(models.User.id == original_request.user_id).first()
+        request_owner = await db.get(models.User, original_request.user_id)
         if request_owner:
             request_owner.total_requests += 1
         
-        db.commit()
-        db.refresh(new_response)
+        await db.commit()
+        await db.refresh(new_response)
         
         return api_models.GenerateResponse(
             id=new_response.id,
@@ -318,18 +268,379 @@ Bu cevabı genişlet, daha detaylı ve ikna edici hale getir."""
             model_name=new_response.model_name,
             response_text=response_text,  # Trim edilmiş versiyonu döndür
             latency_ms=new_response.latency_ms,
-            created_at=new_response.created_at
+            created_at=new_response.created_at,
+            cache_status=response.get('cache_status'),
+            load_duration_ms=new_response.load_duration_ms,
+            tokens_used=new_response.tokens_used,
+            tokens_per_second=new_response.tokens_per_second,
+            prompt_eval_ms=new_response.prompt_eval_ms
         )
     except HTTPException:
         raise
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Model kuyruğu dolu, lütfen {e.retry_after} saniye sonra tekrar deneyin",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         import traceback
         error_detail = traceback.format_exc()
         print(f"❌ ERROR in generate_response: {str(e)}")
         print(f"❌ Traceback:\n{error_detail}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}\n\nTraceback:\n{error_detail}")
 
+def _save_stream_response(generate_request: api_models.GenerateRequest, request_owner_id: int, response_text: str, final: dict) -> dict:
+    """Stream sonucunu yaz (worker thread'inde); done olayı alanları commit öncesi okunur"""
+    db = SessionLocal()
+    try:
+        new_response = models.Response(
+            request_id=generate_request.request_id,
+            model_name=generate_request.model_name,
+            response_text=response_text,
+            temperature=generate_request.temperature,
+            top_p=generate_request.top_p,
+            repetition_penalty=generate_request.repetition_penalty,
+            latency_ms=final['latency_ms'],
+            ttft_ms=final.get('ttft_ms'),
+            load_duration_ms=final.get('load_duration_ms'),
+            **usage_columns(final)
+        )
+        db.add(new_response)
+        
+        request_owner = db.query(models.User).filter(models.User.id == request_owner_id).first()
+        if request_owner:
+            request_owner.total_requests += 1
+        
+        db.flush()
+        db.refresh(new_response)
+        saved = {
+            "id": new_response.id,
+            "request_id": new_response.request_id,
+            "model_name": new_response.model_name,
+            "response_text": response_text,
+            "latency_ms": new_response.latency_ms,
+            "ttft_ms": new_response.ttft_ms,
+            "load_duration_ms": new_response.load_duration_ms,
+            "tokens_used": new_response.tokens_used,
+            "tokens_per_second": new_response.tokens_per_second,
+            "prompt_eval_ms": new_response.prompt_eval_ms,
+            "created_at": new_response.created_at.isoformat() if new_response.created_at else None
+        }
+        db.commit()
+        return saved
+    except Exception as e:
+        db.rollback()
+        print(f"❌ ERROR in generate_response_stream: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+@router.post("/generate/stream")
+async def generate_response_stream(generate_request: api_models.GenerateRequest, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    """Generate response and relay tokens as Server-Sent-Events"""
+    # Get the original request (404 stream başlamadan önce dönsün)
+    original_request = await db.get(models.Request, generate_request.request_id)
+    if not original_request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    
+    # Kuyruk zaten doluysa stream açmadan 429 dön
+    try:
+        admission_controller.check_capacity(get_provider_name(generate_request.model_name), generate_request.model_name)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Model kuyruğu dolu, lütfen {e.retry_after} saniye sonra tekrar deneyin",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    prompt = build_prompt(original_request.original_text, generate_request.custom_input, generate_request.is_sms)
+    system_prompt = generate_request.system_prompt if generate_request.system_prompt else ""
+    history = await previous_context_async(db, generate_request.request_id, prompt) if generate_request.continue_previous else None
+    request_owner_id = original_request.user_id
+    
+    # get_async_db session'ı stream bitene kadar kapanmaz; bağlantıyı şimdi pool'a iade et
+    await release_async_connection(db)
+    
+    async def event_stream():
+        final = None
+        try:
+            await speculative_generator.claim(
+                generate_request.request_id,
+                generate_request.model_name,
+                prompt,
+                generate_request.temperature,
+                generate_request.top_p,
+                generate_request.repetition_penalty,
+                system_prompt=system_prompt,
+                history=history,
+                is_sms=generate_request.is_sms,
+                no_cache=generate_request.no_cache
+            )
+            async for event in stream_with_cache(
+                generate_request.model_name,
+                prompt,
+                temperature=generate_request.temperature,
+                top_p=generate_request.top_p,
+                repetition_penalty=generate_request.repetition_penalty,
+                system_prompt=system_prompt,
+                no_cache=generate_request.no_cache,
+                ticket_id=generate_request.ticket_id,
+                owner_id=current_user.id,
+                history=history,
+                is_sms=generate_request.is_sms
+            ):
+                if event['type'] == 'token':
+                    yield sse_event("token", {"text": event['text']})
+                elif event['type'] == 'error':
+                    yield sse_event("error", {"detail": f"Model error: {event['response_text']}"})
+                    return
+                else:
+                    final = event
+        except QueueFullError as e:
+            yield sse_event("error", {"detail": "Model kuyruğu dolu", "retry_after": e.retry_after})
+            return
+        
+        if final is None:
+            yield sse_event("error", {"detail": "Model error: stream ended unexpectedly"})
+            return
+        
+        # SMS temizliği tam metin üzerinde yapılır
+        response_text = final.get('response_text', '') or ''
+        if generate_request.is_sms and response_text:
+            response_text = format_sms_response(response_text)
+        
+        # Response satırı sadece stream tamamlandığında yazılır; kayıt thread'de yapılır ve
+        # istemci bu sırada koparsa da tamamlanır (üretim süresi harcandı)
+        try:
+            saved = await asyncio.shield(asyncio.to_thread(
+                _save_stream_response, generate_request, request_owner_id, response_text, final
+            ))
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error saving response: {str(e)}"})
+            return
+        
+        yield sse_event("done", {**saved, "cache_status": final.get('cache_status')})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # nginx proxy buffering'i kapat
+        }
+    )
+
+@router.post("/generate/jobs", status_code=202, response_model=api_models.GenerationJobStatus)
+async def create_generation_job(generate_request: api_models.GenerateRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Üretimi arka plan işi olarak başlat, job id hemen döner"""
+    original_request = db.query(models.Request).filter(models.Request.id == generate_request.request_id).first()
+    if not original_request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    
+    params = generate_request.dict(exclude={"request_id", "model_name", "ticket_id"})
+    job_id = await generation_job_manager.submit(current_user.id, generate_request.request_id, generate_request.model_name, params)
+    return await generation_job_manager.get(job_id)
+
+async def get_owned_job(job_id: str, current_user: User):
+    """İş sahibi veya admin değilse 404"""
+    job = await generation_job_manager.get(job_id)
+    if job is None or (job["user_id"] != current_user.id and not current_user.is_admin):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/generate/jobs/{job_id}", response_model=api_models.GenerationJobStatus)
+async def get_generation_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """İş durumu (polling); başarılıysa yazılan yanıtı da döner"""
+    return await get_owned_job(job_id, current_user)
+
+@router.get("/generate/jobs/{job_id}/events")
+async def stream_generation_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """İş olaylarını SSE ile gönder: status, token, done / error"""
+    await get_owned_job(job_id, current_user)
+    
+    async def event_stream():
+        # Bağlantı koparsa sadece abonelik biter, iş çalışmaya devam eder
+        async for event, data in generation_job_manager.subscribe(job_id):
+            yield sse_event(event, data)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+def _save_batch_responses(batch_request: api_models.BatchGenerateRequest, request_owner_id: int, successful: list) -> list:
+    """Başarılı batch yanıtlarını tek transaction'da yaz (worker thread'inde); id ve created_at commit öncesi okunur"""
+    db = SessionLocal()
+    try:
+        new_responses = [
+            models.Response(
+                request_id=batch_request.request_id,
+                model_name=model_name,
+                response_text=response_text,
+                temperature=batch_request.temperature,
+                top_p=batch_request.top_p,
+                repetition_penalty=batch_request.repetition_penalty,
+                latency_ms=response['latency_ms'],
+                load_duration_ms=response.get('load_duration_ms'),
+                **usage_columns(response)
+            )
+            for model_name, response, response_text in successful
+        ]
+        db.add_all(new_responses)
+        
+        request_owner = db.query(models.User).filter(models.User.id == request_owner_id).first()
+        if request_owner:
+            request_owner.total_requests += len(new_responses)
+        
+        db.flush()
+        # created_at sunucu varsayılanı; satır başına refresh yerine tek sorgu
+        created_at = dict(
+            db.query(models.Response.id, models.Response.created_at)
+            .filter(models.Response.id.in_([new_response.id for new_response in new_responses]))
+            .all()
+        )
+        saved = [
+            {
+                "id": new_response.id,
+                "model_name": new_response.model_name,
+                "latency_ms": new_response.latency_ms,
+                "created_at": created_at[new_response.id].isoformat() if created_at.get(new_response.id) else None
+            }
+            for new_response in new_responses
+        ]
+        db.commit()
+        return saved
+    except Exception as e:
+        db.rollback()
+        print(f"❌ ERROR in generate_response_batch: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+@router.post("/generate/batch")
+async def generate_response_batch(batch_request: api_models.BatchGenerateRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Aynı talep için birden fazla modeli eşzamanlı çalıştır, sonuçları bittikçe SSE ile gönder"""
+    # Sırayı koruyarak tekrar eden model adlarını ayıkla
+    model_names = list(dict.fromkeys(batch_request.model_names))
+    if not model_names:
+        raise HTTPException(status_code=400, detail="model_names must not be empty")
+    if len(model_names) > GENERATE_BATCH_MAX_MODELS:
+        raise HTTPException(status_code=400, detail=f"At most {GENERATE_BATCH_MAX_MODELS} models can be compared at once")
+    
+    original_request = db.query(models.Request).filter(models.Request.id == batch_request.request_id).first()
+    if not original_request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    
+    prompt = build_prompt(original_request.original_text, batch_request.custom_input, batch_request.is_sms)
+    system_prompt = batch_request.system_prompt if batch_request.system_prompt else ""
+    request_owner_id = original_request.user_id
+    
+    # get_db session'ı stream bitene kadar kapanmaz; bağlantıyı şimdi pool'a iade et
+    release_connection(db)
+    
+    async def run_model(model_name: str):
+        try:
+            response = await generate_with_cache(
+                model_name,
+                prompt,
+                temperature=batch_request.temperature,
+                top_p=batch_request.top_p,
+                repetition_penalty=batch_request.repetition_penalty,
+                system_prompt=system_prompt,
+                no_cache=batch_request.no_cache,
+                is_sms=batch_request.is_sms
+            )
+        except QueueFullError as e:
+            response = {
+                'response_text': f"Queue full, retry after {e.retry_after} seconds",
+                'latency_ms': 0,
+                'success': False,
+                'retry_after': e.retry_after
+            }
+        return model_name, response
+    
+    async def event_stream():
+        # Tüm modeller aynı anda başlar; toplam süre en yavaş modelle sınırlı
+        tasks = [asyncio.create_task(run_model(model_name)) for model_name in model_names]
+        results = []
+        save = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                model_name, response = await next_done
+                response_text = response.get('response_text', '') or ''
+                if response['success'] and batch_request.is_sms and response_text:
+                    response_text = format_sms_response(response_text)
+                results.append((model_name, response, response_text))
+                
+                yield sse_event("result", {
+                    "model_name": model_name,
+                    "success": response['success'],
+                    "response_text": response_text if response['success'] else None,
+                    "detail": None if response['success'] else f"Model error: {response['response_text']}",
+                    "latency_ms": response['latency_ms'],
+                    "cache_status": response.get('cache_status'),
+                    "retry_after": response.get('retry_after')
+                })
+        finally:
+            # İstemci bağlantıyı koparırsa bekleyen model çağrılarını iptal et
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            
+            # Bitmiş başarılı yanıtlar (istemci kopmuş olsa da) tek transaction'da yazılır
+            successful = [(model_name, response, text) for model_name, response, text in results if response['success']]
+            if successful:
+                save = asyncio.ensure_future(asyncio.to_thread(
+                    _save_batch_responses, batch_request, request_owner_id, successful
+                ))
+                try:
+                    await asyncio.shield(save)
+                except Exception:
+                    pass
+        
+        try:
+            saved = save.result() if save is not None else []
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error saving responses: {str(e)}"})
+            return
+        
+        yield sse_event("done", {"request_id": batch_request.request_id, "responses": saved})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@router.get("/generate/cache/stats")
+async def get_generation_cache_stats(current_user: User = Depends(get_current_user)):
+    """Üretim önbelleği hit/miss sayaçları - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    return generation_cache.get_stats()
+
+@router.get("/generate/queue")
+async def get_generation_queue(current_user: User = Depends(get_current_user)):
+    """Sağlayıcı ve model bazında aktif/bekleyen üretim sayıları"""
+    return admission_controller.snapshot()
+
+@router.get("/generate/queue/{ticket_id}")
+async def get_generation_queue_position(ticket_id: str, current_user: User = Depends(get_current_user)):
+    """Kuyruktaki üretimin pozisyonu ve tahmini bekleme süresi (sadece ticket sahibi)"""
+    status = admission_controller.ticket_status(ticket_id, owner_id=current_user.id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Ticket not found (finished or unknown)")
+    return status
+
 @router.post("/responses/feedback", response_model=api_models.FeedbackResponse)
 async def update_response_feedback(feedback: api_models.FeedbackRequest, db: Session = Depends(get_db)):
     """Update response feedback (selected/copied status)"""
@@ -358,39 +669,42 @@ async def update_response_feedback(feedback: api_models.FeedbackRequest, db: Ses
 
 @router.get("/responses/history")
 async def get_user_response_history(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db),
     skip: int = 0,
     limit: int = 50
 ):
     """Kullanıcının önceki yanıtlarını getir"""
     try:
-        # Bu kullanıcının tüm request'lerini al
-        user_requests = db.query(models.Request).filter(
-            models.Request.user_id == current_user.id
-        ).order_by(models.Request.created_at.desc()).offset(skip).limit(limit).all()
-        
-        # Her request için response'ları al
-        responses = []
-        for request in user_requests:
-            request_responses = db.query(models.Response).filter(
-                models.Response.request_id == request.id
-            ).order_by(models.Response.created_at.desc()).all()
-            
-            for response in request_responses:
-                responses.append({
-                    'id': response.id,
-                    'request_id': response.request_id,
-                    'response_text': response.response_text,
-                    'model_name': response.model_name,
-                    'created_at': response.created_at.isoformat(),
-                    'is_selected': response.is_selected,
-                    'copied': response.copied,
-                    'latency_ms': response.latency_ms
-                })
-        
-        # En yeni response'lara göre sırala
-        responses.sort(key=lambda x: x['created_at'], reverse=True)
+        # Bu kullanıcının request'leri (sadece id'ler gerekli)
+        request_ids = (await db.execute(
+            select(models.Request.id)
+            .where(models.Request.user_id == current_user.id)
+            .order_by(models.Request.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )).scalars().all()
+        
+        # Sayfadaki request'lerin response'ları tek sorguda (en yeniden eskiye)
+        request_responses = (await db.execute(
+            select(models.Response)
+            .where(models.Response.request_id.in_(request_ids))
+            .order_by(models.Response.created_at.desc())
+        )).scalars().all() if request_ids else []
+        
+        responses = [
+            {
+                'id': response.id,
+                'request_id': response.request_id,
+                'response_text': response.response_text,
+                'model_name': response.model_name,
+                'created_at': response.created_at.isoformat(),
+                'is_selected': response.is_selected,
+                'copied': response.copied,
+                'latency_ms': response.latency_ms
+            }
+            for response in request_responses
+        ]
         
         return {
             'success': True,
@@ -413,27 +727,27 @@ async def get_templates(
     department: Optional[str] = Query(None, description="Departman filtresi (sadece admin)"),
     limit: int = Query(50, ge=1, le=100, description="Sayfa başına kayıt sayısı"),
     offset: int = Query(0, ge=0, description="Başlangıç kaydı"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Şablonları listele - departman bazlı filtreleme"""
     try:
         # Base query - departman filtresi zorunlu
-        query = db.query(Template).filter(Template.is_active == True)
+        query = select(Template).where(Template.is_active == True)
         
         # Departman filtresi
         if current_user.is_admin and department:
             # Admin belirli bir departman seçmişse
-            query = query.filter(Template.department == department)
+            query = query.where(Template.department == department)
         elif not current_user.is_admin:
             # Admin değilse sadece kendi departmanını görebilir
-            query = query.filter(Template.department == current_user.department)
+            query = query.where(Template.department == current_user.department)
         # Admin ama department parametresi yoksa tüm departmanları görebilir (mevcut davranış)
         
         # Arama filtresi (başlık ve içerikte)
         if q:
             search_term = f"%{q}%"
-            query = query.filter(
+            query = query.where(
                 or_(
                     Template.title.ilike(search_term),
                     Template.content.ilike(search_term)
@@ -442,38 +756,33 @@ async def get_templates(
         
         # Kategori filtresi
         if category_id:
-            query = query.filter(Template.category_id == category_id)
+            query = query.where(Template.category_id == category_id)
         
         # Sadece kendi şablonlarım
         if only_mine:
-            query = query.filter(Template.owner_user_id == current_user.id)
+            query = query.where(Template.owner_user_id == current_user.id)
         
         # SMS filtresi
         if is_sms is not None:
             print(f"🔍 SMS Filter: is_sms={is_sms}, type={type(is_sms)}")
-            before_count = query.count()
-            query = query.filter(Template.is_sms == is_sms)
-            after_count = query.count()
-            print(f"🔍 SMS Filter result: before={before_count}, after={after_count}")
+            query = query.where(Template.is_sms == is_sms)
         
         # Toplam sayı
-        total_count = query.count()
+        total_count = await db.scalar(select(func.count()).select_from(query.subquery()))
         
-        # Sayfalama
-        templates = query.order_by(Template.created_at.desc()).offset(offset).limit(limit).all()
+        # Sayfalama - owner ve kategori aynı sorguda yüklenir (satır başına sorgu yok)
+        templates = (await db.execute(
+            query.options(
+                joinedload(Template.owner),
+                joinedload(Template.category)
+            ).order_by(Template.created_at.desc()).offset(offset).limit(limit)
+        )).scalars().all()
         
         # Response formatına çevir
         template_responses = []
         for template in templates:
-            # Owner bilgisi
-            owner = db.query(User).filter(User.id == template.owner_user_id).first()
-            owner_name = owner.full_name if owner else "Bilinmeyen"
-            
-            # Kategori bilgisi
-            category_name = None
-            if template.category_id:
-                category = db.query(TemplateCategory).filter(TemplateCategory.id == template.category_id).first()
-                category_name = category.name if category else None
+            owner_name = template.owner.full_name if template.owner else "Bilinmeyen"
+            category_name = template.category.name if template.category else None
             
             template_responses.append(api_models.TemplateResponse(
                 id=template.id,
@@ -639,37 +948,40 @@ async def use_template(
 @router.get("/categories", response_model=api_models.CategoryListResponse)
 async def get_categories(
     department: Optional[str] = Query(None, description="Departman filtresi (sadece admin)"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Kategorileri listele - departman bazlı filtreleme"""
     try:
         # Base query - departman filtresi zorunlu
-        query = db.query(TemplateCategory)
+        query = select(TemplateCategory)
         
         # Departman filtresi
         if current_user.is_admin and department:
             # Admin belirli bir departman seçmişse
-            query = query.filter(TemplateCategory.department == department)
+            query = query.where(TemplateCategory.department == department)
         elif not current_user.is_admin:
             # Admin değilse sadece kendi departmanını görebilir
-            query = query.filter(TemplateCategory.department == current_user.department)
+            query = query.where(TemplateCategory.department == current_user.department)
         # Admin ama department parametresi yoksa tüm departmanları görebilir (mevcut davranış)
         
-        categories = query.order_by(TemplateCategory.name).all()
+        categories = (await db.execute(
+            query.options(joinedload(TemplateCategory.owner)).order_by(TemplateCategory.name)
+        )).scalars().all()
+        
+        # Kategori başına aktif şablon sayısı tek sorguda
+        category_ids = [category.id for category in categories]
+        template_counts = dict((await db.execute(
+            select(Template.category_id, func.count(Template.id))
+            .where(Template.category_id.in_(category_ids), Template.is_active == True)
+            .group_by(Template.category_id)
+        )).all()) if category_ids else {}
         
         # Response formatına çevir
         category_responses = []
         for category in categories:
-            # Owner bilgisi
-            owner = db.query(User).filter(User.id == category.owner_user_id).first()
-            owner_name = owner.full_name if owner else "Bilinmeyen"
-            
-            # Bu kategorideki şablon sayısı
-            template_count = db.query(Template).filter(
-                Template.category_id == category.id,
-                Template.is_active == True
-            ).count()
+            owner_name = category.owner.full_name if category.owner else "Bilinmeyen"
+            template_count = template_counts.get(category.id, 0)
             
             # Mevcut kullanıcı owner mı?
             is_owner = category.owner_user_id == current_user.id
@@ -794,7 +1106,7 @@ async def delete_category(
 @router.get("/admin/departments")
 async def get_departments(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Departman listesi - sadece admin"""
     try:
@@ -817,4 +1129,84 @@ async def get_departments(
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error getting departments: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error getting departments: {str(e)}") 
+
+@router.get("/admin/model-warmup")
+async def get_model_warmup_status(current_user: User = Depends(get_current_user)):
+    """Ollama warm-up / keep-alive durumu - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    return model_warmup_scheduler.snapshot()
+
+@router.get("/admin/ollama-nodes")
+async def get_ollama_nodes(current_user: User = Depends(get_current_user)):
+    """Ollama node'ları: sağlık, in-flight istek ve gecikme istatistikleri - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    return ollama_client.pool.snapshot()
+
+@router.get("/admin/llm-providers")
+async def get_llm_providers(current_user: User = Depends(get_current_user)):
+    """Kayıtlı LLM provider'ları: yetenekler, politikalar ve model eşlemeleri - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    return provider_registry.snapshot()
+
+@router.get("/admin/speculative")
+async def get_speculative_stats(current_user: User = Depends(get_current_user)):
+    """Spekülatif ön üretim: kullanılan / iptal edilen spekülasyonlar ve boşa giden GPU süresi - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    return speculative_generator.snapshot()
+
+@router.get("/admin/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=200),
+    order_by: str = Query("total_ms", regex="^(total_ms|max_ms|avg_ms|count)$"),
+    current_user: User = Depends(get_current_user)
+):
+    """Eşiği aşan SQL sorguları (bu worker): toplam süreye göre, rota ve EXPLAIN planıyla - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    return slow_query_log.snapshot(limit, order_by)
+
+@router.delete("/admin/slow-queries")
+async def reset_slow_queries(current_user: User = Depends(get_current_user)):
+    """Yavaş sorgu kayıtlarını temizle - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    slow_query_log.reset()
+    return {"message": "Yavaş sorgu kayıtları temizlendi"}
+
+@router.get("/admin/profiles")
+async def list_profiles(current_user: User = Depends(get_current_user)):
+    """Kaydedilmiş istek profilleri (en yeniden eskiye, özet) - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    return {"profiles": await asyncio.to_thread(profile_store.list)}
+
+@router.get("/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("json", regex="^(json|folded)$", description="folded: flamegraph.pl / speedscope girdisi"),
+    current_user: User = Depends(get_current_user)
+):
+    """Tek bir istek profili: çağrı ağacı ve DB/LLM/SMTP/CPU dağılımı - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    profile = await asyncio.to_thread(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profil bulunamadı")
+    if format == "folded":
+        return PlainTextResponse("\n".join(profile["folded"]) + "\n")
+    return profile
+
+@router.get("/admin/loop-stalls")
+async def get_loop_stalls(
+    include_stacks: bool = Query(True),
+    current_user: User = Depends(get_current_user)
+):
+    """Event loop bloklanmaları (bu worker): rota bazlı toplamlar ve son stall'ların stack'leri - sadece admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
+    return loop_watchdog.snapshot(include_stacks)
@@ -1,12 +1,68 @@
 import httpx
+import json
 import time
-from typing import List, Dict, Any
-from config import GEMINI_API_KEY, GEMINI_API_URL
+from typing import List, Dict, Any, Optional, AsyncIterator
+from config import (
+    GEMINI_API_KEY,
+    GEMINI_API_URL,
+    GEMINI_POOL_MAX_CONNECTIONS,
+    GEMINI_POOL_MAX_KEEPALIVE,
+    GEMINI_HTTP2,
+    LLM_KEEPALIVE_EXPIRY_SEC,
+    LLM_CONNECT_TIMEOUT_SEC,
+    LLM_READ_TIMEOUT_SEC,
+    LLM_WRITE_TIMEOUT_SEC,
+    LLM_POOL_TIMEOUT_SEC,
+)
+from llm_client_base import BaseLLMClient
 
-class GeminiClient:
+class GeminiClient(BaseLLMClient):
+    DEFAULT_SYSTEM_PROMPT = """Bursa Nilüfer Belediyesi adına resmi yanıt hazırla.
+
+Yanıt şablonu:
+1. "Sayın," ile başla
+2. Vatandaşın talebini özetle (1-2 cümle)
+3. Personelin cevabını genişlet ve düzelt
+4. Resmi, kibar dil kullan
+5. "Saygılarımızla, Bursa Nilüfer Belediyesi" ile bitir
+
+Uzunluk: 150-300 kelime"""
+    CONNECT_ERROR_MESSAGE = "Connection Error: Could not connect to Gemini API. Please check your API key and internet connection."
+    
     def __init__(self):
         self.api_key = GEMINI_API_KEY
         self.base_url = GEMINI_API_URL.rstrip('/')
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    async def start(self):
+        """Create the shared, pooled HTTP/2 client (called from the app lifespan)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=GEMINI_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=GEMINI_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=GEMINI_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SEC
+                ),
+                timeout=httpx.Timeout(
+                    connect=LLM_CONNECT_TIMEOUT_SEC,
+                    read=LLM_READ_TIMEOUT_SEC,
+                    write=LLM_WRITE_TIMEOUT_SEC,
+                    pool=LLM_POOL_TIMEOUT_SEC
+                )
+            )
+    
+    async def aclose(self):
+        """Close the shared HTTP client and its keep-alive connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Lifespan dışında (script/test) kullanılırsa istemciyi tembel oluştur
+        if self._client is None:
+            await self.start()
+        return self._client
     
     async def get_models(self) -> List[Dict[str, Any]]:
         """Get list of available Gemini models"""
@@ -72,104 +128,171 @@ class GeminiClient:
             print(f"Error getting Gemini models: {e}")
             return []
     
-    async def generate_response(self, model_name: str, prompt: str, temperature: float = 0.7, top_p: float = 0.9, repetition_penalty: float = 1.2, system_prompt: str = "") -> Dict[str, Any]:
+    def _build_payload(self, full_prompt: str, temperature: float, top_p: float, history: Optional[List[Dict[str, str]]] = None,
+                       max_tokens: int = 4000, stop: Optional[List[str]] = None) -> Dict[str, Any]:
+        """generateContent / streamGenerateContent istek gövdesi"""
+        # Önceki konuşma (user -> model sırasıyla, assistant -> model rolü) son kullanıcı mesajından önce gelir
+        contents = [
+            {
+                "role": "model" if message["role"] == "assistant" else "user",
+                "parts": [{"text": message["content"]}]
+            }
+            for message in (history or [])
+        ]
+        contents.append({
+            "role": "user",
+            "parts": [
+                {
+                    "text": full_prompt
+                }
+            ]
+        })
+        generation_config = {
+            "temperature": temperature,
+            "topP": top_p,
+            "maxOutputTokens": max_tokens  # Moda göre bütçe (SMS / resmi yazı)
+        }
+        if stop:
+            generation_config["stopSequences"] = stop[:5]  # API en fazla 5 dizi kabul eder
+        return {
+            "contents": contents,
+            "generationConfig": generation_config
+        }
+    
+    def _model_endpoint(self, model_name: str, method: str) -> str:
+        """Model metod URL'i (generateContent, streamGenerateContent)"""
+        # GEMINI_API_URL (varsayılan v1beta; stub sunucu için yerel adres) - gemini-pro v1'de
+        base_url = self.base_url
+        if model_name == "gemini-pro":
+            base_url = base_url.replace("/v1beta/", "/v1/")
+        
+        return f"{base_url}/{model_name}:{method}"
+    
+    @staticmethod
+    def _extract_text(data: Dict[str, Any]) -> str:
+        """Yanıt (veya stream parçası) içindeki metni çıkar"""
+        parts = data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])
+        return ''.join(part.get('text', '') for part in parts)
+    
+    @staticmethod
+    def _finish_reason(data: Dict[str, Any]) -> Optional[str]:
+        """finishReason'ı Ollama ile aynı değerlere çevir (stop / length)"""
+        reason = (data.get('candidates') or [{}])[0].get('finishReason')
+        if reason is None:
+            return None
+        return {'STOP': 'stop', 'MAX_TOKENS': 'length'}.get(reason, reason.lower())
+    
+    @staticmethod
+    def _usage(data: Dict[str, Any], generation_ms: Optional[float]) -> Dict[str, Any]:
+        """usageMetadata token sayıları; tokens/sn üretim süresinden hesaplanır"""
+        usage = data.get('usageMetadata') or {}
+        completion_tokens = usage.get('candidatesTokenCount')
+        tokens_per_second = None
+        if completion_tokens and generation_ms:
+            tokens_per_second = completion_tokens / (generation_ms / 1000)
+        return {
+            'prompt_tokens': usage.get('promptTokenCount'),
+            'completion_tokens': completion_tokens,
+            'tokens_per_second': tokens_per_second
+        }
+    
+    async def generate_response(self, model_name: str, prompt: str, temperature: float = 0.7, top_p: float = 0.9, repetition_penalty: float = 1.2, system_prompt: str = "", history: Optional[List[Dict[str, str]]] = None, max_tokens: int = 4000, stop: Optional[List[str]] = None) -> Dict[str, Any]:
         """Generate response from Gemini model"""
         try:
             if not self.api_key:
-                return {
-                    'response_text': "Error: GEMINI_API_KEY not configured or invalid",
-                    'latency_ms': 0,
-                    'success': False
-                }
+                return self.config_error("GEMINI_API_KEY not configured or invalid")
             
             start_time = time.time()
             
-            # Frontend'den gelen sistem promptunu kullan, yoksa varsayılanı kullan
-            if system_prompt:
-                final_system_prompt = system_prompt
-            else:
-                # Varsayılan sistem promptu
-                final_system_prompt = """Bursa Nilüfer Belediyesi adına resmi yanıt hazırla.
-
-Yanıt şablonu:
-1. "Sayın," ile başla
-2. Vatandaşın talebini özetle (1-2 cümle)
-3. Personelin cevabını genişlet ve düzelt
-4. Resmi, kibar dil kullan
-5. "Saygılarımızla, Bursa Nilüfer Belediyesi" ile bitir
-
-Uzunluk: 150-300 kelime"""
-
-            full_prompt = f"{final_system_prompt}\n\n{prompt}"
+            full_prompt = self.build_full_prompt(prompt, system_prompt)
             
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    "X-Goog-Api-Key": self.api_key,
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "contents": [
-                        {
-                            "parts": [
-                                {
-                                    "text": full_prompt
-                                }
-                            ]
-                        }
-                    ],
-                    "generationConfig": {
-                        "temperature": temperature,
-                        "topP": top_p,
-                        "maxOutputTokens": 4000  # 2000'den 4000'e çıkarıldı
-                    }
-                }
-                
-                # Gemini API endpoint - gemini-pro için v1, diğerleri için v1beta
-                if model_name == "gemini-pro":
-                    api_version = "v1"
-                else:
-                    api_version = "v1beta"
-                
-                model_endpoint = f"https://generativelanguage.googleapis.com/{api_version}/models/{model_name}:generateContent"
-                
-                response = await client.post(model_endpoint, json=payload, headers=headers, timeout=300.0)
+            client = await self._get_client()
+            headers = {
+                "X-Goog-Api-Key": self.api_key,
+                "Content-Type": "application/json"
+            }
+            
+            payload = self._build_payload(full_prompt, temperature, top_p, history, max_tokens, stop)
+            model_endpoint = self._model_endpoint(model_name, "generateContent")
+            
+            response = await client.post(model_endpoint, json=payload, headers=headers)
+            
+            latency_ms = self.elapsed_ms(start_time)
+            
+            if response.status_code == 200:
+                data = response.json()
                 
-                end_time = time.time()
-                latency_ms = (end_time - start_time) * 1000
+                response_text = self._extract_text(data)
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    response_text = data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-                    
-                    return {
-                        'response_text': response_text,
-                        'latency_ms': latency_ms,
-                        'success': True
-                    }
-                else:
-                    error_text = f"HTTP {response.status_code}: {response.text}"
-                    return {
-                        'response_text': error_text,
-                        'latency_ms': latency_ms,
-                        'success': False
-                    }
-        except httpx.TimeoutException:
-            return {
-                'response_text': "Timeout: Request took too long (300 seconds). Model may be too slow or overloaded.",
-                'latency_ms': 0,
-                'success': False
+                return {
+                    'response_text': response_text,
+                    'latency_ms': latency_ms,
+                    **self._usage(data, latency_ms),
+                    'finish_reason': self._finish_reason(data),
+                    'success': True
+                }
+            else:
+                return self.http_error(response.status_code, response.text, latency_ms)
+        except Exception as e:
+            return self.exception_error(e)
+    
+    async def stream_response(self, model_name: str, prompt: str, temperature: float = 0.7, top_p: float = 0.9, repetition_penalty: float = 1.2, system_prompt: str = "", history: Optional[List[Dict[str, str]]] = None, max_tokens: int = 4000, stop: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream response tokens from Gemini model (streamGenerateContent, SSE)"""
+        if not self.api_key:
+            yield {'type': 'error', **self.config_error("GEMINI_API_KEY not configured or invalid")}
+            return
+        
+        start_time = time.time()
+        ttft_ms = None
+        usage_data = {}
+        finish_reason = None
+        chunks = []
+        try:
+            full_prompt = self.build_full_prompt(prompt, system_prompt)
+            
+            client = await self._get_client()
+            headers = {
+                "X-Goog-Api-Key": self.api_key,
+                "Content-Type": "application/json"
             }
-        except httpx.ConnectError:
-            return {
-                'response_text': "Connection Error: Could not connect to Gemini API. Please check your API key and internet connection.",
-                'latency_ms': 0,
-                'success': False
+            payload = self._build_payload(full_prompt, temperature, top_p, history, max_tokens, stop)
+            model_endpoint = self._model_endpoint(model_name, "streamGenerateContent")
+            
+            async with client.stream("POST", model_endpoint, params={"alt": "sse"}, json=payload, headers=headers) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    yield {
+                        'type': 'error',
+                        **self.http_error(response.status_code, body.decode(errors='replace'), self.elapsed_ms(start_time))
+                    }
+                    return
+                
+                async for line in response.aiter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    data = json.loads(line[len('data:'):].strip())
+                    finish_reason = self._finish_reason(data) or finish_reason
+                    if data.get('usageMetadata'):
+                        # Kümülatif; son parçadaki değer toplamdır
+                        usage_data = data
+                    token = self._extract_text(data)
+                    if token:
+                        if ttft_ms is None:
+                            ttft_ms = self.elapsed_ms(start_time)
+                        chunks.append(token)
+                        yield {'type': 'token', 'text': token}
+            
+            latency_ms = self.elapsed_ms(start_time)
+            # Token hızı ilk token sonrası üretim süresi üzerinden
+            generation_ms = latency_ms - ttft_ms if ttft_ms is not None else latency_ms
+            yield {
+                'type': 'done',
+                'response_text': ''.join(chunks),
+                'latency_ms': latency_ms,
+                'ttft_ms': ttft_ms,
+                **self._usage(usage_data, generation_ms),
+                'finish_reason': finish_reason,
+                'success': True
             }
         except Exception as e:
-            return {
-                'response_text': f"Error: {str(e)}",
-                'latency_ms': 0,
-                'success': False
-            } 
\ No newline at end of file
+            yield {'type': 'error', **self.exception_error(e)}
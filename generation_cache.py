@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+import models
+from connection import SessionLocal
+from metrics import count_cache_event
+from config import (
+    GENERATION_CACHE_ENABLED,
+    GENERATION_CACHE_MAX_ENTRIES,
+    GENERATION_CACHE_TTL_SEC,
+    GENERATION_CACHE_PERSISTENT,
+)
+
+# Önbellek durumları (yanıtta ve istatistiklerde kullanılır)
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+CACHE_COALESCED = "coalesced"
+CACHE_BYPASS = "bypass"
+
+class _InflightGeneration:
+    """
+    Süren upstream üretim ve onu bekleyen çağrı sayısı.
+
+    future ya önbelleğin sahip olduğu üretim görevidir (son bekleyen ayrılınca iptal edilir) ya da
+    bir stream'in done olayıyla çözülen future'dır (stream'i çağıran yönetir, iptal edilmez).
+    """
+
+    def __init__(self, future: asyncio.Future, cancellable: bool = True):
+        self.future = future
+        self.cancellable = cancellable
+        self.waiters = 0
+
+class InflightAbandoned(Exception):
+    """Katılınan stream sonuç üretmeden bitti; bekleyen kendi üretimini yapmalı"""
+
+class GenerationCache:
+    """
+    Üretim sonuçları için iki katmanlı önbellek.
+
+    - Bellek katmanı: LRU + TTL (worker başına)
+    - Kalıcı katman (opsiyonel): generation_cache tablosu, worker'lar arasında paylaşılır
+    - Aynı anahtarla eşzamanlı gelen çağrılar tek bir upstream isteğinde birleştirilir
+    """
+
+    def __init__(self, max_entries: int = GENERATION_CACHE_MAX_ENTRIES, ttl_seconds: int = GENERATION_CACHE_TTL_SEC,
+                 persistent: bool = GENERATION_CACHE_PERSISTENT, enabled: bool = GENERATION_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, _InflightGeneration] = {}
+        self.stats = {
+            "hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "bypassed": 0
+        }
+
+    def _count(self, stat: str):
+        self.stats[stat] += 1
+        count_cache_event(stat)
+
+    @staticmethod
+    def make_key(model_name: str, full_prompt: str, temperature: float, top_p: float, repetition_penalty: float, **params) -> str:
+        """Tam render edilmiş prompt ve örnekleme parametrelerinden anahtar üret"""
+        key_data = {
+            "model_name": model_name,
+            "prompt": full_prompt,
+            "temperature": temperature,
+            "top_p": top_p,
+            "repetition_penalty": repetition_penalty,
+        }
+        key_data.update(params)
+        payload = json.dumps(key_data, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def _set_memory(self, key: str, result: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_persistent(self, key: str) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            entry = db.query(models.GenerationCacheEntry).filter(
+                models.GenerationCacheEntry.cache_key == key,
+                models.GenerationCacheEntry.expires_at > datetime.utcnow()
+            ).first()
+            if entry is None:
+                return None
+            return {
+                'response_text': entry.response_text,
+                'latency_ms': entry.latency_ms,
+                'success': True
+            }
+        finally:
+            db.close()
+
+    def _set_persistent(self, key: str, model_name: str, result: Dict[str, Any]):
+        db = SessionLocal()
+        try:
+            entry = db.query(models.GenerationCacheEntry).filter(models.GenerationCacheEntry.cache_key == key).first()
+            if entry is None:
+                entry = models.GenerationCacheEntry(cache_key=key, model_name=model_name)
+                db.add(entry)
+            entry.response_text = result['response_text']
+            entry.latency_ms = result.get('latency_ms')
+            entry.expires_at = datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error writing generation cache entry: {e}")
+        finally:
+            db.close()
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Önce bellekte, sonra (açıksa) veritabanında ara"""
+        result = self._get_memory(key)
+        if result is not None:
+            self._count("hits")
+            return result
+        if self.persistent:
+            result = await asyncio.to_thread(self._get_persistent, key)
+            if result is not None:
+                self._count("persistent_hits")
+                self._set_memory(key, result)
+                return result
+        return None
+
+    async def store(self, key: str, model_name: str, result: Dict[str, Any]):
+        """Sadece başarılı sonuçları önbelleğe yaz"""
+        if not self.enabled or not result.get('success'):
+            return
+        cached = {
+            'response_text': result['response_text'],
+            'latency_ms': result.get('latency_ms'),
+            'success': True
+        }
+        self._set_memory(key, cached)
+        if self.persistent:
+            await asyncio.to_thread(self._set_persistent, key, model_name, cached)
+
+    async def get_or_generate(self, key: str, model_name: str, generate: Callable[[], Awaitable[Dict[str, Any]]],
+                              no_cache: bool = False) -> Tuple[Dict[str, Any], str]:
+        """Önbellekten döndür veya üret; aynı anahtarlı eşzamanlı çağrıları birleştir"""
+        if not self.enabled or no_cache:
+            self._count("bypassed")
+            result = await generate()
+            await self.store(key, model_name, result)
+            return result, CACHE_BYPASS
+
+        cached = await self.lookup(key)
+        if cached is not None:
+            return dict(cached), CACHE_HIT
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                result = await self._wait(inflight)
+                self._count("coalesced")
+                return dict(result), CACHE_COALESCED
+            except InflightAbandoned:
+                # Stream yarıda kaldı (kaydı done callback'iyle silindi); baştan dene
+                return await self.get_or_generate(key, model_name, generate, no_cache)
+
+        self._count("misses")
+        # Üretim, ilk çağıranın değil önbelleğin görevidir: ilk çağıran ayrılsa da bekleyenler sonucu alır
+        inflight = _InflightGeneration(asyncio.create_task(self._generate_and_store(key, model_name, generate)))
+        inflight.future.add_done_callback(lambda task: self._finish_inflight(key, inflight))
+        self._inflight[key] = inflight
+        result = await self._wait(inflight)
+        # Çağıran sonucu değiştirir (latency, cache_status); bekleyenlerle aynı dict paylaşılmasın
+        return dict(result), CACHE_MISS
+
+    async def join_inflight(self, key: str) -> Optional[Dict[str, Any]]:
+        """Aynı anahtarlı süren üretim varsa ona katıl (stream'ler için); yoksa veya yarıda kaldıysa None"""
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            return None
+        try:
+            result = await self._wait(inflight)
+        except InflightAbandoned:
+            return None
+        self._count("coalesced")
+        return dict(result)
+
+    def begin_stream(self, key: str, no_cache: bool = False) -> Optional[asyncio.Future]:
+        """
+        Upstream stream başlarken çağrılır: miss/bypass sayılır ve stream, aynı anahtarlı
+        sonraki çağrıların bekleyebileceği süren üretim olarak kaydedilir. Future end_stream ile çözülür.
+        """
+        if not self.enabled or no_cache:
+            self._count("bypassed")
+            return None
+        self._count("misses")
+        if key in self._inflight:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        inflight = _InflightGeneration(future, cancellable=False)
+        future.add_done_callback(lambda _: self._finish_inflight(key, inflight))
+        self._inflight[key] = inflight
+        return future
+
+    @staticmethod
+    def end_stream(future: Optional[asyncio.Future], result: Optional[Dict[str, Any]]):
+        """Stream sonucunu bekleyenlere ver; sonuç yoksa (koptu / iptal) bekleyenler kendisi üretir"""
+        if future is None or future.done():
+            return
+        if result is None:
+            future.set_exception(InflightAbandoned())
+        else:
+            future.set_result(result)
+
+    async def _generate_and_store(self, key: str, model_name: str, generate: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        result = await generate()
+        await self.store(key, model_name, result)
+        return result
+
+    def _finish_inflight(self, key: str, inflight: _InflightGeneration):
+        # Görev başlamadan iptal edilse de kayıt silinir
+        if self._inflight.get(key) is inflight:
+            del self._inflight[key]
+        # Kimse beklemiyorsa "exception was never retrieved" uyarısını engelle
+        if not inflight.future.cancelled():
+            inflight.future.exception()
+
+    async def _wait(self, inflight: _InflightGeneration) -> Dict[str, Any]:
+        """
+        Ortak üretimi bekle. Bekleyenin iptali diğer bekleyenleri etkilemez; son bekleyen
+        de iptal edilirse üretim durdurulur (sonucu isteyen kalmadı).
+        """
+        inflight.waiters += 1
+        try:
+            return await asyncio.shield(inflight.future)
+        finally:
+            inflight.waiters -= 1
+            if inflight.cancellable and inflight.waiters == 0 and not inflight.future.done():
+                inflight.future.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.stats["hits"] + self.stats["persistent_hits"] + self.stats["coalesced"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "enabled": self.enabled,
+            "persistent": self.persistent
+        }
+
+# Global cache instance
+generation_cache = GenerationCache()
@@ -0,0 +1,453 @@
+import asyncio
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, AsyncIterator
+from sqlalchemy import or_, and_
+import models
+from connection import SessionLocal
+from config import GENERATION_JOB_WORKERS, GENERATION_JOB_STALE_SEC, GENERATION_JOB_HEARTBEAT_SEC
+from admission import QueueFullError
+from speculative import speculative_generator
+from generation_service import (
+    stream_with_cache,
+    build_prompt,
+    format_sms_response,
+    previous_context,
+    usage_columns,
+)
+
+# İş durumları
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# SSE abonesi bu süre olay almazsa durumu veritabanından okur
+# (iş başka bir worker process'inde çalışıyor olabilir)
+SUBSCRIBER_POLL_SEC = 2.0
+
+class GenerationJobManager:
+    """
+    Asenkron üretim işleri.
+
+    - submit() işi generation_jobs tablosuna yazar ve kuyruğa koyar, hemen döner
+    - Worker'lar işi atomik olarak sahiplenir (queued -> running), yanıtı
+      stream eder ve Response satırını işin durumuyla aynı transaction'da yazar
+    - İstemci bağlantısı koparsa iş devam eder. Çalışan işler sahibi olan process'i
+      ("host:pid:nonce") kaydeder ve GENERATION_JOB_HEARTBEAT_SEC'te bir heartbeat yazar;
+      sahibi ölmüş (aynı host'ta pid yok / pid yeniden kullanılmış) veya heartbeat'i
+      GENERATION_JOB_STALE_SEC'ten eski işler start() ve periyodik taramada yeniden kuyruğa alınır
+    """
+
+    def __init__(self, worker_count: int = GENERATION_JOB_WORKERS):
+        self.worker_count = max(1, worker_count)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        # start() içinde belirlenir (fork sonrası pid doğru olsun)
+        self.owner: Optional[str] = None
+
+    # --- Veritabanı yardımcıları (asyncio.to_thread içinde çalışır) ---
+
+    def _create_job(self, user_id: int, request_id: int, model_name: str, params: Dict[str, Any]) -> str:
+        db = SessionLocal()
+        try:
+            job = models.GenerationJob(
+                id=uuid.uuid4().hex,
+                user_id=user_id,
+                request_id=request_id,
+                model_name=model_name,
+                params=json.dumps(params, ensure_ascii=False),
+                status=JOB_QUEUED
+            )
+            db.add(job)
+            db.commit()
+            return job.id
+        finally:
+            db.close()
+
+    def _owner_gone(self, owner: Optional[str]) -> bool:
+        """Sahip process'in öldüğü kesin mi (sadece aynı host için bilinebilir; diğerleri heartbeat ile)"""
+        try:
+            host, pid, nonce = owner.rsplit(":", 2)
+            pid = int(pid)
+        except (AttributeError, ValueError):
+            return False
+        if host != socket.gethostname():
+            return False
+        if pid == os.getpid():
+            # Aynı pid başka bir boot'a ait (kill -9 sonrası pid yeniden kullanıldı)
+            return owner != self.owner
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+
+    def _recover_jobs(self, include_queued: bool) -> List[str]:
+        """Sahibi ölmüş veya heartbeat'i eskimiş 'running' işleri ve istenirse bekleyenleri kuyruğa al"""
+        stale_before = datetime.utcnow() - timedelta(seconds=GENERATION_JOB_STALE_SEC)
+        db = SessionLocal()
+        try:
+            stale_ids = [row[0] for row in db.query(models.GenerationJob.id).filter(
+                models.GenerationJob.status == JOB_RUNNING,
+                or_(
+                    models.GenerationJob.heartbeat_at < stale_before,
+                    # Heartbeat kolonu öncesinden kalan işler
+                    and_(
+                        models.GenerationJob.heartbeat_at == None,
+                        or_(models.GenerationJob.started_at == None, models.GenerationJob.started_at < stale_before)
+                    )
+                )
+            ).all()]
+            running = db.query(models.GenerationJob.id, models.GenerationJob.owner).filter(
+                models.GenerationJob.status == JOB_RUNNING,
+                models.GenerationJob.owner != None
+            ).all()
+            orphan_ids = [job_id for job_id, owner in running if self._owner_gone(owner)]
+            job_ids = list(dict.fromkeys(stale_ids + orphan_ids))
+            if job_ids:
+                # Sadece hâlâ running olanlar (arada bitmiş olabilir)
+                db.query(models.GenerationJob).filter(
+                    models.GenerationJob.id.in_(job_ids),
+                    models.GenerationJob.status == JOB_RUNNING
+                ).update({"status": JOB_QUEUED, "owner": None}, synchronize_session=False)
+                db.commit()
+            if include_queued:
+                rows = db.query(models.GenerationJob.id).filter(
+                    models.GenerationJob.status == JOB_QUEUED
+                ).order_by(models.GenerationJob.created_at).all()
+                job_ids = [row[0] for row in rows]
+            return job_ids
+        finally:
+            db.close()
+
+    def _claim_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """queued -> running; başka bir worker/process aldıysa None"""
+        db = SessionLocal()
+        try:
+            claimed = db.query(models.GenerationJob).filter(
+                models.GenerationJob.id == job_id,
+                models.GenerationJob.status == JOB_QUEUED
+            ).update({
+                "status": JOB_RUNNING,
+                "started_at": datetime.utcnow(),
+                "owner": self.owner,
+                "heartbeat_at": datetime.utcnow(),
+                "attempts": models.GenerationJob.attempts + 1
+            }, synchronize_session=False)
+            db.commit()
+            if not claimed:
+                return None
+
+            job = db.query(models.GenerationJob).filter(models.GenerationJob.id == job_id).first()
+            original_request = db.query(models.Request).filter(models.Request.id == job.request_id).first()
+            if original_request is None:
+                return {"job_id": job_id, "missing_request": True}
+            params = json.loads(job.params)
+            prompt = build_prompt(original_request.original_text, params["custom_input"], params.get("is_sms"))
+            history = previous_context(db, job.request_id, prompt) if params.get("continue_previous") else None
+            return {
+                "job_id": job_id,
+                "request_id": job.request_id,
+                "request_owner_id": original_request.user_id,
+                "original_text": original_request.original_text,
+                "model_name": job.model_name,
+                "params": params,
+                "history": history
+            }
+        finally:
+            db.close()
+
+    def _heartbeat(self):
+        """Bu process'in çalıştırdığı işlerin heartbeat'ini yenile"""
+        db = SessionLocal()
+        try:
+            db.query(models.GenerationJob).filter(
+                models.GenerationJob.status == JOB_RUNNING,
+                models.GenerationJob.owner == self.owner
+            ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        db = SessionLocal()
+        try:
+            values = {"status": status, "error": error}
+            if status in FINISHED_STATES:
+                values["finished_at"] = datetime.utcnow()
+            db.query(models.GenerationJob).filter(models.GenerationJob.id == job_id).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _save_result(self, claim: Dict[str, Any], response_text: str, final: Dict[str, Any]) -> int:
+        """Response satırı, sayaç ve iş durumu tek transaction'da"""
+        params = claim["params"]
+        db = SessionLocal()
+        try:
+            new_response = models.Response(
+                request_id=claim["request_id"],
+                model_name=claim["model_name"],
+                response_text=response_text,
+                temperature=params["temperature"],
+                top_p=params["top_p"],
+                repetition_penalty=params["repetition_penalty"],
+                latency_ms=final['latency_ms'],
+                ttft_ms=final.get('ttft_ms'),
+                load_duration_ms=final.get('load_duration_ms'),
+                **usage_columns(final)
+            )
+            db.add(new_response)
+            db.flush()
+
+            request_owner = db.query(models.User).filter(models.User.id == claim["request_owner_id"]).first()
+            if request_owner:
+                request_owner.total_requests += 1
+
+            db.query(models.GenerationJob).filter(models.GenerationJob.id == claim["job_id"]).update({
+                "status": JOB_SUCCEEDED,
+                "response_id": new_response.id,
+                "error": None,
+                "finished_at": datetime.utcnow()
+            }, synchronize_session=False)
+            db.commit()
+            return new_response.id
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            job = db.query(models.GenerationJob).filter(models.GenerationJob.id == job_id).first()
+            if job is None:
+                return None
+            result = {
+                "job_id": job.id,
+                "user_id": job.user_id,
+                "request_id": job.request_id,
+                "model_name": job.model_name,
+                "status": job.status,
+                "error": job.error,
+                "attempts": job.attempts,
+                "created_at": job.created_at,
+                "started_at": job.started_at,
+                "finished_at": job.finished_at,
+                "response": None
+            }
+            if job.response is not None:
+                result["response"] = {
+                    "id": job.response.id,
+                    "request_id": job.response.request_id,
+                    "model_name": job.response.model_name,
+                    "response_text": job.response.response_text,
+                    "latency_ms": job.response.latency_ms,
+                    "created_at": job.response.created_at,
+                    "load_duration_ms": job.response.load_duration_ms,
+                    "tokens_used": job.response.tokens_used,
+                    "tokens_per_second": job.response.tokens_per_second,
+                    "prompt_eval_ms": job.response.prompt_eval_ms
+                }
+            return result
+        finally:
+            db.close()
+
+    # --- Olaylar (SSE aboneleri) ---
+
+    def _publish(self, job_id: str, event: str, data: Dict[str, Any]):
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait((event, data))
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[tuple]:
+        """İşin olaylarını (status, token, done, error) bitene kadar üret"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            # Abone olduktan sonra oku ki arada kaçan geçiş olmasın
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield "status", {"job_id": job_id, "status": job["status"]}
+            if job["status"] in FINISHED_STATES:
+                yield self._final_event(job)
+                return
+
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=SUBSCRIBER_POLL_SEC)
+                except asyncio.TimeoutError:
+                    job = await self.get(job_id)
+                    if job is not None and job["status"] in FINISHED_STATES:
+                        yield self._final_event(job)
+                        return
+                    continue
+                if event in ("done", "error"):
+                    # Son hali her zaman veritabanından (SMS formatı, response id)
+                    job = await self.get(job_id)
+                    yield self._final_event(job) if job is not None else (event, data)
+                    return
+                yield event, data
+        finally:
+            subscribers = self._subscribers.get(job_id, [])
+            if queue in subscribers:
+                subscribers.remove(queue)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    @staticmethod
+    def _final_event(job: Dict[str, Any]) -> tuple:
+        if job["status"] == JOB_SUCCEEDED:
+            return "done", {"job_id": job["job_id"], "status": job["status"], "response": job["response"]}
+        return "error", {"job_id": job["job_id"], "status": job["status"], "detail": job["error"]}
+
+    # --- İş yaşam döngüsü ---
+
+    async def submit(self, user_id: int, request_id: int, model_name: str, params: Dict[str, Any]) -> str:
+        job_id = await asyncio.to_thread(self._create_job, user_id, request_id, model_name, params)
+        await self._ensure_queue().put(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._load_job, job_id)
+
+    def _ensure_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    async def _execute(self, job_id: str):
+        claim = await asyncio.to_thread(self._claim_job, job_id)
+        if claim is None:
+            return
+        if claim.get("missing_request"):
+            await asyncio.to_thread(self._set_status, job_id, JOB_FAILED, "Request not found")
+            self._publish(job_id, "error", {"detail": "Request not found"})
+            return
+
+        params = claim["params"]
+        self._publish(job_id, "status", {"job_id": job_id, "status": JOB_RUNNING})
+        prompt = build_prompt(claim["original_text"], params["custom_input"], params.get("is_sms"))
+        final = None
+        try:
+            await speculative_generator.claim(
+                claim["request_id"],
+                claim["model_name"],
+                prompt,
+                params["temperature"],
+                params["top_p"],
+                params["repetition_penalty"],
+                system_prompt=params.get("system_prompt") or "",
+                history=claim["history"],
+                is_sms=params.get("is_sms", False),
+                no_cache=params.get("no_cache", False)
+            )
+            async for event in stream_with_cache(
+                claim["model_name"],
+                prompt,
+                temperature=params["temperature"],
+                top_p=params["top_p"],
+                repetition_penalty=params["repetition_penalty"],
+                system_prompt=params.get("system_prompt") or "",
+                no_cache=params.get("no_cache", False),
+                ticket_id=job_id,
+                history=claim["history"],
+                is_sms=params.get("is_sms", False)
+            ):
+                if event['type'] == 'token':
+                    self._publish(job_id, "token", {"text": event['text']})
+                elif event['type'] == 'error':
+                    raise RuntimeError(f"Model error: {event['response_text']}")
+                else:
+                    final = event
+            if final is None:
+                raise RuntimeError("Model error: stream ended unexpectedly")
+
+            response_text = final.get('response_text', '') or ''
+            if params.get("is_sms") and response_text:
+                response_text = format_sms_response(response_text)
+            await asyncio.to_thread(self._save_result, claim, response_text, final)
+            self._publish(job_id, "done", {"job_id": job_id})
+        except QueueFullError as e:
+            # Kabul kuyruğu dolu: işi geri bırak, biraz sonra tekrar dene
+            await asyncio.to_thread(self._set_status, job_id, JOB_QUEUED)
+            self._publish(job_id, "status", {"job_id": job_id, "status": JOB_QUEUED, "retry_after": e.retry_after})
+            asyncio.get_running_loop().call_later(e.retry_after, self._ensure_queue().put_nowait, job_id)
+        except asyncio.CancelledError:
+            # Kapanışta yarım kalan iş bir sonraki startup'ta kurtarılır
+            await asyncio.shield(asyncio.to_thread(self._set_status, job_id, JOB_QUEUED))
+            raise
+        except Exception as e:
+            print(f"❌ ERROR in generation job {job_id}: {str(e)}")
+            await asyncio.to_thread(self._set_status, job_id, JOB_FAILED, str(e))
+            self._publish(job_id, "error", {"detail": str(e)})
+
+    async def _worker(self):
+        queue = self._ensure_queue()
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._execute(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in generation job worker: {e}")
+            finally:
+                queue.task_done()
+
+    async def _requeue(self, include_queued: bool):
+        job_ids = await asyncio.to_thread(self._recover_jobs, include_queued)
+        for job_id in job_ids:
+            self._ensure_queue().put_nowait(job_id)
+        if job_ids:
+            print(f"♻️ Requeued {len(job_ids)} generation jobs")
+
+    async def _recovery_loop(self):
+        # Kendi işlerimizin heartbeat'i + çalışırken çöken başka bir process'in yarım bıraktığı işler
+        while True:
+            await asyncio.sleep(GENERATION_JOB_HEARTBEAT_SEC)
+            try:
+                await asyncio.to_thread(self._heartbeat)
+                await self._requeue(include_queued=False)
+            except Exception as e:
+                print(f"Error recovering generation jobs: {e}")
+
+    async def start(self):
+        if self._workers:
+            return
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        try:
+            await self._requeue(include_queued=True)
+        except Exception as e:
+            print(f"Error recovering generation jobs: {e}")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._workers.append(asyncio.create_task(self._recovery_loop()))
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        for task in self._workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.worker_count if self._workers else 0,
+            "queued_local": self._queue.qsize() if self._queue is not None else 0,
+            "subscribers": sum(len(queues) for queues in self._subscribers.values())
+        }
+
+# Global job manager instance
+generation_job_manager = GenerationJobManager()
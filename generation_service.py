@@ -0,0 +1,308 @@
+import json
+import re
+import time
+from typing import Dict, Any, AsyncIterator, Optional, List, Callable
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from llm_providers import provider_registry, ollama_client, gemini_client
+from generation_cache import generation_cache, CACHE_HIT, CACHE_MISS, CACHE_COALESCED, CACHE_BYPASS
+from admission import admission_controller
+from config import SMS_MAX_OUTPUT_TOKENS, LETTER_MAX_OUTPUT_TOKENS
+
+SMS_MAX_CHARS = 450
+
+# Resmi yazı kapanışı: model buraya geldiğinde durdurulur, sabit satırı biz ekleriz
+CLOSING_STOP = "Saygılarımızla"
+CLOSING_LINE = "Saygılarımızla, Bursa Nilüfer Belediyesi"
+
+# Sağlayıcıdan gelen token kullanım alanları (önbellekten dönen yanıtlarda token harcanmaz)
+USAGE_FIELDS = ('prompt_tokens', 'completion_tokens', 'prompt_eval_ms', 'eval_duration_ms', 'tokens_per_second')
+
+def get_client(model_name: str):
+    """Model adına göre kullanılacak istemciyi seç (provider registry üzerinden)"""
+    return provider_registry.resolve(model_name).client
+
+def get_provider_name(model_name: str) -> str:
+    """Admission control ve metrikler için sağlayıcı adı"""
+    return provider_registry.resolve(model_name).name
+
+def output_budget(model_name: str, system_prompt: str = "", is_sms: bool = False) -> Dict[str, Any]:
+    """Moda göre çıktı token bütçesi ve stop dizileri"""
+    if is_sms:
+        # SMS'te kapanış satırı istenmez; model kapanışa geçtiği anda dur
+        return {'max_tokens': SMS_MAX_OUTPUT_TOKENS, 'stop': [CLOSING_STOP], 'closing': None}
+    if CLOSING_STOP in get_client(model_name).resolve_system_prompt(system_prompt):
+        return {'max_tokens': LETTER_MAX_OUTPUT_TOKENS, 'stop': [CLOSING_STOP], 'closing': CLOSING_LINE}
+    # Özel sistem promptu kapanış istemiyorsa metni kesme
+    return {'max_tokens': LETTER_MAX_OUTPUT_TOKENS, 'stop': [], 'closing': None}
+
+def closing_suffix(result: Dict[str, Any], budget: Dict[str, Any]) -> str:
+    """Stop dizisinde kesilen resmi yazıya eklenecek kapanış metni (gerekmiyorsa boş)"""
+    text = result.get('response_text') or ''
+    if not budget['closing'] or not result.get('success') or result.get('finish_reason') != 'stop':
+        return ''
+    if not text.strip() or CLOSING_STOP in text:
+        return ''
+    newlines = text[len(text.rstrip()):].count('\n')
+    return '\n' * max(0, 2 - newlines) + budget['closing']
+
+def make_cache_key(model_name: str, prompt: str, temperature: float, top_p: float, repetition_penalty: float, system_prompt: str = "", history: Optional[List[Dict[str, str]]] = None, budget: Optional[Dict[str, Any]] = None) -> str:
+    """Tam render edilmiş prompt (ve varsa önceki konuşma / çıktı bütçesi) üzerinden önbellek anahtarı"""
+    full_prompt = get_client(model_name).build_full_prompt(prompt, system_prompt)
+    params = {"history": history} if history else {}
+    if budget:
+        params["budget"] = budget
+    return generation_cache.make_key(model_name, full_prompt, temperature, top_p, repetition_penalty, **params)
+
+async def generate_with_cache(model_name: str, prompt: str, temperature: float = 0.7, top_p: float = 0.9, repetition_penalty: float = 1.2, system_prompt: str = "", no_cache: bool = False, ticket_id: Optional[str] = None, history: Optional[List[Dict[str, str]]] = None, is_sms: bool = False, on_preempt: Optional[Callable[[], None]] = None, owner_id: Optional[int] = None) -> Dict[str, Any]:
+    """Önbellek + single-flight + admission control üzerinden model yanıtı üret"""
+    provider = provider_registry.resolve(model_name)
+    budget = output_budget(model_name, system_prompt, is_sms)
+    cache_key = make_cache_key(model_name, prompt, temperature, top_p, repetition_penalty, system_prompt, history, budget)
+    start_time = time.time()
+    
+    async def generate():
+        # Sadece gerçek upstream çağrıları slot tüketir (hit/coalesced beklemez)
+        async with admission_controller.slot(provider.name, model_name, ticket_id, on_preempt, owner_id):
+            result = await provider.generate(
+                model_name,
+                prompt,
+                temperature=temperature,
+                top_p=top_p,
+                repetition_penalty=repetition_penalty,
+                system_prompt=system_prompt,
+                history=history,
+                max_tokens=budget['max_tokens'],
+                stop=budget['stop']
+            )
+        # Önbelleğe kapanışı eklenmiş tam metin yazılır
+        result['response_text'] = (result.get('response_text') or '') + closing_suffix(result, budget)
+        return result
+    
+    result, cache_status = await generation_cache.get_or_generate(
+        cache_key,
+        model_name,
+        generate,
+        no_cache=no_cache
+    )
+    
+    # Önbellekten gelen yanıtın gecikmesi gerçek bekleme süresidir
+    if cache_status in (CACHE_HIT, CACHE_COALESCED):
+        result['latency_ms'] = (time.time() - start_time) * 1000
+        # Token'lar asıl üretimi yapan çağrıya yazılır, iki kez sayılmasın
+        for field in USAGE_FIELDS:
+            result.pop(field, None)
+    result['cache_status'] = cache_status
+    return result
+
+async def stream_with_cache(model_name: str, prompt: str, temperature: float = 0.7, top_p: float = 0.9, repetition_penalty: float = 1.2, system_prompt: str = "", no_cache: bool = False, ticket_id: Optional[str] = None, history: Optional[List[Dict[str, str]]] = None, is_sms: bool = False, owner_id: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Stream olaylarını üret; önbellekte varsa tek parça olarak döndür"""
+    budget = output_budget(model_name, system_prompt, is_sms)
+    cache_key = make_cache_key(model_name, prompt, temperature, top_p, repetition_penalty, system_prompt, history, budget)
+    start_time = time.time()
+    
+    if generation_cache.enabled and not no_cache:
+        cached = await generation_cache.lookup(cache_key)
+        if cached is not None:
+            elapsed_ms = (time.time() - start_time) * 1000
+            yield {'type': 'token', 'text': cached['response_text']}
+            yield {
+                'type': 'done',
+                'response_text': cached['response_text'],
+                'latency_ms': elapsed_ms,
+                'ttft_ms': elapsed_ms,
+                'success': True,
+                'cache_status': CACHE_HIT
+            }
+            return
+        
+        # Aynı girdilerle süren üretim (ör. spekülasyon) varsa ayrıca üretme, sonucu tek parça döndür
+        try:
+            joined = await generation_cache.join_inflight(cache_key)
+        except Exception:
+            joined = None
+        if joined is not None and joined.get('success'):
+            elapsed_ms = (time.time() - start_time) * 1000
+            yield {'type': 'token', 'text': joined['response_text']}
+            yield {
+                'type': 'done',
+                'response_text': joined['response_text'],
+                'latency_ms': elapsed_ms,
+                'ttft_ms': elapsed_ms,
+                'success': True,
+                'cache_status': CACHE_COALESCED
+            }
+            return
+    
+    provider = provider_registry.resolve(model_name)
+    # Bu stream, aynı girdilerle gelen sonraki çağrıların katılabileceği süren üretimdir
+    inflight = generation_cache.begin_stream(cache_key, no_cache)
+    final = None
+    try:
+        async with admission_controller.slot(provider.name, model_name, ticket_id, owner_id=owner_id):
+            async for event in provider.stream(
+                model_name,
+                prompt,
+                temperature=temperature,
+                top_p=top_p,
+                repetition_penalty=repetition_penalty,
+                system_prompt=system_prompt,
+                history=history,
+                max_tokens=budget['max_tokens'],
+                stop=budget['stop']
+            ):
+                if event['type'] == 'token':
+                    yield event
+                    continue
+                suffix = ''
+                if event['type'] == 'done':
+                    suffix = closing_suffix(event, budget)
+                    event['response_text'] += suffix
+                    await generation_cache.store(cache_key, model_name, event)
+                # Bekleyenler sonucu istemciye gönderilmeden (istemci kopsa da) alır
+                final = {field: value for field, value in event.items() if field != 'type'}
+                generation_cache.end_stream(inflight, final)
+                if suffix:
+                    yield {'type': 'token', 'text': suffix}
+                if event['type'] == 'done':
+                    event['cache_status'] = CACHE_BYPASS if no_cache else CACHE_MISS
+                yield event
+    finally:
+        generation_cache.end_stream(inflight, final)
+
+def usage_columns(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Response satırı için token kullanım kolonları"""
+    prompt_tokens = result.get('prompt_tokens')
+    completion_tokens = result.get('completion_tokens')
+    tokens_used = None
+    if prompt_tokens is not None or completion_tokens is not None:
+        tokens_used = (prompt_tokens or 0) + (completion_tokens or 0)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'prompt_eval_ms': result.get('prompt_eval_ms'),
+        'tokens_used': tokens_used,
+        'tokens_per_second': result.get('tokens_per_second')
+    }
+
+def continuation_history(prompt: str, previous_text: str) -> List[Dict[str, str]]:
+    """
+    Önceki yanıtı yanıtladığı kullanıcı promptuyla birlikte döndür (user -> assistant).
+
+    Gemini konuşmanın user turn'üyle başlamasını ve rollerin sırayla gelmesini bekler; Ollama da
+    önceki yanıtın neye cevap olduğunu görür. Önceki üretimin girdisi saklanmadığından prompt,
+    talep metni ve bu üretimin girdisiyle yeniden kurulur (devam üretimi aynı girdiyle yapılır).
+    """
+    return [{"role": "user", "content": prompt}, {"role": "assistant", "content": previous_text}]
+
+def previous_context(db: Session, request_id: int, prompt: str) -> Optional[List[Dict[str, str]]]:
+    """Aynı talep için son üretilen yanıtı konuşma geçmişi olarak döndür (devam üretimi)"""
+    previous = db.query(models.Response).filter(
+        models.Response.request_id == request_id
+    ).order_by(models.Response.created_at.desc()).first()
+    if previous is None:
+        return None
+    return continuation_history(prompt, previous.response_text)
+
+async def previous_context_async(db: AsyncSession, request_id: int, prompt: str) -> Optional[List[Dict[str, str]]]:
+    """previous_context'in AsyncSession karşılığı"""
+    result = await db.execute(
+        select(models.Response)
+        .where(models.Response.request_id == request_id)
+        .order_by(models.Response.created_at.desc())
+        .limit(1)
+    )
+    previous = result.scalars().first()
+    if previous is None:
+        return None
+    return continuation_history(prompt, previous.response_text)
+
+def build_prompt(original_text: str, custom_input: str, is_sms: bool) -> str:
+    """Create prompt - SMS veya normal yanıt"""
+    if is_sms:
+        prompt = f"""Vatandaş talebi: {original_text}
+
+Personel cevabı: {custom_input}
+
+Bu cevabı kısa ve öz bir SMS formatına uygun şekilde hazırla. ÖNEMLİ KURALLAR:
+- Maksimum 450 karakter olmalı
+- Başlık veya başlık benzeri ifadeler ("Resmi Yanıt", "Yanıt:", vb.) kullanma
+- Paragraf kırılmaları yapma, tüm metni tek satırda yaz
+- Gereksiz boşluklar bırakma
+- Kısa, net ve anlaşılır olmalı
+- Sayın ilgili gibi resmi hitap ile başla ama uzatma"""
+        print("📱 SMS mode: Prompt set to SMS format")
+    else:
+        prompt = f"""Vatandaş talebi: {original_text}
+
+Personel cevabı: {custom_input}
+
+Bu cevabı genişlet, daha detaylı ve ikna edici hale getir."""
+        print("📄 Normal mode: Prompt set to normal format")
+    return prompt
+
+def format_sms_response(response_text: str) -> str:
+    """SMS yanıtı için 450 karakter limiti uygula ve formatla"""
+    if not response_text:
+        return response_text
+
+    original_length = len(response_text)
+    print(f"📱 SMS Response detected! Original length: {original_length} chars")
+
+    # 1. Başlık ve benzeri ifadeleri kaldır (baştan)
+    response_text = response_text.strip()
+    # "Resmi Yanıt", "Yanıt:", "**" gibi başlıkları temizle
+    lines = response_text.split('\n')
+    cleaned_lines = []
+    skip_first = True
+    for line in lines:
+        line_stripped = line.strip()
+        # Başlık benzeri ifadeleri atla
+        if skip_first and (line_stripped.startswith('**') or
+                           'Resmi Yanıt' in line_stripped or
+                           'Yanıt:' in line_stripped or
+                           len(line_stripped) < 10):
+            continue
+        skip_first = False
+        if line_stripped:
+            cleaned_lines.append(line_stripped)
+
+    # 2. Tüm metni tek satıra çevir (paragraf kırılmalarını kaldır)
+    response_text = ' '.join(cleaned_lines)
+
+    # 3. Fazla boşlukları temizle (iki veya daha fazla boşluk -> tek boşluk)
+    response_text = re.sub(r'\s+', ' ', response_text).strip()
+
+    # 4. 450 karakter limiti uygula
+    if len(response_text) > SMS_MAX_CHARS:
+        # Son nokta, ünlem veya soru işaretinden kes (cümle sınırında)
+        trimmed = response_text[:SMS_MAX_CHARS]
+        # Son cümle sınırını bul
+        last_period = max(
+            trimmed.rfind('. '),
+            trimmed.rfind('! '),
+            trimmed.rfind('? ')
+        )
+        if last_period > 300:  # En az 300 karakter bırak
+            response_text = trimmed[:last_period + 1] + '...'
+        else:
+            # Cümle sınırı bulunamadıysa kelime sınırında kes
+            last_space = trimmed.rfind(' ')
+            if last_space > 300:
+                response_text = trimmed[:last_space] + '...'
+            else:
+                # Hiçbir sınır bulunamadıysa direkt kes
+                response_text = trimmed + '...'
+
+    # 5. Final kontrol: Kesinlikle 450 karakterden uzun olamaz
+    if len(response_text) > SMS_MAX_CHARS:
+        response_text = response_text[:SMS_MAX_CHARS - 3] + '...'
+
+    print(f"📱 SMS Response: Original={original_length} chars, Final={len(response_text)} chars")
+    return response_text
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Server-Sent-Events formatında tek bir olay üret"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
@@ -0,0 +1,82 @@
+import time
+from typing import Dict, Any, Optional
+import httpx
+from config import LLM_READ_TIMEOUT_SEC
+
+# Hata türleri (provider retry politikası bunlara bakar)
+ERROR_TIMEOUT = "timeout"
+ERROR_CONNECT = "connect"
+ERROR_HTTP = "http"
+ERROR_OTHER = "error"
+
+# Bu HTTP durumlarında istek tekrar denenebilir (rate limit / geçici upstream hatası)
+RETRYABLE_HTTP_STATUS = {429, 502, 503, 504}
+
+class BaseLLMClient:
+    """
+    LLM istemcileri için ortak davranış: varsayılan sistem promptu,
+    prompt birleştirme, süre ölçümü ve hata yanıtlarının tek tip üretilmesi.
+    """
+
+    # Alt sınıflar kendi metinlerini tanımlar
+    DEFAULT_SYSTEM_PROMPT = ""
+    CONNECT_ERROR_MESSAGE = "Connection Error: Could not connect to the model server."
+
+    def resolve_system_prompt(self, system_prompt: str = "") -> str:
+        """Frontend'den gelen sistem promptunu kullan, yoksa varsayılanı kullan"""
+        return system_prompt or self.DEFAULT_SYSTEM_PROMPT
+
+    def build_full_prompt(self, prompt: str, system_prompt: str = "") -> str:
+        """Sistem promptu ile kullanıcı promptunu birleştir"""
+        return f"{self.resolve_system_prompt(system_prompt)}\n\n{prompt}"
+
+    @staticmethod
+    def elapsed_ms(start_time: float) -> float:
+        return (time.time() - start_time) * 1000
+
+    @staticmethod
+    def http_error(status_code: int, body: str, latency_ms: float) -> Dict[str, Any]:
+        return {
+            'response_text': f"HTTP {status_code}: {body}",
+            'latency_ms': latency_ms,
+            'success': False,
+            'error_type': ERROR_HTTP,
+            'status_code': status_code,
+            'retryable': status_code in RETRYABLE_HTTP_STATUS
+        }
+
+    def exception_error(self, error: Exception, latency_ms: float = 0) -> Dict[str, Any]:
+        """İstisnayı istemciye dönen hata sözlüğüne çevir"""
+        if isinstance(error, httpx.TimeoutException) and not isinstance(error, httpx.ConnectTimeout):
+            return {
+                'response_text': f"Timeout: Request took too long ({int(LLM_READ_TIMEOUT_SEC)} seconds). Model may be too slow or overloaded.",
+                'latency_ms': latency_ms,
+                'success': False,
+                'error_type': ERROR_TIMEOUT,
+                'retryable': False  # Uzun üretimi tekrar başlatmak GPU süresini ikiye katlar
+            }
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return {
+                'response_text': self.CONNECT_ERROR_MESSAGE,
+                'latency_ms': latency_ms,
+                'success': False,
+                'error_type': ERROR_CONNECT,
+                'retryable': True
+            }
+        return {
+            'response_text': f"Error: {str(error)}",
+            'latency_ms': latency_ms,
+            'success': False,
+            'error_type': ERROR_OTHER,
+            'retryable': False
+        }
+
+    @staticmethod
+    def config_error(message: str) -> Dict[str, Any]:
+        return {
+            'response_text': f"Error: {message}",
+            'latency_ms': 0,
+            'success': False,
+            'error_type': ERROR_OTHER,
+            'retryable': False
+        }
@@ -0,0 +1,267 @@
+import asyncio
+import fnmatch
+from contextlib import aclosing
+from typing import List, Dict, Any, Optional, AsyncIterator
+from config import (
+    OLLAMA_MAX_CONCURRENCY,
+    GEMINI_MAX_CONCURRENCY,
+    OLLAMA_TIMEOUT_SEC,
+    GEMINI_TIMEOUT_SEC,
+    OLLAMA_MAX_RETRIES,
+    GEMINI_MAX_RETRIES,
+    LLM_RETRY_BACKOFF_SEC,
+    OLLAMA_MAX_CONTEXT_TOKENS,
+    GEMINI_MAX_CONTEXT_TOKENS,
+)
+from ollama_client import OllamaClient
+from gemini_client import GeminiClient
+from llm_client_base import ERROR_TIMEOUT, ERROR_OTHER
+from metrics import observe_llm
+
+# Bağlam uzunluğu kontrolü için kaba tahmin (Türkçe ~3 karakter/token)
+CHARS_PER_TOKEN = 3
+
+class ProviderCapabilities:
+    """Provider'ın desteklediği özellikler"""
+
+    def __init__(self, streaming: bool = True, multi_candidate: bool = False, embeddings: bool = False,
+                 max_context_tokens: int = 8192, stop_sequences: bool = True):
+        self.streaming = streaming
+        self.multi_candidate = multi_candidate
+        self.embeddings = embeddings
+        self.max_context_tokens = max_context_tokens
+        self.stop_sequences = stop_sequences  # False ise stop dizileri yanıt üzerinde uygulanır
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+class ProviderPolicy:
+    """Provider başına timeout, eşzamanlılık ve retry politikası"""
+
+    def __init__(self, timeout_sec: float, max_concurrency: int, max_retries: int = 0,
+                 retry_backoff_sec: float = LLM_RETRY_BACKOFF_SEC):
+        self.timeout_sec = timeout_sec
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff_sec = retry_backoff_sec
+
+    def backoff(self, attempt: int) -> float:
+        return self.retry_backoff_sec * (2 ** attempt)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+class LLMProvider:
+    """
+    Bir istemciyi (OllamaClient, GeminiClient, ...) yetenekleri ve politikasıyla saran provider.
+
+    İstemcinin generate_response / stream_response / get_models / build_full_prompt
+    arayüzünü sağlaması yeterlidir; endpoint'ler sadece provider üzerinden çağırır.
+    """
+
+    def __init__(self, name: str, client, capabilities: ProviderCapabilities, policy: ProviderPolicy,
+                 patterns: Optional[List[str]] = None):
+        self.name = name
+        self.client = client
+        self.capabilities = capabilities
+        self.policy = policy
+        self.patterns = patterns or []
+
+    def matches(self, model_name: str) -> bool:
+        return any(fnmatch.fnmatchcase(model_name, pattern) for pattern in self.patterns)
+
+    def _prepare(self, prompt: str, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Yetenekleri uygula; bağlam aşılıyorsa hata sözlüğü döndür"""
+        if not self.capabilities.stop_sequences:
+            kwargs["stop"] = None
+        history_chars = sum(len(message["content"]) for message in kwargs.get("history") or [])
+        full_prompt = self.client.build_full_prompt(prompt, kwargs.get("system_prompt", ""))
+        estimated_tokens = (len(full_prompt) + history_chars) // CHARS_PER_TOKEN + kwargs.get("max_tokens", 0)
+        if estimated_tokens > self.capabilities.max_context_tokens:
+            return {
+                'response_text': f"Error: Prompt too long for {self.name} (~{estimated_tokens} tokens > {self.capabilities.max_context_tokens})",
+                'latency_ms': 0,
+                'success': False,
+                'error_type': ERROR_OTHER,
+                'retryable': False
+            }
+        return None
+
+    @staticmethod
+    def _apply_stop(result: Dict[str, Any], stop: Optional[List[str]]) -> Dict[str, Any]:
+        """Native stop desteği olmayan provider için metni ilk stop dizisinde kes"""
+        text = result.get('response_text') or ''
+        positions = [text.find(sequence) for sequence in stop or [] if sequence in text]
+        if positions:
+            result['response_text'] = text[:min(positions)]
+            result['finish_reason'] = 'stop'
+        return result
+
+    async def generate(self, model_name: str, prompt: str, **kwargs) -> Dict[str, Any]:
+        """Timeout ve retry politikasıyla tek yanıt üret"""
+        stop = kwargs.get("stop")
+        error = self._prepare(prompt, kwargs)
+        if error is not None:
+            return {**error, 'provider': self.name}
+
+        attempt = 0
+        while True:
+            try:
+                result = await asyncio.wait_for(
+                    self.client.generate_response(model_name, prompt, **kwargs),
+                    timeout=self.policy.timeout_sec
+                )
+            except asyncio.TimeoutError:
+                result = {
+                    'response_text': f"Timeout: {self.name} did not respond within {int(self.policy.timeout_sec)} seconds.",
+                    'latency_ms': self.policy.timeout_sec * 1000,
+                    'success': False,
+                    'error_type': ERROR_TIMEOUT,
+                    'retryable': False
+                }
+            if result['success'] or not result.get('retryable') or attempt >= self.policy.max_retries:
+                break
+            await asyncio.sleep(self.policy.backoff(attempt))
+            attempt += 1
+
+        if result['success'] and stop and not self.capabilities.stop_sequences:
+            result = self._apply_stop(result, stop)
+        result['provider'] = self.name
+        result['attempts'] = attempt + 1
+        observe_llm(self.name, model_name, result)
+        return result
+
+    async def stream(self, model_name: str, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """Token olaylarını üret; ilk token gelmeden oluşan geçici hatalarda tekrar dene"""
+        if not self.capabilities.streaming:
+            # Stream desteklemeyen provider: tek parça yanıtı olay olarak döndür
+            result = await self.generate(model_name, prompt, **kwargs)
+            if result['success']:
+                yield {'type': 'token', 'text': result['response_text']}
+                yield {'type': 'done', **result, 'ttft_ms': result['latency_ms']}
+            else:
+                yield {'type': 'error', **result}
+            return
+
+        error = self._prepare(prompt, kwargs)
+        if error is not None:
+            yield {'type': 'error', **error, 'provider': self.name}
+            return
+
+        attempt = 0
+        while True:
+            sent_tokens = False
+            retry = False
+            # aclosing: retry veya erken çıkışta HTTP stream'i ve pool bağlantısı hemen bırakılır
+            async with aclosing(self.client.stream_response(model_name, prompt, **kwargs)) as events:
+                async for event in events:
+                    if event['type'] == 'error' and not sent_tokens and event.get('retryable') and attempt < self.policy.max_retries:
+                        retry = True
+                        break
+                    if event['type'] == 'token':
+                        sent_tokens = True
+                    else:
+                        event['provider'] = self.name
+                        observe_llm(self.name, model_name, event)
+                    yield event
+            if not retry:
+                return
+            await asyncio.sleep(self.policy.backoff(attempt))
+            attempt += 1
+
+    async def list_models(self) -> List[Dict[str, Any]]:
+        return await self.client.get_models()
+
+    async def start(self):
+        if hasattr(self.client, "start"):
+            await self.client.start()
+
+    async def aclose(self):
+        if hasattr(self.client, "aclose"):
+            await self.client.aclose()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "patterns": self.patterns,
+            "capabilities": self.capabilities.to_dict(),
+            "policy": self.policy.to_dict()
+        }
+
+class ProviderRegistry:
+    """
+    Model adından provider çözümleme.
+
+    Sıra: models.provider kolonundaki açık eşleme -> kayıt sırasına göre
+    model adı deseni (fnmatch) -> varsayılan provider.
+    """
+
+    def __init__(self):
+        self._providers: Dict[str, LLMProvider] = {}
+        self._model_providers: Dict[str, str] = {}
+        self.default_name: Optional[str] = None
+
+    def register(self, provider: LLMProvider, default: bool = False):
+        self._providers[provider.name] = provider
+        if default or self.default_name is None:
+            self.default_name = provider.name
+
+    def get(self, name: str) -> Optional[LLMProvider]:
+        return self._providers.get(name)
+
+    def providers(self) -> List[LLMProvider]:
+        return list(self._providers.values())
+
+    def set_model_providers(self, mapping: Dict[str, str]):
+        """models tablosundan gelen model -> provider eşlemesi (katalog yenilemesinde güncellenir)"""
+        self._model_providers = {
+            model_name: provider_name
+            for model_name, provider_name in mapping.items()
+            if provider_name in self._providers
+        }
+
+    def resolve(self, model_name: str) -> LLMProvider:
+        explicit = self._model_providers.get(model_name)
+        if explicit is not None:
+            return self._providers[explicit]
+        for provider in self._providers.values():
+            if provider.matches(model_name):
+                return provider
+        return self._providers[self.default_name]
+
+    async def start(self):
+        for provider in self._providers.values():
+            await provider.start()
+
+    async def aclose(self):
+        for provider in reversed(list(self._providers.values())):
+            await provider.aclose()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "default": self.default_name,
+            "providers": [provider.snapshot() for provider in self._providers.values()],
+            "model_overrides": dict(self._model_providers)
+        }
+
+# Paylaşılan LLM istemcileri (main.py lifespan içinde açılıp kapatılır)
+ollama_client = OllamaClient()
+gemini_client = GeminiClient()
+
+# Global provider registry - yeni backend eklemek için register() yeterli
+provider_registry = ProviderRegistry()
+provider_registry.register(LLMProvider(
+    "gemini",
+    gemini_client,
+    ProviderCapabilities(streaming=True, multi_candidate=True, embeddings=True,
+                         max_context_tokens=GEMINI_MAX_CONTEXT_TOKENS, stop_sequences=True),
+    ProviderPolicy(timeout_sec=GEMINI_TIMEOUT_SEC, max_concurrency=GEMINI_MAX_CONCURRENCY, max_retries=GEMINI_MAX_RETRIES),
+    patterns=["gemini-*"]
+))
+provider_registry.register(LLMProvider(
+    "ollama",
+    ollama_client,
+    ProviderCapabilities(streaming=True, multi_candidate=False, embeddings=True,
+                         max_context_tokens=OLLAMA_MAX_CONTEXT_TOKENS, stop_sequences=True),
+    ProviderPolicy(timeout_sec=OLLAMA_TIMEOUT_SEC, max_concurrency=OLLAMA_MAX_CONCURRENCY, max_retries=OLLAMA_MAX_RETRIES)
+), default=True)  # Desen eşleşmeyen tüm modeller Ollama'ya gider
@@ -0,0 +1,173 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from metrics import observe_loop_stall
+from config import (
+    LOOP_WATCHDOG_ENABLED,
+    LOOP_STALL_THRESHOLD_MS,
+    LOOP_HEARTBEAT_INTERVAL_MS,
+    LOOP_STALL_HISTORY,
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Çalışan task -> ASGI scope (rota, stall anında task'tan bulunur)
+_task_scopes: "weakref.WeakKeyDictionary[asyncio.Task, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+def _project_frame(frame) -> Optional[str]:
+    """Stack'teki en içteki proje frame'i (bloklayan çağrıyı yapan bizim kodumuz)"""
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_ROOT) and "site-packages" not in filename:
+            return f"{frame.f_code.co_name} ({os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno})"
+        frame = frame.f_back
+    return None
+
+class LoopWatchdog:
+    """
+    Event loop bloklanma (stall) dedektörü.
+
+    - Heartbeat task'ı her LOOP_HEARTBEAT_INTERVAL_MS'de uyanır; geç uyanması loop'un bloklandığını gösterir
+    - Watchdog thread'i heartbeat gecikince loop thread'inin stack'ini o an yakalar (bloklayan çağrı hâlâ üstündedir)
+    - Stall bitince süre, rota ve stack kaydedilir; rota bazlı sayaçlar /metrics'e yazılır
+    """
+
+    def __init__(self, threshold_ms: int = LOOP_STALL_THRESHOLD_MS, interval_ms: int = LOOP_HEARTBEAT_INTERVAL_MS,
+                 history: int = LOOP_STALL_HISTORY):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.recent: deque = deque(maxlen=history)
+        self.by_route: Dict[str, Dict[str, float]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._capture: Optional[Dict[str, Any]] = None
+        self._capture_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    async def start(self):
+        if not LOOP_WATCHDOG_ENABLED or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._stop_event.set()
+            await asyncio.to_thread(self._thread.join, 1)
+            self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = now - before - self.interval
+            self._last_beat = now
+            with self._capture_lock:
+                capture, self._capture = self._capture, None
+            if lag >= self.threshold:
+                self._record(lag, capture)
+
+    def _watch(self):
+        # Eşiğin çeyreği kadar sıklıkla kontrol: kısa stall'larda da stack yakalanır
+        poll = max(self.threshold / 4, 0.005)
+        while not self._stop_event.wait(poll):
+            beat = self._last_beat
+            if time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            with self._capture_lock:
+                if self._capture is not None and self._capture["beat"] == beat:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                task = asyncio.current_task(self._loop)
+                self._capture = {
+                    "beat": beat,
+                    "route": self._route_for(task),
+                    "site": _project_frame(frame),
+                    "stack": traceback.format_stack(frame) if frame is not None else [],
+                }
+
+    @staticmethod
+    def _route_for(task: Optional[asyncio.Task]) -> str:
+        if task is None:
+            return "loop"
+        scope = _task_scopes.get(task)
+        if scope is None:
+            return "background"
+        return f"{scope.get('method', '')} {getattr(scope.get('route'), 'path', 'unmatched')}"
+
+    def _record(self, lag: float, capture: Optional[Dict[str, Any]]):
+        route = capture["route"] if capture else "unknown"
+        site = capture["site"] if capture else None
+        stats = self.by_route.setdefault(route, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += lag * 1000
+        stats["max_ms"] = max(stats["max_ms"], lag * 1000)
+        self.recent.append({
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(lag * 1000, 1),
+            "route": route,
+            "site": site,
+            "stack": capture["stack"] if capture else [],
+        })
+        observe_loop_stall(route, lag)
+        print(f"⏱️ Event loop {lag * 1000:.0f} ms bloklandı [{route}] {site or ''}")
+
+    def snapshot(self, include_stacks: bool = True) -> Dict[str, Any]:
+        routes = sorted(
+            ({"route": route, **{key: round(value, 1) for key, value in stats.items()}}
+             for route, stats in self.by_route.items()),
+            key=lambda item: item["total_ms"], reverse=True
+        )
+        recent = list(self.recent)[::-1]
+        if not include_stacks:
+            recent = [{key: value for key, value in stall.items() if key != "stack"} for stall in recent]
+        return {
+            "enabled": LOOP_WATCHDOG_ENABLED,
+            "running": self._task is not None,
+            "threshold_ms": round(self.threshold * 1000),
+            "routes": routes,
+            "recent": recent,
+        }
+
+class LoopWatchdogMiddleware:
+    """Saf ASGI middleware: isteği işleyen task'ı scope'uyla eşler (stall -> rota)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not LOOP_WATCHDOG_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        _task_scopes[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _task_scopes.pop(task, None)
+
+# Global loop watchdog instance
+loop_watchdog = LoopWatchdog()
@@ -1,21 +1,75 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Query
-from fastapi.responses import RedirectResponse, FileResponse
+from fastapi.responses import RedirectResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from connection import engine
+from connection import engine, read_engine, prewarm_pool
+from async_connection import async_engine, async_read_engine, prewarm_async_pool, dispose_async_engines
 import models
 from endpoints import router
+from llm_providers import provider_registry
+from model_catalog import model_catalog
+from model_warmup import model_warmup_scheduler
+from generation_jobs import generation_job_manager
+from speculative import speculative_generator
 from auth_endpoints import auth_router
-from config import PRODUCTION_URL
+from metrics import MetricsMiddleware, instrument_engine, render_metrics, mark_process_dead, METRICS_CONTENT_TYPE
+import query_counter
+from profiling import ProfilingMiddleware
+from loop_watchdog import loop_watchdog, LoopWatchdogMiddleware
+from read_your_writes import ReadYourWritesMiddleware
+from config import PRODUCTION_URL, DB_POOL_PREWARM
 
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
 
+# DB pool gauge'ları (checkout/checkin olaylarıyla güncellenir, pool etiketiyle)
+instrument_engine(engine, "primary")
+instrument_engine(async_engine.sync_engine, "async_primary")
+# İstek başına SQL sorgu sayısı/süresi (async engine'in olayları sync_engine üzerinden)
+query_counter.instrument_engine(engine)
+query_counter.instrument_engine(async_engine.sync_engine)
+if read_engine is not engine:
+    instrument_engine(read_engine, "replica")
+    instrument_engine(async_read_engine.sync_engine, "async_replica")
+    query_counter.instrument_engine(read_engine)
+    query_counter.instrument_engine(async_read_engine.sync_engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Uygulama yaşam döngüsü: paylaşılan LLM HTTP istemcilerini aç/kapat
+    """
+    await loop_watchdog.start()
+    if DB_POOL_PREWARM:
+        try:
+            await asyncio.to_thread(prewarm_pool)
+            await prewarm_async_pool()
+        except Exception as e:
+            print(f"⚠️ DB pool ön ısıtma başarısız: {e}")
+    await provider_registry.start()
+    await model_catalog.start()
+    await model_warmup_scheduler.start()
+    await generation_job_manager.start()
+    try:
+        yield
+    finally:
+        await generation_job_manager.stop()
+        await speculative_generator.stop()
+        await model_warmup_scheduler.stop()
+        await model_catalog.stop()
+        await provider_registry.aclose()
+        await dispose_async_engines()
+        await loop_watchdog.stop()
+        mark_process_dead()
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Helper API",
     description="AI Helper Backend API with Authentication",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -27,6 +81,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# İstek süresi metrikleri (rota şablonu + durum kodu) ve istek başına SQL sorgu sayacı
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(query_counter.QueryCounterMiddleware)
+# Admin istekleri için örnekleyici profil (X-Profile: 1 veya ?_profile=1)
+app.add_middleware(ProfilingMiddleware)
+# Event loop stall'larını rotaya bağlamak için istek task'ı -> scope eşlemesi
+app.add_middleware(LoopWatchdogMiddleware)
+# Replika okumalarında read-your-writes (son yazma cookie'si); DATABASE_READ_URL yoksa devre dışı
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Include API endpoints
 app.include_router(router, prefix="/api/v1")
 app.include_router(auth_router, prefix="/api/v1")
@@ -41,6 +105,13 @@ async def root():
     """
     return {"message": "AI Helper API çalışıyor"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrikleri (nginx üzerinden dışarı açılmaz, sadece backend portundan)
+    """
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/manifest.json")
 async def get_manifest():
     """
@@ -0,0 +1,221 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+from prometheus_client import (
+    Counter,
+    Histogram,
+    Gauge,
+    CollectorRegistry,
+    REGISTRY,
+    generate_latest,
+    CONTENT_TYPE_LATEST,
+    multiprocess,
+)
+from sqlalchemy import event
+from profiling import record_span
+from config import METRICS_ENABLED
+
+# Çoklu uvicorn worker: PROMETHEUS_MULTIPROC_DIR ayarlıysa her worker metriklerini bu dizine
+# yazar ve /metrics tüm worker'ların toplamını döner (dizin başlangıçta temizlenmeli).
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# LLM çağrıları saniyeler-dakikalar sürer; HTTP varsayılan bucket'ları yetersiz
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+TTFT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+TOKEN_RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 200)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency (SSE: until the stream ends)",
+    ["method", "route", "status"]
+)
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds", "LLM provider call latency", ["provider", "model", "outcome"],
+    buckets=LLM_LATENCY_BUCKETS
+)
+LLM_TTFT = Histogram(
+    "llm_time_to_first_token_seconds", "Time to first streamed token", ["provider", "model"],
+    buckets=TTFT_BUCKETS
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second", "Completion token throughput per call", ["provider", "model"],
+    buckets=TOKEN_RATE_BUCKETS
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens processed by LLM providers", ["provider", "model", "kind"])
+LLM_ERRORS = Counter("llm_errors_total", "Failed LLM calls", ["provider", "model", "error_type"])
+GENERATIONS_IN_FLIGHT = Gauge(
+    "generations_in_flight", "Generations holding an admission slot", ["provider"], multiprocess_mode="livesum"
+)
+GENERATIONS_QUEUED = Gauge(
+    "generations_queued", "Generations waiting for an admission slot", ["provider"], multiprocess_mode="livesum"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections", "SQLAlchemy connections checked out", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections", "SQLAlchemy connections above pool_size", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "SQLAlchemy pool size per worker", ["pool"], multiprocess_mode="livesum")
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time to obtain a pooled connection (incl. pre-ping)", ["route"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+)
+DB_CONNECTION_HOLD = Histogram(
+    "db_connection_hold_seconds", "Time a pooled connection stays checked out", ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 120)
+)
+SMTP_SEND_DURATION = Histogram(
+    "smtp_send_duration_seconds", "SMTP login e-mail send latency", ["outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+HTTP_REQUEST_DB_TIME = Histogram(
+    "http_request_db_time_seconds", "Time spent in SQL statements per HTTP request", ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+EVENT_LOOP_STALLS = Counter(
+    "event_loop_stalls_total", "Event loop stalls above LOOP_STALL_THRESHOLD_MS", ["route"]
+)
+EVENT_LOOP_STALL_DURATION = Histogram(
+    "event_loop_stall_seconds", "Event loop stall duration", ["route"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+GENERATION_CACHE_EVENTS = Counter(
+    "generation_cache_events_total", "Generation cache lookups by result", ["result"]
+)
+
+class MetricsMiddleware:
+    """
+    Saf ASGI middleware: rota şablonu ve durum koduna göre istek süresi.
+
+    Rota etiketi eşleşen FastAPI route'unun path şablonudur (/api/v1/responses/{response_id}/...),
+    böylece etiket kardinalitesi sınırlı kalır.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status["code"])
+            ).observe(time.perf_counter() - start)
+
+def observe_llm(provider: str, model_name: str, result: Dict[str, Any]):
+    """Provider çağrısı sonucu (generate sonucu veya stream done/error olayı)"""
+    record_span("llm", (result.get("latency_ms") or 0) / 1000)
+    if not METRICS_ENABLED:
+        return
+    outcome = "success" if result.get("success") else "error"
+    LLM_REQUEST_DURATION.labels(provider, model_name, outcome).observe((result.get("latency_ms") or 0) / 1000)
+    if not result.get("success"):
+        LLM_ERRORS.labels(provider, model_name, result.get("error_type") or "error").inc()
+        return
+    if result.get("ttft_ms") is not None:
+        LLM_TTFT.labels(provider, model_name).observe(result["ttft_ms"] / 1000)
+    if result.get("tokens_per_second"):
+        LLM_TOKENS_PER_SECOND.labels(provider, model_name).observe(result["tokens_per_second"])
+    for kind in ("prompt", "completion"):
+        if result.get(f"{kind}_tokens"):
+            LLM_TOKENS.labels(provider, model_name, kind).inc(result[f"{kind}_tokens"])
+
+def observe_request_queries(route: str, count: int, seconds: float):
+    if METRICS_ENABLED:
+        HTTP_REQUEST_DB_QUERIES.labels(route).observe(count)
+        HTTP_REQUEST_DB_TIME.labels(route).observe(seconds)
+
+def observe_pool_checkout(route: str, wait_seconds: float):
+    if METRICS_ENABLED:
+        DB_POOL_CHECKOUT_WAIT.labels(route).observe(wait_seconds)
+
+def observe_connection_hold(route: str, hold_seconds: float):
+    if METRICS_ENABLED:
+        DB_CONNECTION_HOLD.labels(route).observe(hold_seconds)
+
+def track_queued(provider: str, delta: int):
+    if METRICS_ENABLED:
+        GENERATIONS_QUEUED.labels(provider).inc(delta)
+
+def track_in_flight(provider: str, delta: int):
+    if METRICS_ENABLED:
+        GENERATIONS_IN_FLIGHT.labels(provider).inc(delta)
+
+def observe_loop_stall(route: str, seconds: float):
+    if METRICS_ENABLED:
+        EVENT_LOOP_STALLS.labels(route).inc()
+        EVENT_LOOP_STALL_DURATION.labels(route).observe(seconds)
+
+def count_cache_event(result: str):
+    if METRICS_ENABLED:
+        GENERATION_CACHE_EVENTS.labels(result).inc()
+
+@contextmanager
+def smtp_send_timer():
+    """SMTP gönderim süresi; istisna olursa outcome=error olarak kaydedilir"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        elapsed = time.perf_counter() - start
+        record_span("smtp", elapsed)
+        if METRICS_ENABLED:
+            SMTP_SEND_DURATION.labels(outcome).observe(elapsed)
+
+def instrument_engine(engine, pool_name: str):
+    """
+    Pool checkout/checkin olaylarında pool gauge'larını güncelle (scrape anında pool'a dokunulmaz).
+    Async engine'ler için sync_engine verilir; pool_name gauge'ların pool etiketidir.
+    """
+    if not METRICS_ENABLED:
+        return
+    pool = engine.pool
+    if not hasattr(pool, "size"):
+        return
+    # checkin olayı bağlantı pool'a geri konmadan tetiklenir; sayacı kendimiz tutuyoruz
+    state = {"checked_out": 0}
+
+    def update(delta: int):
+        state["checked_out"] += delta
+        DB_POOL_CHECKED_OUT.labels(pool_name).set(state["checked_out"])
+        DB_POOL_OVERFLOW.labels(pool_name).set(max(0, state["checked_out"] - pool.size()))
+
+    DB_POOL_SIZE.labels(pool_name).set(pool.size())
+    event.listen(pool, "checkout", lambda *_: update(1))
+    event.listen(pool, "checkin", lambda *_: update(-1))
+
+def render_metrics() -> bytes:
+    """Prometheus text formatı; multiprocess modunda tüm worker'ların toplamı"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def mark_process_dead():
+    """Worker kapanırken livesum gauge'larından bu process'in payını çıkar"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
@@ -0,0 +1,119 @@
+"""
+Performans geliştirmeleri için veritabanı migration script'i
+
+create_all() mevcut tablolara yeni kolon eklemediği için, var olan
+PostgreSQL veritabanlarında bu script'i bir kez çalıştırın:
+
+    python migrate_performance.py
+
+Tüm adımlar idempotent'tir (IF NOT EXISTS / IF EXISTS), tekrar çalıştırmak güvenlidir.
+İndeksler CONCURRENTLY ile oluşturulur/silinir (tablo yazmaları kilitlenmez); bu yüzden adımlar
+transaction içinde değil, autocommit modunda tek tek çalışır.
+"""
+from sqlalchemy import text
+from connection import engine
+import models
+
+# (açıklama, SQL) sırası önemlidir
+MIGRATION_STEPS = [
+    (
+        "responses.ttft_ms (streaming ilk token süresi)",
+        "ALTER TABLE responses ADD COLUMN IF NOT EXISTS ttft_ms INTEGER"
+    ),
+    (
+        "responses.load_duration_ms (Ollama model yükleme süresi)",
+        "ALTER TABLE responses ADD COLUMN IF NOT EXISTS load_duration_ms INTEGER"
+    ),
+    (
+        "responses.prompt_tokens (girdi token sayısı)",
+        "ALTER TABLE responses ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER"
+    ),
+    (
+        "responses.completion_tokens (üretilen token sayısı)",
+        "ALTER TABLE responses ADD COLUMN IF NOT EXISTS completion_tokens INTEGER"
+    ),
+    (
+        "responses.tokens_per_second (üretim hızı)",
+        "ALTER TABLE responses ADD COLUMN IF NOT EXISTS tokens_per_second DOUBLE PRECISION"
+    ),
+    (
+        "responses.prompt_eval_ms (prompt prefill süresi)",
+        "ALTER TABLE responses ADD COLUMN IF NOT EXISTS prompt_eval_ms INTEGER"
+    ),
+    (
+        "users.default_model (spekülatif ön üretim modeli)",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS default_model VARCHAR(100)"
+    ),
+    (
+        "users.speculative_generation (spekülatif ön üretim opt-in)",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS speculative_generation BOOLEAN DEFAULT FALSE"
+    ),
+    (
+        "models.provider (model -> LLM provider açık eşlemesi)",
+        "ALTER TABLE models ADD COLUMN IF NOT EXISTS provider VARCHAR(50)"
+    ),
+    (
+        "generation_jobs.owner (işi çalıştıran process)",
+        "ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS owner VARCHAR(128)"
+    ),
+    (
+        "generation_jobs.heartbeat_at (çalışan işin son heartbeat'i)",
+        "ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE"
+    ),
+    (
+        "requests(user_id, created_at) indeksi (yanıt geçmişi, admin son talep zamanı)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_requests_user_created ON requests (user_id, created_at)"
+    ),
+    (
+        "responses(request_id, created_at) indeksi (geçmiş, son yanıt, admin join)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_responses_request_created ON responses (request_id, created_at)"
+    ),
+    (
+        "responses(request_id) WHERE copied kısmi indeksi (has-copied-response)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_responses_request_copied ON responses (request_id) WHERE copied = true"
+    ),
+    (
+        "login_tokens: index=True ile oluşan çift token_hash indeksini sil",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_login_tokens_token_hash"
+    ),
+    (
+        "login_tokens: index=True ile oluşan çift code_hash indeksini sil",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_login_tokens_code_hash"
+    ),
+    (
+        "login_tokens: index=True ile oluşan çift expires_at indeksini sil",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_login_tokens_expires_at"
+    ),
+    (
+        "login_tokens: index=True ile oluşan (kullanılmayan) email indeksini sil",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_login_tokens_email"
+    ),
+    (
+        "login_tokens: kullanılmayan idx_login_tokens_email indeksini sil",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_login_tokens_email"
+    ),
+]
+
+# Yarıda kalan CREATE INDEX CONCURRENTLY geçersiz (INVALID) indeks bırakır ve IF NOT EXISTS onu atlar
+INVALID_INDEXES_QUERY = """
+    SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE NOT i.indisvalid AND pg_catalog.pg_table_is_visible(c.oid)
+"""
+
+def run_migrations():
+    # Yeni tabloları oluştur (mevcut tablolara dokunmaz)
+    models.Base.metadata.create_all(bind=engine)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for description, statement in MIGRATION_STEPS:
+            print(f"➡️  {description}")
+            conn.execute(text(statement))
+
+        invalid = [row[0] for row in conn.execute(text(INVALID_INDEXES_QUERY))]
+
+    if invalid:
+        print(f"⚠️  Geçersiz indeksler var, DROP INDEX sonrası script'i tekrar çalıştırın: {', '.join(invalid)}")
+    print("✅ Migration tamamlandı")
+
+if __name__ == "__main__":
+    run_migrations()
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import List, Dict, Any, Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import models
+from connection import SessionLocal
+from config import MODEL_CATALOG_TTL_SEC
+from llm_providers import provider_registry
+
+# models tablosunda senkronize edilen alanlar
+SYNC_FIELDS = ('display_name', 'supports_embedding', 'supports_chat')
+
+class ModelCatalog:
+    """
+    Kayıtlı tüm LLM provider'larının model listesini bellekte tutan katalog servisi.
+
+    - Liste arka planda TTL ile asenkron yenilenir (event loop bloklanmaz)
+    - models tablosuna sadece değişen satırlar tek bir bulk upsert ile yazılır
+    - /models bellekten servis edilir; eşzamanlı yenilemeler tek bir çağrıda birleşir
+    """
+
+    def __init__(self, ttl_seconds: int = MODEL_CATALOG_TTL_SEC):
+        self.ttl_seconds = ttl_seconds
+        self._models: List[Dict[str, Any]] = []
+        self._etag: Optional[str] = None
+        self._refreshed_at: float = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self._etag
+
+    def is_fresh(self) -> bool:
+        return self._etag is not None and (time.monotonic() - self._refreshed_at) < self.ttl_seconds
+
+    async def get_models(self) -> List[Dict[str, Any]]:
+        """Bellekteki model listesini döndür (ilk çağrıda yükle)"""
+        if self._etag is None:
+            await self.refresh()
+        return self._models
+
+    async def refresh(self, force: bool = False):
+        """Upstream listeyi çek, DB ile diff'le ve belleği güncelle (single-flight)"""
+        async with self._lock:
+            # Kilidi beklerken başka bir çağrı yenilemiş olabilir
+            if not force and self.is_fresh():
+                return
+
+            providers = provider_registry.providers()
+            provider_models = await asyncio.gather(*[provider.list_models() for provider in providers])
+            upstream = [
+                {**model_data, 'provider': provider.name}
+                for provider, model_list in zip(providers, provider_models)
+                for model_data in model_list
+            ]
+
+            db_models = await asyncio.to_thread(self._sync_with_db, upstream)
+            # models.provider kolonundaki açık eşlemeler desen eşleşmesinden önce gelir
+            provider_registry.set_model_providers({
+                model['name']: model['provider'] for model in db_models if model.get('provider')
+            })
+
+            self._models = db_models
+            self._etag = self._compute_etag(db_models)
+            self._refreshed_at = time.monotonic()
+
+    def _sync_with_db(self, upstream: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sadece değişen modelleri tek bir INSERT ... ON CONFLICT ile yaz"""
+        db = SessionLocal()
+        try:
+            existing = {
+                model.name: {
+                    'name': model.name,
+                    'display_name': model.display_name,
+                    'supports_embedding': model.supports_embedding,
+                    'supports_chat': model.supports_chat,
+                    'provider': model.provider
+                }
+                for model in db.query(models.Model).all()
+            }
+
+            changes = {}
+            for model_data in upstream:
+                row = {'name': model_data['name']}
+                row.update({field: model_data[field] for field in SYNC_FIELDS})
+                current = existing.get(row['name'])
+                # Elle atanmış provider korunur; boşsa modeli listeleyen provider yazılır
+                row['provider'] = (current or {}).get('provider') or model_data.get('provider')
+                if current is None or any(current[field] != row[field] for field in SYNC_FIELDS + ('provider',)):
+                    changes[row['name']] = row
+                existing[row['name']] = row
+
+            if changes:
+                statement = pg_insert(models.Model).values(list(changes.values()))
+                statement = statement.on_conflict_do_update(
+                    index_elements=[models.Model.name],
+                    set_={
+                        **{field: statement.excluded[field] for field in SYNC_FIELDS},
+                        'provider': func.coalesce(models.Model.provider, statement.excluded.provider)
+                    }
+                )
+                db.execute(statement)
+                db.commit()
+                print(f"🔄 Model catalog: {len(changes)} model güncellendi")
+
+            # DB'deki tüm modeller (Ollama erişilemese bile eski kayıtlar listelenir)
+            return list(existing.values())
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _compute_etag(model_list: List[Dict[str, Any]]) -> str:
+        payload = json.dumps(model_list, sort_keys=True, ensure_ascii=False)
+        return '"' + hashlib.sha1(payload.encode()).hexdigest() + '"'
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh(force=True)
+            except Exception as e:
+                print(f"Error refreshing model catalog: {e}")
+            await asyncio.sleep(self.ttl_seconds)
+
+    async def start(self):
+        """Arka plan yenileme görevini başlat (ilk yükleme startup'ı bloklamaz)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global catalog instance
+model_catalog = ModelCatalog()
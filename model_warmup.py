@@ -0,0 +1,90 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+import models
+from connection import SessionLocal
+from config import (
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_WARMUP_MODELS,
+    OLLAMA_KEEPALIVE_INTERVAL_SEC,
+    OLLAMA_KEEPALIVE_RECENT_MIN,
+)
+from generation_service import ollama_client, get_provider_name
+
+class ModelWarmupScheduler:
+    """
+    Ollama modellerini sıcak tutan zamanlayıcı.
+
+    - Startup'ta OLLAMA_WARMUP_MODELS listesini yükler
+    - Son OLLAMA_KEEPALIVE_RECENT_MIN dakikada Response üretilmiş modellere
+      periyodik keep_alive ping'i atar, böylece model bellekten düşmez
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.last_results: Dict[str, Dict[str, Any]] = {}
+
+    def _recent_models(self) -> List[str]:
+        """Son N dakikada kullanılan (Gemini olmayan) model adları"""
+        since = datetime.utcnow() - timedelta(minutes=OLLAMA_KEEPALIVE_RECENT_MIN)
+        db = SessionLocal()
+        try:
+            rows = db.query(models.Response.model_name).filter(
+                models.Response.created_at >= since
+            ).distinct().all()
+            return [row[0] for row in rows if get_provider_name(row[0]) == 'ollama']
+        finally:
+            db.close()
+
+    async def warm(self, model_names: List[str]):
+        """Modelleri paralel olarak yükle / yüklü tut"""
+        if not model_names:
+            return
+        results = await asyncio.gather(*[
+            ollama_client.warm_model(model_name, keep_alive=OLLAMA_KEEP_ALIVE)
+            for model_name in model_names
+        ])
+        for model_name, result in zip(model_names, results):
+            self.last_results[model_name] = {**result, "warmed_at": time.time()}
+            if result['success']:
+                load_ms = result.get('load_duration_ms') or 0
+                # Kayda değer load süresi modelin soğuk olduğunu gösterir
+                print(f"🔥 Model warm-up: {model_name} (load {load_ms:.0f} ms)")
+            else:
+                print(f"⚠️ Model warm-up failed: {model_name}: {result.get('error')}")
+
+    async def _run(self):
+        await self.warm(list(OLLAMA_WARMUP_MODELS))
+        while True:
+            await asyncio.sleep(OLLAMA_KEEPALIVE_INTERVAL_SEC)
+            try:
+                recent = await asyncio.to_thread(self._recent_models)
+                await self.warm(sorted(set(recent) | set(OLLAMA_WARMUP_MODELS)))
+            except Exception as e:
+                print(f"Error in model keep-alive: {e}")
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "warmup_models": list(OLLAMA_WARMUP_MODELS),
+            "interval_sec": OLLAMA_KEEPALIVE_INTERVAL_SEC,
+            "recent_minutes": OLLAMA_KEEPALIVE_RECENT_MIN,
+            "models": self.last_results
+        }
+
+# Global scheduler instance
+model_warmup_scheduler = ModelWarmupScheduler()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, Index, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from connection import Base
@@ -17,6 +17,8 @@ class User(Base):
     is_admin = Column(Boolean, default=False)  # Admin yetkisi
     total_requests = Column(Integer, default=0)  # Toplam üretilen yanıt sayısı
     answered_requests = Column(Integer, default=0)  # Cevaplanan istek sayısı
+    default_model = Column(String(100), nullable=True)  # Spekülatif ön üretimde kullanılan model
+    speculative_generation = Column(Boolean, default=False)  # Talep oluşturulunca arka planda yanıt üret (opt-in)
     
     # Relationships
     login_attempts = relationship("LoginAttempt", back_populates="user")
@@ -50,10 +52,10 @@ class LoginToken(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    email = Column(String(255), nullable=False, index=True)
-    token_hash = Column(String(255), nullable=False, index=True)  # Token hash'i
-    code_hash = Column(String(255), nullable=False, index=True)  # 6 haneli kod hash'i
-    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    email = Column(String(255), nullable=False)
+    token_hash = Column(String(255), nullable=False)  # Token hash'i
+    code_hash = Column(String(255), nullable=False)  # 6 haneli kod hash'i
+    expires_at = Column(DateTime(timezone=True), nullable=False)
     used_at = Column(DateTime(timezone=True), nullable=True)  # Kullanıldığı zaman
     ip_created = Column(String(45), nullable=False)  # Oluşturulduğu IP
     user_agent_created = Column(String(500), nullable=True)  # Oluşturulduğu user agent
@@ -64,11 +66,12 @@ class LoginToken(Base):
     user = relationship("User", back_populates="login_tokens")
     
     # Indexes for performance
+    # Kolonlarda index=True kullanılmaz (aynı kolona ikinci indeks olurdu); kod doğrulamada
+    # code_hash zaten seçici olduğundan ayrı email indeksi yok
     __table_args__ = (
         Index('idx_login_tokens_token_hash', 'token_hash'),
         Index('idx_login_tokens_code_hash', 'code_hash'),
         Index('idx_login_tokens_expires', 'expires_at'),
-        Index('idx_login_tokens_email', 'email'),
     )
 
 class Request(Base):
@@ -86,6 +89,11 @@ class Request(Base):
     # Relationships
     user = relationship("User", back_populates="requests")
     responses = relationship("Response", back_populates="request")
+    
+    # Indexes for performance
+    __table_args__ = (
+        Index('idx_requests_user_created', 'user_id', 'created_at'),  # Yanıt geçmişi, admin son talep zamanı
+    )
 
 class Response(Base):
     __tablename__ = "responses"
@@ -102,10 +110,23 @@ class Response(Base):
     copied = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     tokens_used = Column(Integer, nullable=True)  # Kullanılan token sayısı
+    ttft_ms = Column(Integer, nullable=True)  # İlk token süresi (streaming)
+    load_duration_ms = Column(Integer, nullable=True)  # Ollama model yükleme süresi (cold start)
+    prompt_tokens = Column(Integer, nullable=True)  # Girdi token sayısı
+    completion_tokens = Column(Integer, nullable=True)  # Üretilen token sayısı
+    tokens_per_second = Column(Float, nullable=True)  # Üretim hızı
+    prompt_eval_ms = Column(Integer, nullable=True)  # Prompt işleme (prefill) süresi
     
     # Relationships
     request = relationship("Request", back_populates="responses")
     model = relationship("Model", back_populates="responses")
+    
+    # Indexes for performance
+    __table_args__ = (
+        Index('idx_responses_request_created', 'request_id', 'created_at'),  # Geçmiş, son yanıt, admin join
+        # has-copied-response: kopyalanan yanıtlar az olduğundan kısmi indeks küçük kalır
+        Index('idx_responses_request_copied', 'request_id', postgresql_where=text('copied = true')),
+    )
 
 class Model(Base):
     __tablename__ = "models"
@@ -115,10 +136,49 @@ class Model(Base):
     display_name = Column(String(200), nullable=False)
     supports_embedding = Column(Boolean, default=False)
     supports_chat = Column(Boolean, default=False)
+    provider = Column(String(50), nullable=True)  # llm_providers kayıt adı; boşsa model adı deseninden çözülür
     
     # Relationship with Response table
     responses = relationship("Response", back_populates="model")
 
+class GenerationCacheEntry(Base):
+    __tablename__ = "generation_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, nullable=False)  # Prompt + parametre hash'i (sha256)
+    model_name = Column(String(100), nullable=False)
+    response_text = Column(Text, nullable=False)
+    latency_ms = Column(Integer, nullable=True)  # Orijinal üretim süresi
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex, istemciye döner
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False)
+    model_name = Column(String(100), nullable=False)
+    params = Column(Text, nullable=False)  # GenerateRequest alanları (JSON)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    response_id = Column(Integer, ForeignKey("responses.id"), nullable=True)  # Başarılı işin yazdığı yanıt
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    owner = Column(String(128), nullable=True)  # Çalıştıran process: "host:pid:nonce"
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # Sahibinin son heartbeat'i
+    
+    # Relationships
+    response = relationship("Response")
+    
+    # Worker'lar ve restart kurtarma durum + zamana göre tarar
+    __table_args__ = (
+        Index('idx_generation_jobs_status_created', 'status', 'created_at'),
+        Index('idx_generation_jobs_user', 'user_id'),
+    )
+
 class TemplateCategory(Base):
     __tablename__ = "template_categories"
     
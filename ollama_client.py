@@ -1,49 +1,21 @@
 import httpx
+import json
 import time
-from typing import List, Dict, Any
-from config import OLLAMA_HOST
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from config import (
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_ROUTE_MAX_ATTEMPTS,
+    OLLAMA_USE_CHAT_API,
+)
+from ollama_pool import OllamaNodePool, OllamaNode
+from llm_client_base import BaseLLMClient
 
-class OllamaClient:
-    def __init__(self):
-        self.base_url = OLLAMA_HOST.rstrip('/')
-    
-    def get_models(self) -> List[Dict[str, Any]]:
-        """Get list of available models from Ollama"""
-        try:
-            import requests
-            response = requests.get(f"{self.base_url}/api/tags")
-            if response.status_code == 200:
-                data = response.json()
-                models = []
-                for model in data.get('models', []):
-                    model_info = {
-                        'name': model.get('name', ''),
-                        'display_name': model.get('name', '').replace(':', ' ').title(),
-                        'supports_embedding': True,  # Default assumption
-                        'supports_chat': True,       # Default assumption
-                        'size': model.get('size', 0),
-                        'modified_at': model.get('modified_at', '')
-                    }
-                    models.append(model_info)
-                return models
-            else:
-                print(f"Error getting models: {response.status_code}")
-                return []
-        except Exception as e:
-            print(f"Error connecting to Ollama: {e}")
-            return []
-    
-    async def generate_response(self, model_name: str, prompt: str, temperature: float = 0.7, top_p: float = 0.9, repetition_penalty: float = 1.2, system_prompt: str = "") -> Dict[str, Any]:
-        """Generate response from Ollama model"""
-        try:
-            start_time = time.time()
-            
-            # Frontend'den gelen sistem promptunu kullan, yoksa varsayılanı kullan
-            if system_prompt:
-                final_system_prompt = system_prompt
-            else:
-                # Varsayılan sistem promptu
-                final_system_prompt = """Bursa Nilüfer Belediyesi adına resmi yanıt hazırla.
+# Bu hatalarda istek başka bir node'da tekrar denenir (istek henüz işlenmemiştir)
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+RETRYABLE_STATUS = {502, 503, 504}
+
+class OllamaClient(BaseLLMClient):
+    DEFAULT_SYSTEM_PROMPT = """Bursa Nilüfer Belediyesi adına resmi yanıt hazırla.
 
 ZORUNLU YANIT ŞABLONU:
 1. "Sayın," ile başla
@@ -53,58 +25,276 @@ ZORUNLU YANIT ŞABLONU:
 5. "Saygılarımızla, Bursa Nilüfer Belediyesi" ile bitir
 
 Uzunluk: 150-300 kelime, 3-4 paragraf"""
-            
-            full_prompt = f"{final_system_prompt}\n\n{prompt}"
-            
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "model": model_name,
-                    "prompt": full_prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "top_p": top_p,
-                        "repetition_penalty": repetition_penalty,
-                        "num_predict": 4000  # Token limiti eklendi
-                    }
+    CONNECT_ERROR_MESSAGE = "Connection Error: Could not connect to Ollama. Please check if Ollama is running."
+    
+    def __init__(self, hosts: List[str] = None):
+        # Tek node için de aynı yol kullanılır (OLLAMA_HOSTS varsayılanı OLLAMA_HOST)
+        self.pool = OllamaNodePool(hosts)
+    
+    async def start(self):
+        """Node bağlantı havuzlarını aç ve health check döngüsünü başlat (app lifespan)"""
+        await self.pool.start()
+    
+    async def aclose(self):
+        """Health check'i durdur ve tüm node bağlantılarını kapat"""
+        await self.pool.aclose()
+    
+    def _route(self, model_name: str) -> List[OllamaNode]:
+        return self.pool.candidates(model_name)[:max(1, OLLAMA_ROUTE_MAX_ATTEMPTS)]
+    
+    async def _post(self, model_name: str, path: str, payload: Dict[str, Any]) -> Tuple[httpx.Response, OllamaNode]:
+        """En az yüklü node'a gönder; bağlantı hatasında sıradaki node'u dene"""
+        nodes = self._route(model_name)
+        last_error: Optional[Exception] = None
+        for attempt, node in enumerate(nodes):
+            try:
+                async with self.pool.track(node) as client:
+                    response = await client.post(path, json=payload)
+            except RETRYABLE_ERRORS as e:
+                self.pool.mark_failure(node, e)
+                last_error = e
+                continue
+            if response.status_code in RETRYABLE_STATUS and attempt < len(nodes) - 1:
+                self.pool.mark_failure(node, RuntimeError(f"HTTP {response.status_code}"))
+                continue
+            if response.status_code == 200:
+                node.consecutive_failures = 0
+            return response, node
+        raise last_error or httpx.ConnectError("No Ollama node available")
+    
+    async def get_models(self) -> List[Dict[str, Any]]:
+        """Get list of available models from all healthy Ollama nodes"""
+        try:
+            await self.pool.check_all()
+            models = []
+            for model in self.pool.list_models():
+                model_info = {
+                    'name': model.get('name', ''),
+                    'display_name': model.get('name', '').replace(':', ' ').title(),
+                    'supports_embedding': True,  # Default assumption
+                    'supports_chat': True,       # Default assumption
+                    'size': model.get('size', 0),
+                    'modified_at': model.get('modified_at', '')
                 }
-                
-                # Timeout süresini 300 saniyeye çıkar
-                response = await client.post(f"{self.base_url}/api/generate", json=payload, timeout=300.0)
-                
-                end_time = time.time()
-                latency_ms = (end_time - start_time) * 1000
-                
+                models.append(model_info)
+            return models
+        except Exception as e:
+            print(f"Error connecting to Ollama: {e}")
+            return []
+    
+    @staticmethod
+    def _ns_to_ms(value: Optional[int]) -> Optional[float]:
+        """Ollama süre alanları nanosaniye cinsindendir"""
+        return value / 1_000_000 if value is not None else None
+    
+    @classmethod
+    def _usage(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Son yanıttaki token sayıları ve süreler (prompt_eval_*, eval_*, load_duration)"""
+        completion_tokens = data.get('eval_count')
+        eval_duration_ms = cls._ns_to_ms(data.get('eval_duration'))
+        tokens_per_second = None
+        if completion_tokens and eval_duration_ms:
+            tokens_per_second = completion_tokens / (eval_duration_ms / 1000)
+        return {
+            'prompt_tokens': data.get('prompt_eval_count'),
+            'completion_tokens': completion_tokens,
+            'prompt_eval_ms': cls._ns_to_ms(data.get('prompt_eval_duration')),
+            'eval_duration_ms': eval_duration_ms,
+            'load_duration_ms': cls._ns_to_ms(data.get('load_duration')),
+            'tokens_per_second': tokens_per_second
+        }
+    
+    async def warm_model(self, model_name: str, keep_alive: str = OLLAMA_KEEP_ALIVE) -> Dict[str, Any]:
+        """Modeli, onu barındıran her node'da belleğe yükle / yüklü tut (boş prompt + keep_alive)"""
+        nodes = self.pool.candidates(model_name)
+        results = []
+        for node in nodes:
+            start_time = time.time()
+            try:
+                # Model yükleme süresi node'un gecikme ortalamasına karışmasın
+                async with self.pool.track(node, record=False) as client:
+                    response = await client.post("/api/generate", json={"model": model_name, "keep_alive": keep_alive})
+                latency_ms = self.elapsed_ms(start_time)
                 if response.status_code == 200:
                     data = response.json()
-                    response_text = data.get('response', '')
-                    return {
-                        'response_text': response_text,
+                    results.append({
+                        'success': True,
+                        'node': node.url,
                         'latency_ms': latency_ms,
-                        'success': True
-                    }
+                        'load_duration_ms': self._ns_to_ms(data.get('load_duration'))
+                    })
                 else:
-                    error_text = f"HTTP {response.status_code}: {response.text}"
-                    return {
-                        'response_text': error_text,
+                    results.append({
+                        'success': False,
+                        'node': node.url,
                         'latency_ms': latency_ms,
-                        'success': False
-                    }
-        except httpx.TimeoutException:
+                        'error': f"HTTP {response.status_code}: {response.text}"
+                    })
+            except Exception as e:
+                if isinstance(e, RETRYABLE_ERRORS):
+                    self.pool.mark_failure(node, e)
+                results.append({'success': False, 'node': node.url, 'latency_ms': 0, 'error': str(e)})
+        
+        succeeded = [r for r in results if r['success']]
+        if not succeeded:
             return {
-                'response_text': "Timeout: Request took too long (300 seconds). Model may be too slow or overloaded.",
+                'success': False,
                 'latency_ms': 0,
-                'success': False
+                'error': '; '.join(f"{r['node']}: {r['error']}" for r in results) or "No Ollama node available",
+                'nodes': results
             }
-        except httpx.ConnectError:
-            return {
-                'response_text': "Connection Error: Could not connect to Ollama. Please check if Ollama is running.",
-                'latency_ms': 0,
-                'success': False
+        return {
+            'success': True,
+            'latency_ms': max(r['latency_ms'] for r in succeeded),
+            'load_duration_ms': max((r.get('load_duration_ms') or 0) for r in succeeded),
+            'nodes': results
+        }
+    
+    def build_messages(self, prompt: str, system_prompt: str = "", history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """Chat mesajları: sabit system mesajı + (varsa) önceki konuşma + kullanıcı promptu"""
+        messages = [{"role": "system", "content": self.resolve_system_prompt(system_prompt)}]
+        messages.extend(history or [])
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    def _build_request(self, model_name: str, prompt: str, system_prompt: str, history: Optional[List[Dict[str, str]]],
+                       stream: bool, options: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """/api/chat veya /api/generate için yol ve istek gövdesi"""
+        payload = {
+            "model": model_name,
+            "stream": stream,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": options
+        }
+        if OLLAMA_USE_CHAT_API:
+            # System mesajı her çağrıda birebir aynı olduğu için Ollama prefix'i yeniden işlemez
+            payload["messages"] = self.build_messages(prompt, system_prompt, history)
+            return "/api/chat", payload
+        payload["prompt"] = self.build_full_prompt(prompt, system_prompt)
+        if history:
+            # /api/generate'te önceki yanıt prompt'a metin olarak eklenir (user turn'ü zaten prompt'un kendisi)
+            previous = "\n\n".join(message["content"] for message in history if message["role"] == "assistant")
+            payload["prompt"] = f"{payload['prompt']}\n\nÖnceki yanıt:\n{previous}"
+        return "/api/generate", payload
+    
+    @staticmethod
+    def _options(temperature: float, top_p: float, repetition_penalty: float, max_tokens: int, stop: Optional[List[str]]) -> Dict[str, Any]:
+        """Örnekleme seçenekleri; num_predict moda göre bütçedir, stop dizisi gelince üretim durur"""
+        options = {
+            "temperature": temperature,
+            "top_p": top_p,
+            "repetition_penalty": repetition_penalty,
+            "num_predict": max_tokens
+        }
+        if stop:
+            options["stop"] = stop
+        return options
+    
+    @staticmethod
+    def _extract_text(data: Dict[str, Any]) -> str:
+        """Yanıt (veya stream parçası) metni - chat: message.content, generate: response"""
+        if 'message' in data:
+            return (data.get('message') or {}).get('content', '')
+        return data.get('response', '')
+    
+    async def generate_response(self, model_name: str, prompt: str, temperature: float = 0.7, top_p: float = 0.9, repetition_penalty: float = 1.2, system_prompt: str = "", history: Optional[List[Dict[str, str]]] = None, max_tokens: int = 4000, stop: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Generate response from Ollama model"""
+        try:
+            start_time = time.time()
+            
+            path, payload = self._build_request(model_name, prompt, system_prompt, history, stream=False,
+                                                options=self._options(temperature, top_p, repetition_penalty, max_tokens, stop))
+            
+            # Faz bazlı timeout'lar (connect/read/write/pool) node istemcilerinde tanımlı
+            response, node = await self._post(model_name, path, payload)
+            
+            latency_ms = self.elapsed_ms(start_time)
+            
+            if response.status_code == 200:
+                data = response.json()
+                response_text = self._extract_text(data)
+                return {
+                    'response_text': response_text,
+                    'latency_ms': latency_ms,
+                    **self._usage(data),
+                    'finish_reason': data.get('done_reason'),  # stop / length
+                    'node': node.url,
+                    'success': True
+                }
+            else:
+                return {**self.http_error(response.status_code, response.text, latency_ms), 'node': node.url}
+        except Exception as e:
+            return self.exception_error(e)
+    
+    async def stream_response(self, model_name: str, prompt: str, temperature: float = 0.7, top_p: float = 0.9, repetition_penalty: float = 1.2, system_prompt: str = "", history: Optional[List[Dict[str, str]]] = None, max_tokens: int = 4000, stop: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream response tokens from Ollama model (stream: true, NDJSON)"""
+        start_time = time.time()
+        ttft_ms = None
+        usage = {}
+        finish_reason = None
+        chunks = []
+        try:
+            path, payload = self._build_request(model_name, prompt, system_prompt, history, stream=True,
+                                                options=self._options(temperature, top_p, repetition_penalty, max_tokens, stop))
+            
+            nodes = self._route(model_name)
+            served_by = None
+            for attempt, node in enumerate(nodes):
+                try:
+                    async with self.pool.track(node) as client:
+                        async with client.stream("POST", path, json=payload) as response:
+                            if response.status_code in RETRYABLE_STATUS and attempt < len(nodes) - 1:
+                                self.pool.mark_failure(node, RuntimeError(f"HTTP {response.status_code}"))
+                                continue
+                            if response.status_code != 200:
+                                body = await response.aread()
+                                yield {
+                                    'type': 'error',
+                                    **self.http_error(response.status_code, body.decode(errors='replace'), self.elapsed_ms(start_time)),
+                                    'node': node.url
+                                }
+                                return
+                            
+                            served_by = node
+                            async for line in response.aiter_lines():
+                                if not line.strip():
+                                    continue
+                                data = json.loads(line)
+                                if data.get('error'):
+                                    yield {
+                                        'type': 'error',
+                                        **self.exception_error(RuntimeError(data['error']), self.elapsed_ms(start_time)),
+                                        'node': node.url
+                                    }
+                                    return
+                                token = self._extract_text(data)
+                                if token:
+                                    if ttft_ms is None:
+                                        ttft_ms = self.elapsed_ms(start_time)
+                                    chunks.append(token)
+                                    yield {'type': 'token', 'text': token}
+                                if data.get('done'):
+                                    # Son parça token sayılarını ve süre istatistiklerini taşır
+                                    usage = self._usage(data)
+                                    finish_reason = data.get('done_reason')
+                                    break
+                    node.consecutive_failures = 0
+                    break
+                except RETRYABLE_ERRORS as e:
+                    # Sadece ilk token gönderilmeden önce başka node'a geçilebilir
+                    self.pool.mark_failure(node, e)
+                    if served_by is not None or attempt == len(nodes) - 1:
+                        raise
+            
+            yield {
+                'type': 'done',
+                'response_text': ''.join(chunks),
+                'latency_ms': self.elapsed_ms(start_time),
+                'ttft_ms': ttft_ms,
+                **usage,
+                'finish_reason': finish_reason,
+                'node': served_by.url if served_by else None,
+                'success': True
             }
         except Exception as e:
-            return {
-                'response_text': f"Error: {str(e)}",
-                'latency_ms': 0,
-                'success': False
-            } 
\ No newline at end of file
+            yield {'type': 'error', **self.exception_error(e)}
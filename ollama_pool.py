@@ -0,0 +1,199 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Set
+import httpx
+from config import (
+    OLLAMA_HOSTS,
+    OLLAMA_HEALTH_CHECK_INTERVAL_SEC,
+    OLLAMA_NODE_MAX_FAILURES,
+    OLLAMA_POOL_MAX_CONNECTIONS,
+    OLLAMA_POOL_MAX_KEEPALIVE,
+    LLM_KEEPALIVE_EXPIRY_SEC,
+    LLM_CONNECT_TIMEOUT_SEC,
+    LLM_READ_TIMEOUT_SEC,
+    LLM_WRITE_TIMEOUT_SEC,
+    LLM_POOL_TIMEOUT_SEC,
+)
+
+# Gecikme ortalaması için EWMA katsayısı
+LATENCY_EWMA_ALPHA = 0.2
+
+class OllamaNode:
+    """Tek bir Ollama sunucusu: kendi bağlantı havuzu, modelleri ve istatistikleri"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.client: Optional[httpx.AsyncClient] = None
+        self.healthy = True
+        self.models: Set[str] = set()
+        self.tags: List[Dict[str, Any]] = []
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_errors = 0
+        self.consecutive_failures = 0
+        self.avg_latency_ms: Optional[float] = None
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def open(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.url,
+                limits=httpx.Limits(
+                    max_connections=OLLAMA_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=OLLAMA_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SEC
+                ),
+                timeout=httpx.Timeout(
+                    connect=LLM_CONNECT_TIMEOUT_SEC,
+                    read=LLM_READ_TIMEOUT_SEC,
+                    write=LLM_WRITE_TIMEOUT_SEC,
+                    pool=LLM_POOL_TIMEOUT_SEC
+                )
+            )
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def record_latency(self, latency_ms: float):
+        if self.avg_latency_ms is None:
+            self.avg_latency_ms = latency_ms
+        else:
+            self.avg_latency_ms = (1 - LATENCY_EWMA_ALPHA) * self.avg_latency_ms + LATENCY_EWMA_ALPHA * latency_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "total_requests": self.total_requests,
+            "total_errors": self.total_errors,
+            "consecutive_failures": self.consecutive_failures,
+            "avg_latency_ms": round(self.avg_latency_ms, 1) if self.avg_latency_ms is not None else None,
+            "models": sorted(self.models),
+            "last_checked": self.last_checked,
+            "last_error": self.last_error
+        }
+
+class OllamaNodePool:
+    """
+    Birden fazla Ollama node'u arasında yönlendirme.
+
+    - Her node'un modelleri /api/tags ile periyodik olarak keşfedilir (aktif health check)
+    - İstek, modeli barındıran sağlıklı node'lar arasından en az in-flight
+      isteği olan node'a gider (eşitlikte düşük ortalama gecikme)
+    - Art arda OLLAMA_NODE_MAX_FAILURES hata veren node devreden çıkarılır,
+      bir sonraki başarılı health check ile geri alınır
+    """
+
+    def __init__(self, urls: List[str] = None):
+        self.nodes = [OllamaNode(url) for url in (urls or OLLAMA_HOSTS)]
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        for node in self.nodes:
+            node.open()
+        if self._task is None:
+            await self.check_all()
+            self._task = asyncio.create_task(self._health_loop())
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for node in self.nodes:
+            await node.aclose()
+
+    async def check_node(self, node: OllamaNode):
+        """/api/tags ile node sağlığını ve modellerini güncelle"""
+        node.open()
+        node.last_checked = time.time()
+        try:
+            response = await node.client.get("/api/tags", timeout=LLM_CONNECT_TIMEOUT_SEC)
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            node.tags = response.json().get('models', [])
+            node.models = {model.get('name', '') for model in node.tags}
+            if not node.healthy:
+                print(f"✅ Ollama node back online: {node.url}")
+            node.healthy = True
+            node.consecutive_failures = 0
+            node.last_error = None
+        except Exception as e:
+            self.mark_failure(node, e)
+
+    async def check_all(self):
+        await asyncio.gather(*[self.check_node(node) for node in self.nodes])
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(OLLAMA_HEALTH_CHECK_INTERVAL_SEC)
+            try:
+                await self.check_all()
+            except Exception as e:
+                print(f"Error in Ollama health check: {e}")
+
+    def mark_failure(self, node: OllamaNode, error: Exception):
+        node.consecutive_failures += 1
+        node.last_error = str(error) or type(error).__name__
+        if node.healthy and node.consecutive_failures >= OLLAMA_NODE_MAX_FAILURES:
+            node.healthy = False
+            print(f"⚠️ Ollama node ejected: {node.url} ({node.last_error})")
+
+    def candidates(self, model_name: str) -> List[OllamaNode]:
+        """Modeli barındıran node'lar, yük sırasına göre"""
+        healthy = [node for node in self.nodes if node.healthy]
+        with_model = [node for node in healthy if model_name in node.models]
+        # Model hiçbir node'da listelenmiyorsa sağlıklı node'lara, hiç sağlıklı
+        # node yoksa hepsine dene (health bilgisi eskimiş olabilir)
+        nodes = with_model or healthy or list(self.nodes)
+        return sorted(nodes, key=lambda node: (node.in_flight, node.avg_latency_ms or 0.0))
+
+    @asynccontextmanager
+    async def track(self, node: OllamaNode, record: bool = True):
+        """
+        İstek süresince node'un in-flight sayısını ve gecikmesini takip et.
+
+        record=False (warm-up / keep-alive ping'leri): sadece in-flight sayılır; gecikme EWMA'sı
+        (yönlendirme) ve istek/hata sayaçları gerçek üretim isteklerini yansıtmaya devam eder.
+        """
+        node.open()
+        node.in_flight += 1
+        if record:
+            node.total_requests += 1
+        start_time = time.time()
+        try:
+            yield node.client
+        except Exception:
+            if record:
+                node.total_errors += 1
+            raise
+        else:
+            if record:
+                node.record_latency((time.time() - start_time) * 1000)
+        finally:
+            node.in_flight -= 1
+
+    def list_models(self) -> List[Dict[str, Any]]:
+        """Sağlıklı node'lardaki modellerin birleşimi (ada göre tekil)"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for node in self.nodes:
+            if not node.healthy:
+                continue
+            for model in node.tags:
+                merged.setdefault(model.get('name', ''), model)
+        return list(merged.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "health_check_interval_sec": OLLAMA_HEALTH_CHECK_INTERVAL_SEC,
+            "max_failures": OLLAMA_NODE_MAX_FAILURES,
+            "nodes": [node.snapshot() for node in self.nodes]
+        }
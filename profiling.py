@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from config import (
+    PROFILING_ENABLED,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_MAX_DURATION_SEC,
+    PROFILE_OUTPUT_DIR,
+    PROFILE_MAX_STORED,
+)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_QUERY_FLAG = "_profile"
+
+_PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+
+# Örnek alındığında en üstteki frame bu modüllerdeyse event loop I/O'da bloklanmıştır (CPU sayılmaz)
+BLOCKING_IO_MARKERS = ("sqlalchemy", "psycopg2", "asyncpg", "smtplib", "socket.py", "ssl.py", "selectors.py")
+
+# Profil çalışırken DB/LLM/SMTP süreleri buraya eklenir: {tür: [çağrı sayısı, saniye]}
+# asyncio.to_thread ve threadpool context'i kopyalar; aynı sözlüğe yazarlar
+_active_spans: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar("profile_spans", default=None)
+
+def record_span(kind: str, seconds: float):
+    """Profil açık değilse tek bir ContextVar okumasıdır"""
+    spans = _active_spans.get()
+    if spans is None:
+        return
+    entry = spans.setdefault(kind, [0, 0.0])
+    entry[0] += 1
+    entry[1] += seconds
+
+class _Sampler(threading.Thread):
+    """
+    Event loop thread'inin stack'ini aralıklarla örnekler.
+
+    Sadece profillenen isteğin task'ı çalışırken alınan örnekler sayılır; diğer isteklerin
+    işleri ve task'ın await ettiği süreler ağaca girmez. Threadpool'a verilen işler
+    (asyncio.to_thread, sync bağımlılıklar) örneklenmez, süreleri span'lerden gelir.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task, interval_ms: float, max_duration_sec: int):
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop = loop
+        self.task = task
+        self.loop_thread_id = threading.get_ident()
+        self.interval = interval_ms / 1000
+        self.max_duration_sec = max_duration_sec
+        self.stacks: Counter = Counter()
+        self.ticks = 0
+        self.cpu_samples = 0
+        self.io_samples = 0
+        self.elapsed = 0.0
+        self.truncated = False
+        self._labels: Dict[Any, str] = {}
+        self._stop_event = threading.Event()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def run(self):
+        start = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            if time.perf_counter() - start > self.max_duration_sec:
+                self.truncated = True
+                break
+            self.ticks += 1
+            if asyncio.current_task(self.loop) is not self.task:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            if any(marker in frame.f_code.co_filename for marker in BLOCKING_IO_MARKERS):
+                self.io_samples += 1
+            else:
+                self.cpu_samples += 1
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+        self.elapsed = time.perf_counter() - start
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1)
+
+    @property
+    def ms_per_tick(self) -> float:
+        return self.elapsed * 1000 / self.ticks if self.ticks else 0.0
+
+def build_call_tree(stacks: Counter) -> Dict[str, Any]:
+    """Örnek stack'lerinden çağrı ağacı (her düğümde kendisi + altındakilerin örnek sayısı)"""
+    root = {"name": "root", "samples": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["samples"] += count
+        node = root
+        for label in stack:
+            child = node["children"].get(label)
+            if child is None:
+                child = {"name": label, "samples": 0, "children": {}}
+                node["children"][label] = child
+            child["samples"] += count
+            node = child
+
+    def finalize(node):
+        children = sorted(node["children"].values(), key=lambda child: child["samples"], reverse=True)
+        return {"name": node["name"], "samples": node["samples"], "children": [finalize(child) for child in children]}
+
+    return finalize(root)
+
+def folded_stacks(stacks: Counter) -> List[str]:
+    """flamegraph.pl / speedscope'un okuduğu "a;b;c 12" formatı"""
+    return [f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()]
+
+class ProfileStore:
+    """Profiller dizinde JSON olarak saklanır; id ile her worker'dan okunabilir"""
+
+    def __init__(self, directory: str = PROFILE_OUTPUT_DIR, max_stored: int = PROFILE_MAX_STORED):
+        self.directory = directory
+        self.max_stored = max_stored
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, profile: Dict[str, Any]):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile["id"]), "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False)
+        files = sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")),
+            key=os.path.getmtime
+        )
+        for path in files[:-self.max_stored]:
+            os.remove(path)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if not _PROFILE_ID_PATTERN.match(profile_id) or not os.path.exists(self._path(profile_id)):
+            return None
+        with open(self._path(profile_id), encoding="utf-8") as f:
+            return json.load(f)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """En yeniden eskiye profil özetleri (ağaç ve stack'ler hariç)"""
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            profile = self.get(name[:-len(".json")])
+            if profile is not None:
+                summaries.append({key: value for key, value in profile.items() if key not in ("call_tree", "folded")})
+        summaries.sort(key=lambda profile: profile["created_at"], reverse=True)
+        return summaries
+
+def _profile_requested(scope) -> bool:
+    for name, value in scope.get("headers", []):
+        if name == PROFILE_HEADER.lower().encode():
+            return value.lower() in (b"1", b"true")
+    query_string = scope.get("query_string", b"")
+    return f"{PROFILE_QUERY_FLAG}=1".encode() in query_string
+
+def _is_admin(user_id: int) -> bool:
+    from connection import SessionLocal
+    from models import User
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        return bool(user and user.is_active and user.is_admin)
+    finally:
+        db.close()
+
+async def _admin_user_id(scope) -> Optional[int]:
+    """Bearer token'ın sahibi admin ise kullanıcı id'si; değilse None (istek profilsiz çalışır)"""
+    from auth_system import auth_service
+
+    authorization = dict(scope.get("headers", [])).get(b"authorization", b"").decode()
+    if not authorization.lower().startswith("bearer "):
+        return None
+    payload = auth_service.verify_token(authorization[len("bearer "):].strip())
+    try:
+        user_id = int(payload.get("sub")) if payload else None
+    except (TypeError, ValueError):
+        return None
+    if user_id is None or not await asyncio.to_thread(_is_admin, user_id):
+        return None
+    return user_id
+
+class ProfilingMiddleware:
+    """
+    Saf ASGI middleware: admin istekleri için örnekleyici profil.
+
+    X-Profile: 1 başlığı veya ?_profile=1 ile tetiklenir ve token sahibinin User.is_admin
+    bayrağı kontrol edilir. Cevaba X-Profile-Id eklenir; profil (çağrı ağacı, folded stack'ler,
+    DB/LLM/SMTP/CPU dağılımı) /api/v1/admin/profiles/{id} ile alınır. Bayrak yoksa
+    maliyet sadece başlık/query string kontrolüdür.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ENABLED or not _profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        user_id = await _admin_user_id(scope)
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = secrets.token_hex(8)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.lower().encode(), profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        spans: Dict[str, List[float]] = {}
+        token = _active_spans.set(spans)
+        sampler = _Sampler(asyncio.get_running_loop(), asyncio.current_task(), PROFILE_SAMPLE_INTERVAL_MS,
+                           PROFILE_MAX_DURATION_SEC)
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            _active_spans.reset(token)
+            wall_ms = (time.perf_counter() - start) * 1000
+            profile = self._build_profile(profile_id, user_id, scope, status["code"], wall_ms,
+                                          (time.process_time() - cpu_start) * 1000, spans, sampler)
+            try:
+                await asyncio.to_thread(profile_store.save, profile)
+                print(f"🔬 Profil {profile_id}: {scope['method']} {profile['route']} {wall_ms:.0f} ms")
+            except Exception as e:
+                print(f"Error saving profile {profile_id}: {e}")
+
+    @staticmethod
+    def _build_profile(profile_id: str, user_id: int, scope, status_code: int, wall_ms: float, process_cpu_ms: float,
+                       spans: Dict[str, List[float]], sampler: _Sampler) -> Dict[str, Any]:
+        def span(kind: str) -> Tuple[int, float]:
+            calls, seconds = spans.get(kind, (0, 0.0))
+            return int(calls), round(seconds * 1000, 1)
+
+        db_queries, db_ms = span("db")
+        llm_calls, llm_ms = span("llm")
+        smtp_calls, smtp_ms = span("smtp")
+        python_cpu_ms = round(sampler.cpu_samples * sampler.ms_per_tick, 1)
+        return {
+            "id": profile_id,
+            "created_at": datetime.utcnow().isoformat(),
+            "user_id": user_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(scope.get("route"), "path", "unmatched"),
+            "status": status_code,
+            "wall_ms": round(wall_ms, 1),
+            "breakdown": {
+                "db_ms": db_ms,
+                "db_queries": db_queries,
+                "llm_ms": llm_ms,
+                "llm_calls": llm_calls,
+                "smtp_ms": smtp_ms,
+                "smtp_calls": smtp_calls,
+                "python_cpu_ms": python_cpu_ms,
+                "loop_blocked_io_ms": round(sampler.io_samples * sampler.ms_per_tick, 1),
+                "other_ms": round(max(0.0, wall_ms - db_ms - llm_ms - smtp_ms - python_cpu_ms), 1),
+                # Process geneli: aynı anda çalışan diğer istekleri de içerir
+                "process_cpu_ms": round(process_cpu_ms, 1),
+            },
+            "samples": sum(sampler.stacks.values()),
+            "sample_interval_ms": round(sampler.ms_per_tick, 3),
+            "truncated": sampler.truncated,
+            "call_tree": build_call_tree(sampler.stacks),
+            "folded": folded_stacks(sampler.stacks),
+        }
+
+# Global profile store instance
+profile_store = ProfileStore()
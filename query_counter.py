@@ -0,0 +1,117 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import event
+from metrics import observe_request_queries
+from profiling import record_span
+from config import QUERY_DEBUG_HEADERS, QUERY_COUNT_WARN_THRESHOLD
+
+# Sorgu sayısı/süresi cevap başlıklarında (N+1 teşhisi ve benchmarks/query_budgets.py için)
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+QUERY_TIME_HEADER = "X-DB-Query-Time-Ms"
+
+# Uyarı logunda gösterilecek en fazla farklı statement
+MAX_RECORDED_STATEMENTS = 200
+
+class QueryStats:
+    """Tek bir HTTP isteği boyunca çalışan SQL statement'ları"""
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None):
+        self.scope = scope or {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements: List[Tuple[str, float]] = []
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if len(self.statements) < MAX_RECORDED_STATEMENTS:
+            self.statements.append((statement, elapsed_ms))
+
+    def repeated(self, minimum: int = 2) -> List[Tuple[str, int]]:
+        """Aynı statement'ın tekrarları (N+1 işareti), en sık olandan başlayarak"""
+        counts = Counter(statement for statement, _ in self.statements)
+        return [(statement, count) for statement, count in counts.most_common() if count >= minimum]
+
+    @property
+    def route(self) -> str:
+        # Router eşleşen route'u aynı scope sözlüğüne yazar; middleware'de önceden bilinmez
+        return getattr(self.scope.get("route"), "path", "unmatched")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "total_ms": round(self.total_ms, 2)}
+
+# asyncio.to_thread ve threadpool'daki bağımlılıklar context'i kopyalar; aynı QueryStats nesnesine yazarlar
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+def current_route() -> Optional[str]:
+    """Çalışan SQL'i tetikleyen isteğin "METHOD /rota/şablonu" bilgisi; istek dışında None"""
+    stats = _current_stats.get()
+    if stats is None:
+        return None
+    return f"{stats.scope.get('method', '')} {stats.route}"
+
+def instrument_engine(engine):
+    """Engine üzerindeki her cursor çalıştırmasını o anki isteğin sayacına yaz"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        record_span("db", elapsed)
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed * 1000)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # Hata alan statement için after_cursor_execute çağrılmaz
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+
+class QueryCounterMiddleware:
+    """
+    Saf ASGI middleware: istek başına SQL sorgu sayısı ve süresi.
+
+    Sonuçlar metriklere yazılır; QUERY_DEBUG_HEADERS açıksa cevap başlıklarında döner.
+    Eşik aşılırsa tekrar eden statement'lar loglanır. Stream cevaplarında başlık,
+    ilk byte'a kadar çalışan sorguları gösterir.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        token = _current_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and QUERY_DEBUG_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_COUNT_HEADER.lower().encode(), str(stats.count).encode()))
+                headers.append((QUERY_TIME_HEADER.lower().encode(), f"{stats.total_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            route = stats.route
+            observe_request_queries(route, stats.count, stats.total_ms / 1000)
+            if stats.count > QUERY_COUNT_WARN_THRESHOLD:
+                print(f"⚠️ {scope['method']} {route}: {stats.count} SQL sorgusu ({stats.total_ms:.1f} ms)")
+                for statement, count in stats.repeated()[:3]:
+                    print(f"   {count}x {' '.join(statement.split())[:200]}")
@@ -0,0 +1,102 @@
+import time
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from typing import Dict, Any, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import DATABASE_READ_URL, READ_YOUR_WRITES_WINDOW_SEC, QUERY_DEBUG_HEADERS
+
+LAST_WRITE_COOKIE = "db_last_write"
+READ_ROUTE_HEADER = "X-DB-Read-Route"
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# İstek başına durum: istemcinin son yazma zamanı (cookie), bu istekte yazma oldu mu, okuma nereye gitti
+_request_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar("read_your_writes", default=None)
+
+def replica_configured() -> bool:
+    return bool(DATABASE_READ_URL)
+
+def prefer_primary() -> bool:
+    """İstemci son READ_YOUR_WRITES_WINDOW_SEC içinde yazdıysa okumalar da primary'ye gider"""
+    if not replica_configured():
+        return True
+    state = _request_state.get()
+    if state is None:
+        return False
+    return state["wrote"] or time.time() - state["last_write"] < READ_YOUR_WRITES_WINDOW_SEC
+
+def record_read_route(route: str):
+    state = _request_state.get()
+    if state is not None:
+        state["read_route"] = route
+
+def mark_write():
+    state = _request_state.get()
+    if state is not None:
+        state["wrote"] = True
+
+# Yazma içeren her commit (sync Session ve AsyncSession'ın sync session'ı) istemciyi primary'ye bağlar
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    session.info["has_writes"] = True
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop("has_writes", False):
+        mark_write()
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("has_writes", None)
+
+def _last_write_from_cookie(scope) -> float:
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            morsel = SimpleCookie(value.decode("latin-1")).get(LAST_WRITE_COOKIE)
+            if morsel is not None:
+                try:
+                    return float(morsel.value)
+                except ValueError:
+                    return 0.0
+    return 0.0
+
+class ReadYourWritesMiddleware:
+    """
+    Saf ASGI middleware: replika okumalarında read-your-writes.
+
+    Yazma yapan (unsafe method veya commit'te flush olan) isteklerin cevabına son yazma zamanı
+    cookie'si eklenir; bu cookie READ_YOUR_WRITES_WINDOW_SEC içindeyse get_read_db primary'yi
+    kullanır. Stream cevaplarında commit başlıklardan sonra olduğundan unsafe method kuralı da uygulanır.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_configured():
+            await self.app(scope, receive, send)
+            return
+
+        state = {
+            "last_write": _last_write_from_cookie(scope),
+            "wrote": scope["method"] in UNSAFE_METHODS,
+            "read_route": None,
+        }
+        token = _request_state.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if state["wrote"]:
+                    cookie = (f"{LAST_WRITE_COOKIE}={time.time():.3f}; Max-Age={READ_YOUR_WRITES_WINDOW_SEC}; "
+                              f"Path=/; HttpOnly; SameSite=Lax")
+                    headers.append((b"set-cookie", cookie.encode()))
+                if QUERY_DEBUG_HEADERS and state["read_route"]:
+                    headers.append((READ_ROUTE_HEADER.lower().encode(), state["read_route"].encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_state.reset(token)
@@ -0,0 +1,226 @@
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import event
+from query_counter import current_route
+from config import (
+    SLOW_QUERY_LOG_ENABLED,
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_MAX_ENTRIES,
+    SLOW_QUERY_EXPLAIN,
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS,
+)
+
+# EXPLAIN bağlantısını işaretler; o bağlantıdaki sorgular tekrar kaydedilmez
+EXPLAIN_CONNECTION_FLAG = "slow_query_explain"
+
+# IN (%(id_1_1)s, %(id_1_2)s, ...) / IN ($1::INTEGER, $2::INTEGER) listeleri eleman sayısından
+# bağımsız tek parmak izine düşer
+_PLACEHOLDER = r"(?:%\([^)]+\)s|\$\d+(?:::\w+)?)"
+_IN_LIST_PATTERN = re.compile(rf"IN \(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)", re.IGNORECASE)
+_NUMERIC_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+def normalize_statement(statement: str) -> str:
+    return _IN_LIST_PATTERN.sub("IN (...)", " ".join(statement.split()))
+
+def to_pyformat(statement: str, parameters: Any) -> Tuple[str, Any]:
+    """asyncpg ($1, $2) statement'ını EXPLAIN'i çalıştıran psycopg2 engine'ine uyarla"""
+    if not isinstance(parameters, (list, tuple)) or not _NUMERIC_PLACEHOLDER.search(statement):
+        return statement, parameters
+    converted = _NUMERIC_PLACEHOLDER.sub(lambda match: f"%(p{match.group(1)})s", statement.replace("%", "%%"))
+    return converted, {f"p{index}": value for index, value in enumerate(parameters, start=1)}
+
+def _value_shape(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}({len(value)})"
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> Any:
+    """Parametre değerleri yerine tipleri/uzunlukları (e-posta, kod hash'i vb. log'a düşmez)"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        return {"rows": len(parameters), "row": parameter_shape(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: _value_shape(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_value_shape(value) for value in parameters]
+    return _value_shape(parameters)
+
+class SlowQueryLog:
+    """
+    Eşiği aşan SQL sorguları için process başına kayıt.
+
+    - Sorgular normalize edilmiş statement'a göre gruplanır (sayı, toplam/maks süre, rotalar)
+    - Parametreler sadece şekil olarak saklanır (değerler redakte)
+    - SELECT'ler için EXPLAIN (ANALYZE, BUFFERS) planı arka plan thread'inde, parmak izi başına bir kez alınır
+    """
+
+    def __init__(self, threshold_ms: int = SLOW_QUERY_THRESHOLD_MS, max_entries: int = SLOW_QUERY_MAX_ENTRIES,
+                 explain: bool = SLOW_QUERY_EXPLAIN, explain_timeout_ms: int = SLOW_QUERY_EXPLAIN_TIMEOUT_MS):
+        self.threshold_ms = threshold_ms
+        self.max_entries = max_entries
+        self.explain = explain
+        self.explain_timeout_ms = explain_timeout_ms
+        self.enabled = False
+        # Kaydedilen engine -> EXPLAIN'i çalıştıran sync (psycopg2) engine; primary sorgusu replikada
+        # EXPLAIN edilmesin diye her engine kendi eşine bağlanır
+        self._explain_engines: Dict[Any, Any] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._explaining: set = set()
+        self._lock = threading.Lock()
+        # Tek worker: EXPLAIN'ler pool'dan en fazla bir bağlantı kullanır
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+
+    def install(self, engine, explain_engine=None):
+        """
+        Engine'in cursor olaylarına bağlan (sync engine veya async engine'in sync_engine'i).
+
+        EXPLAIN her zaman sync (psycopg2) engine'den, ayrı bir thread'de çalışır: sync engine'ler
+        kendileri, async engine'ler aynı veritabanının sync engine'i (explain_engine) ile EXPLAIN edilir.
+        """
+        if explain_engine is None and not engine.dialect.is_async:
+            explain_engine = engine
+        if explain_engine is not None:
+            self._explain_engines[engine] = explain_engine
+        self.enabled = True
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+            if elapsed_ms >= self.threshold_ms and not conn.info.get(EXPLAIN_CONNECTION_FLAG):
+                self.record(statement, parameters, executemany, elapsed_ms, self._explain_engine_for(conn.engine))
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(exception_context):
+            conn = exception_context.connection
+            if conn is not None and conn.info.get("slow_query_start"):
+                conn.info["slow_query_start"].pop()
+
+    def _explain_engine_for(self, engine):
+        # engine.execution_options(...) ile türetilen OptionEngine kaydedilen engine'e (_proxied) bağlıdır
+        explain_engine = self._explain_engines.get(engine)
+        if explain_engine is None and hasattr(engine, "_proxied"):
+            explain_engine = self._explain_engines.get(engine._proxied)
+        return explain_engine
+
+    def record(self, statement: str, parameters: Any, executemany: bool, elapsed_ms: float, explain_engine=None):
+        fingerprint = normalize_statement(statement)
+        route = current_route() or "background"
+        shape = parameter_shape(parameters, executemany)
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    # En az toplam süreye sahip kayıt yer açar
+                    del self._entries[min(self._entries, key=lambda key: self._entries[key]["total_ms"])]
+                entry = {
+                    "statement": fingerprint,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": Counter(),
+                    "parameter_shape": shape,
+                    "plan": None,
+                    "plan_error": None,
+                    "first_seen": datetime.utcnow().isoformat(),
+                }
+                self._entries[fingerprint] = entry
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["last_ms"] = elapsed_ms
+            entry["last_seen"] = datetime.utcnow().isoformat()
+            entry["routes"][route] += 1
+            should_explain = (
+                self.explain and explain_engine is not None and explain_engine.dialect.name == "postgresql"
+                and entry["plan"] is None and entry["plan_error"] is None
+                and fingerprint not in self._explaining and self._explainable(statement, executemany)
+            )
+            if should_explain:
+                self._explaining.add(fingerprint)
+
+        print(f"🐢 Yavaş sorgu {elapsed_ms:.0f} ms [{route}]: {fingerprint[:300]} params={shape}")
+        if should_explain:
+            # Gerçek değerler sadece EXPLAIN için bellekte tutulur, kayda yazılmaz
+            self._executor.submit(self._capture_plan, explain_engine, fingerprint, statement, parameters)
+
+    @staticmethod
+    def _explainable(statement: str, executemany: bool) -> bool:
+        # ANALYZE sorguyu gerçekten çalıştırır: sadece yan etkisiz SELECT'ler
+        normalized = statement.lstrip().upper()
+        return not executemany and normalized.startswith(("SELECT", "WITH")) and "FOR UPDATE" not in normalized \
+            and "INSERT " not in normalized and "UPDATE " not in normalized and "DELETE " not in normalized
+
+    def _capture_plan(self, explain_engine, fingerprint: str, statement: str, parameters: Any):
+        plan, error = None, None
+        statement, parameters = to_pyformat(statement, parameters)
+        try:
+            with explain_engine.connect() as conn:
+                conn.info[EXPLAIN_CONNECTION_FLAG] = True
+                try:
+                    conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                    rows = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters).fetchall()
+                    plan = "\n".join(row[0] for row in rows)
+                finally:
+                    conn.info.pop(EXPLAIN_CONNECTION_FLAG, None)
+                    conn.rollback()
+        except Exception as e:
+            error = str(e).splitlines()[0] if str(e) else type(e).__name__
+            print(f"Slow query EXPLAIN failed: {error}")
+        with self._lock:
+            self._explaining.discard(fingerprint)
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                entry["plan"] = plan
+                entry["plan_error"] = error
+                entry["plan_captured_at"] = datetime.utcnow().isoformat()
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """En çok toplam (veya maks/ortalama) süre harcayan sorgular"""
+        with self._lock:
+            entries = [
+                {
+                    **entry,
+                    "total_ms": round(entry["total_ms"], 1),
+                    "max_ms": round(entry["max_ms"], 1),
+                    "last_ms": round(entry["last_ms"], 1),
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 1),
+                    "routes": dict(entry["routes"].most_common()),
+                }
+                for entry in self._entries.values()
+            ]
+        entries.sort(key=lambda entry: entry.get(order_by, entry["total_ms"]), reverse=True)
+        return entries[:limit]
+
+    def snapshot(self, limit: int = 20, order_by: str = "total_ms") -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "explain": self.explain and any(
+                explain_engine.dialect.name == "postgresql" for explain_engine in self._explain_engines.values()
+            ),
+            "distinct_queries": len(self._entries),
+            "queries": self.top(limit, order_by),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+# Global slow query log instance
+slow_query_log = SlowQueryLog()
+
+def install_slow_query_log(engine, explain_engine=None):
+    if SLOW_QUERY_LOG_ENABLED:
+        slow_query_log.install(engine, explain_engine)
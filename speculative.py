@@ -0,0 +1,230 @@
+import asyncio
+import time
+import uuid
+from typing import Dict, Any, Optional, List
+from generation_service import generate_with_cache, make_cache_key, output_budget, build_prompt, get_provider_name
+from generation_cache import generation_cache, CACHE_MISS, CACHE_BYPASS
+from admission import admission_controller
+from config import (
+    SPECULATIVE_GENERATION_ENABLED,
+    SPECULATIVE_DEFAULT_MODEL,
+    SPECULATIVE_MAX_INFLIGHT,
+    SPECULATIVE_TTL_SEC,
+)
+
+# Spekülasyon sonuçları (istatistiklerde kullanılır)
+SPEC_USED = "used"
+SPEC_CANCELLED = "cancelled"
+SPEC_EXPIRED = "expired"
+SPEC_FAILED = "failed"
+
+# Talep oluşturulurken ipucu gönderilmezse /generate varsayılanları kullanılır
+SPECULATION_DEFAULTS = {
+    "custom_input": "",
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "repetition_penalty": 1.2,
+    "system_prompt": "",
+    "is_sms": False
+}
+
+class _Speculation:
+    def __init__(self, request_id: int, user_id: int, model_name: str, cache_key: str):
+        self.request_id = request_id
+        self.user_id = user_id
+        self.model_name = model_name
+        self.cache_key = cache_key
+        self.ticket_id = f"spec-{request_id}-{uuid.uuid4().hex[:8]}"
+        self.task: Optional[asyncio.Task] = None
+        self.created_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.gpu_ms = 0.0  # Sadece gerçek upstream üretimi (önbellek isabeti 0)
+
+    def running_ms(self) -> float:
+        """Şu ana kadar harcanan üretim süresi (slot alınmadıysa 0)"""
+        if self.finished_at is not None:
+            return self.gpu_ms
+        status = admission_controller.ticket_status(self.ticket_id)
+        if status is None or status["state"] != "running":
+            return 0.0
+        return status["running_for_sec"] * 1000
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "user_id": self.user_id,
+            "model_name": self.model_name,
+            "state": "done" if self.finished_at is not None else "running",
+            "age_sec": round(time.monotonic() - self.created_at, 1),
+            "gpu_ms": round(self.running_ms(), 1)
+        }
+
+class SpeculativeGenerator:
+    """
+    Talep oluşturulduğunda kullanıcının varsayılan modeliyle düşük öncelikli ön üretim.
+
+    Sonuç normal generation cache'e yazılır. /generate aynı girdilerle gelirse
+    süren üretime önbellek üzerinden katılır (veya önbellekten döner); girdiler farklıysa
+    spekülasyon iptal edilir ve o ana kadar harcanan GPU süresi boşa giden olarak sayılır.
+    Sadece sağlayıcı ve model kapısında boş slot varken başlar; sonradan normal bir istek
+    aynı kapıda beklemek zorunda kalırsa spekülasyon önceden alınır (iptal). Durum worker başınadır.
+    """
+
+    def __init__(self, enabled: bool = SPECULATIVE_GENERATION_ENABLED, max_inflight: int = SPECULATIVE_MAX_INFLIGHT,
+                 ttl_seconds: int = SPECULATIVE_TTL_SEC):
+        self.enabled = enabled
+        self.max_inflight = max_inflight
+        self.ttl_seconds = ttl_seconds
+        self._speculations: Dict[int, _Speculation] = {}
+        self.stats = {
+            "started": 0,
+            "skipped_busy": 0,
+            "preempted": 0,
+            SPEC_USED: 0,
+            SPEC_CANCELLED: 0,
+            SPEC_EXPIRED: 0,
+            SPEC_FAILED: 0,
+            "saved_ms": 0.0,
+            "wasted_gpu_ms": 0.0
+        }
+
+    @staticmethod
+    def _cache_key(model_name: str, prompt: str, params: Dict[str, Any], history: Optional[List[Dict[str, str]]] = None) -> str:
+        budget = output_budget(model_name, params["system_prompt"], params["is_sms"])
+        return make_cache_key(model_name, prompt, params["temperature"], params["top_p"], params["repetition_penalty"],
+                              params["system_prompt"], history, budget)
+
+    def _inflight(self) -> int:
+        return sum(1 for speculation in self._speculations.values() if speculation.finished_at is None)
+
+    def _finish(self, speculation: _Speculation, outcome: str, wasted_ms: float = 0.0, saved_ms: float = 0.0):
+        if self._speculations.get(speculation.request_id) is not speculation:
+            return
+        del self._speculations[speculation.request_id]
+        self.stats[outcome] += 1
+        self.stats["wasted_gpu_ms"] += wasted_ms
+        self.stats["saved_ms"] += saved_ms
+
+    def _expire(self):
+        """TTL içinde kullanılmayan tamamlanmış spekülasyonlar boşa gitmiş sayılır"""
+        now = time.monotonic()
+        for speculation in list(self._speculations.values()):
+            if speculation.finished_at is not None and now - speculation.finished_at > self.ttl_seconds:
+                self._finish(speculation, SPEC_EXPIRED, wasted_ms=speculation.gpu_ms)
+
+    def start_for_request(self, user, request_id: int, original_text: str, hint: Optional[Dict[str, Any]] = None) -> bool:
+        """create_request commit'inden sonra çağrılır; spekülasyon başlatıldıysa True"""
+        if not self.enabled or not generation_cache.enabled or not user.speculative_generation:
+            return False
+        model_name = user.default_model or SPECULATIVE_DEFAULT_MODEL
+        if not model_name:
+            return False
+
+        self._expire()
+        if self._inflight() >= self.max_inflight or not admission_controller.is_idle(get_provider_name(model_name), model_name):
+            # Gerçek isteklerden slot çalmamak için meşgulken hiç başlama
+            self.stats["skipped_busy"] += 1
+            return False
+
+        params = {**SPECULATION_DEFAULTS, **(hint or {})}
+        prompt = build_prompt(original_text, params["custom_input"], params["is_sms"])
+        speculation = _Speculation(request_id, user.id, model_name, self._cache_key(model_name, prompt, params))
+        self.cancel(request_id)
+        self._speculations[request_id] = speculation
+        speculation.task = asyncio.create_task(self._run(speculation, prompt, params))
+        self.stats["started"] += 1
+        return True
+
+    async def _run(self, speculation: _Speculation, prompt: str, params: Dict[str, Any]):
+        try:
+            result = await generate_with_cache(
+                speculation.model_name,
+                prompt,
+                temperature=params["temperature"],
+                top_p=params["top_p"],
+                repetition_penalty=params["repetition_penalty"],
+                system_prompt=params["system_prompt"],
+                ticket_id=speculation.ticket_id,
+                is_sms=params["is_sms"],
+                on_preempt=lambda: self._preempt(speculation)
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Speculative generation error for request {speculation.request_id}: {e}")
+            result = {'response_text': str(e), 'latency_ms': 0, 'success': False}
+
+        speculation.result = result
+        if result.get('cache_status') in (CACHE_MISS, CACHE_BYPASS):
+            speculation.gpu_ms = result.get('latency_ms') or 0.0
+        speculation.finished_at = time.monotonic()
+        if not result.get('success'):
+            self._finish(speculation, SPEC_FAILED, wasted_ms=speculation.gpu_ms)
+
+    def _preempt(self, speculation: _Speculation):
+        """Normal bir istek slot beklerken admission tarafından çağrılır"""
+        if self._speculations.get(speculation.request_id) is speculation:
+            self.stats["preempted"] += 1
+            self.cancel(speculation.request_id)
+
+    def cancel(self, request_id: int):
+        """Spekülasyonu iptal et; harcanan süre boşa gitmiş sayılır"""
+        speculation = self._speculations.get(request_id)
+        if speculation is None:
+            return
+        wasted_ms = speculation.running_ms()
+        if not speculation.task.done():
+            # İstek iptali upstream bağlantısını kapatır, model üretimi durdurur
+            speculation.task.cancel()
+        self._finish(speculation, SPEC_CANCELLED, wasted_ms=wasted_ms)
+
+    async def claim(self, request_id: int, model_name: str, prompt: str, temperature: float, top_p: float,
+                    repetition_penalty: float, system_prompt: str = "", history: Optional[List[Dict[str, str]]] = None,
+                    is_sms: bool = False, no_cache: bool = False):
+        """
+        Üretimden önce çağrılır: girdiler eşleşirse spekülasyonu kullanılmış say (sonuç önbellekte
+        veya süren üretime önbellek üzerinden katılınır), eşleşmezse iptal et.
+        Spekülasyon görevi beklenmez: iptal edilebilir, normal istek ona bağlı kalmamalı.
+        """
+        speculation = self._speculations.get(request_id)
+        if speculation is None:
+            return
+        params = {
+            "temperature": temperature,
+            "top_p": top_p,
+            "repetition_penalty": repetition_penalty,
+            "system_prompt": system_prompt,
+            "is_sms": is_sms
+        }
+        if no_cache or self._cache_key(model_name, prompt, params, history) != speculation.cache_key:
+            self.cancel(request_id)
+            return
+
+        # Kazanılan süre: spekülasyonun normal istekten önce yaptığı üretim
+        self._finish(speculation, SPEC_USED, saved_ms=speculation.running_ms())
+
+    async def stop(self):
+        for speculation in list(self._speculations.values()):
+            if speculation.task is not None and not speculation.task.done():
+                speculation.task.cancel()
+        tasks = [speculation.task for speculation in self._speculations.values() if speculation.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._speculations.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._expire()
+        resolved = self.stats[SPEC_USED] + self.stats[SPEC_CANCELLED] + self.stats[SPEC_EXPIRED]
+        return {
+            **self.stats,
+            "saved_ms": round(self.stats["saved_ms"], 1),
+            "wasted_gpu_ms": round(self.stats["wasted_gpu_ms"], 1),
+            "hit_ratio": round(self.stats[SPEC_USED] / resolved, 4) if resolved else 0.0,
+            "enabled": self.enabled,
+            "max_inflight": self.max_inflight,
+            "speculations": [speculation.snapshot() for speculation in self._speculations.values()]
+        }
+
+# Global speculative generator
+speculative_generator = SpeculativeGenerator()
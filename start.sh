@@ -5,6 +5,11 @@ set -a
 source /app/data/.env
 set +a
 
+# Prometheus multiprocess dizini: worker metrikleri burada toplanır, her başlangıçta temizlenir
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/ai_helper_metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # Backend'i arka planda başlat
 python -m uvicorn main:app --host 0.0.0.0 --port 12000 &
 
@@ -0,0 +1,392 @@
+"""
+Yerel stub LLM sunucusu - GPU ya da Gemini anahtarı olmadan yük ve gecikme testi için.
+
+Ollama (/api/tags, /api/generate, /api/chat) ve Gemini (generateContent,
+streamGenerateContent) wire formatlarını taklit eder. Uygulamayı stub'a yönlendirmek için:
+
+    python stub_llm_server.py --port 11435
+    OLLAMA_HOST=http://localhost:11435 \\
+    GEMINI_API_URL=http://localhost:11435/v1beta/models GEMINI_API_KEY=stub \\
+    uvicorn main:app
+
+Çoklu node testi için farklı portlarda birden fazla stub çalıştırıp OLLAMA_HOSTS'a
+virgülle verin. Davranış STUB_* ortam değişkenleriyle veya çalışırken
+POST /stub/config ile ayarlanır; GET /stub/stats istek ve enjekte edilen hata sayılarını döner.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Üretilen metin: resmi yanıt şablonuna benzer, "Saygılarımızla" stop dizisini de içerir
+STUB_RESPONSE_TEXT = (
+    "Sayın Vatandaşımız, talebiniz ilgili müdürlüğümüze iletilmiş ve yerinde incelenmiştir. "
+    "Bildirdiğiniz konu ekiplerimiz tarafından değerlendirilmiş olup gerekli çalışmalar planlanmıştır. "
+    "Çalışmaların tamamlanmasının ardından tarafınıza ayrıca bilgi verilecektir. "
+    "Belediyemize gösterdiğiniz ilgi için teşekkür ederiz. "
+    "Saygılarımızla, Bursa Nilüfer Belediyesi"
+)
+
+# Türkçe için kaba karakter/token oranı (uygulamadaki tahminle aynı)
+CHARS_PER_TOKEN = 3
+
+class StubSettings:
+    """Stub davranışı; her alan STUB_<ALAN> ortam değişkeniyle ayarlanabilir"""
+
+    FIELDS = {
+        "models": ("llama3:8b,gemma2:9b", str),  # /api/tags'te listelenen modeller (virgülle)
+        "latency_dist": ("lognormal", str),  # fixed, uniform, normal, lognormal
+        "ttft_ms": (300.0, float),  # İlk token gecikmesi ortalaması
+        "ttft_jitter_ms": (100.0, float),  # Dağılım genişliği (uniform: ±, normal/lognormal: std)
+        "tokens_per_sec": (40.0, float),  # Token üretim hızı (0 = beklemeden)
+        "output_tokens": (120, int),  # İstenen num_predict/maxOutputTokens yoksa üretilecek token
+        "load_ms": (0.0, float),  # Modelin ilk çağrısındaki soğuk yükleme süresi
+        "error_rate": (0.0, float),  # HTTP hata döndürme olasılığı
+        "error_status": (503, int),
+        "timeout_rate": (0.0, float),  # Yanıt vermeden asılı kalma olasılığı
+        "timeout_sec": (600.0, float),
+        "stream_error_rate": (0.0, float),  # Stream ortasında bağlantıyı kesme olasılığı
+        "seed": (0, int),  # 0 dışında bir değer gecikme/hata örneklemesini tekrarlanabilir yapar
+    }
+
+    def __init__(self, **overrides):
+        for name, (default, cast) in self.FIELDS.items():
+            value = overrides.get(name, os.getenv(f"STUB_{name.upper()}", default))
+            setattr(self, name, cast(value))
+
+    def update(self, values: Dict[str, Any]):
+        for name, value in values.items():
+            if name not in self.FIELDS:
+                raise ValueError(f"Unknown stub setting: {name}")
+            setattr(self, name, self.FIELDS[name][1](value))
+
+    @property
+    def model_names(self) -> List[str]:
+        return [name.strip() for name in self.models.split(",") if name.strip()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+class StubBehavior:
+    """Gecikme örnekleme, hata/timeout enjeksiyonu ve metin üretimi"""
+
+    def __init__(self, settings: StubSettings):
+        self.settings = settings
+        self.reset()
+
+    def reset(self):
+        self.rng = random.Random(self.settings.seed or None)
+        self.loaded_models = set()
+        self.in_flight = 0
+        self.stats = {
+            "requests": {},
+            "injected_errors": 0,
+            "injected_timeouts": 0,
+            "injected_stream_errors": 0,
+            "tokens_generated": 0,
+            "max_in_flight": 0
+        }
+
+    def record(self, route: str):
+        self.stats["requests"][route] = self.stats["requests"].get(route, 0) + 1
+
+    def sample_ttft_ms(self) -> float:
+        settings = self.settings
+        mean, jitter = settings.ttft_ms, settings.ttft_jitter_ms
+        if settings.latency_dist == "uniform":
+            return self.rng.uniform(max(0.0, mean - jitter), mean + jitter)
+        if settings.latency_dist == "normal":
+            return max(0.0, self.rng.gauss(mean, jitter))
+        if settings.latency_dist == "lognormal" and mean > 0:
+            # Ortalaması mean, standart sapması yaklaşık jitter olan lognormal (uzun kuyruk)
+            sigma = math.sqrt(math.log(1 + (jitter / mean) ** 2))
+            return self.rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+        return mean
+
+    def fault(self) -> Optional[str]:
+        """Bu istek için enjekte edilecek hata: 'error', 'timeout' veya None"""
+        roll = self.rng.random()
+        if roll < self.settings.error_rate:
+            self.stats["injected_errors"] += 1
+            return "error"
+        if roll < self.settings.error_rate + self.settings.timeout_rate:
+            self.stats["injected_timeouts"] += 1
+            return "timeout"
+        return None
+
+    def load_ms(self, model_name: str) -> float:
+        """Modelin ilk çağrısında soğuk yükleme süresi (model_warmup'ı test etmek için)"""
+        if model_name in self.loaded_models:
+            return 0.0
+        self.loaded_models.add(model_name)
+        return self.settings.load_ms
+
+    def tokens(self, max_tokens: Optional[int], stop: Optional[List[str]]) -> Tuple[List[str], str]:
+        """Üretilecek token'lar ve bitiş nedeni (stop / length)"""
+        words = [word + " " for word in STUB_RESPONSE_TEXT.split(" ")]
+        limit = max_tokens if max_tokens and max_tokens > 0 else self.settings.output_tokens
+        text = STUB_RESPONSE_TEXT
+        # Stop dizisi metinde geçiyorsa oradan kes (Ollama/Gemini davranışı)
+        cut = min([text.find(sequence) for sequence in stop or [] if sequence and sequence in text], default=None)
+        tokens = []
+        length = 0
+        for index in range(limit):
+            word = words[index % len(words)]
+            if cut is not None and length + len(word) > cut:
+                remainder = text[length:cut]
+                if remainder:
+                    tokens.append(remainder)
+                return tokens, "stop"
+            tokens.append(word)
+            length += len(word)
+            if index == len(words) - 1 and cut is None:
+                return tokens, "stop"
+        return tokens, "length"
+
+    async def emit(self, tokens: List[str]) -> AsyncIterator[str]:
+        """Token hızına göre token'ları zamanlayarak üret"""
+        interval = 1.0 / self.settings.tokens_per_sec if self.settings.tokens_per_sec > 0 else 0.0
+        for token in tokens:
+            if interval:
+                await asyncio.sleep(interval)
+            self.stats["tokens_generated"] += 1
+            yield token
+
+    def enter(self):
+        self.in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+
+    def exit(self):
+        self.in_flight -= 1
+
+def _ns(ms: float) -> int:
+    return int(ms * 1_000_000)
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def create_app(settings: Optional[StubSettings] = None) -> FastAPI:
+    settings = settings or StubSettings()
+    behavior = StubBehavior(settings)
+    app = FastAPI(title="AI Helper LLM Stub", description="Ollama / Gemini wire-compatible stub for load testing")
+
+    async def injected_fault() -> Optional[JSONResponse]:
+        fault = behavior.fault()
+        if fault == "timeout":
+            await asyncio.sleep(settings.timeout_sec)
+            return JSONResponse({"error": "stub timeout"}, status_code=504)
+        if fault == "error":
+            return JSONResponse({"error": f"stub injected error {settings.error_status}"}, status_code=settings.error_status)
+        return None
+
+    # ---- Stub kontrolü ----
+
+    @app.get("/stub/stats")
+    async def stub_stats():
+        return {**behavior.stats, "in_flight": behavior.in_flight, "settings": settings.to_dict()}
+
+    @app.post("/stub/config")
+    async def stub_config(values: Dict[str, Any]):
+        try:
+            settings.update(values)
+        except (ValueError, TypeError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return settings.to_dict()
+
+    @app.post("/stub/reset")
+    async def stub_reset():
+        behavior.reset()
+        return {"message": "Stub stats reset"}
+
+    # ---- Ollama ----
+
+    @app.get("/api/tags")
+    async def ollama_tags():
+        behavior.record("ollama_tags")
+        return {
+            "models": [
+                {"name": name, "model": name, "modified_at": _now_iso(), "size": 0, "details": {"family": "stub"}}
+                for name in settings.model_names
+            ]
+        }
+
+    async def ollama_completion(request: Request, chat: bool):
+        body = await request.json()
+        behavior.record("ollama_chat" if chat else "ollama_generate")
+        model_name = body.get("model", "")
+        options = body.get("options") or {}
+        if chat:
+            prompt_chars = sum(len(message.get("content", "")) for message in body.get("messages") or [])
+        else:
+            prompt_chars = len(body.get("prompt") or "")
+
+        fault = await injected_fault()
+        if fault is not None:
+            return fault
+
+        load_ms = behavior.load_ms(model_name)
+        if not chat and not body.get("prompt"):
+            # Warm-up çağrısı (boş prompt): sadece modeli yükle
+            await asyncio.sleep(load_ms / 1000)
+            return {"model": model_name, "created_at": _now_iso(), "response": "", "done": True,
+                    "done_reason": "load", "load_duration": _ns(load_ms)}
+
+        tokens, finish_reason = behavior.tokens(options.get("num_predict"), options.get("stop"))
+        prompt_tokens = max(1, prompt_chars // CHARS_PER_TOKEN)
+
+        def chunk(text: str) -> Dict[str, Any]:
+            data = {"model": model_name, "created_at": _now_iso(), "done": False}
+            if chat:
+                data["message"] = {"role": "assistant", "content": text}
+            else:
+                data["response"] = text
+            return data
+
+        def final(start: float, ttft_ms: float, text: str) -> Dict[str, Any]:
+            total_ms = (time.monotonic() - start) * 1000
+            data = {
+                **chunk(text),
+                "done": True,
+                "done_reason": finish_reason,
+                "total_duration": _ns(total_ms),
+                "load_duration": _ns(load_ms),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": _ns(max(0.0, ttft_ms - load_ms)),
+                "eval_count": len(tokens),
+                "eval_duration": _ns(max(0.0, total_ms - ttft_ms))
+            }
+            return data
+
+        if not body.get("stream", True):
+            behavior.enter()
+            try:
+                start = time.monotonic()
+                ttft_ms = load_ms + behavior.sample_ttft_ms()
+                await asyncio.sleep(ttft_ms / 1000)
+                text = "".join([token async for token in behavior.emit(tokens)])
+                return final(start, ttft_ms, text)
+            finally:
+                behavior.exit()
+
+        async def ndjson() -> AsyncIterator[bytes]:
+            behavior.enter()
+            try:
+                start = time.monotonic()
+                ttft_ms = load_ms + behavior.sample_ttft_ms()
+                await asyncio.sleep(ttft_ms / 1000)
+                break_at = len(tokens) // 2 if behavior.rng.random() < settings.stream_error_rate else None
+                index = 0
+                async for token in behavior.emit(tokens):
+                    if index == break_at:
+                        behavior.stats["injected_stream_errors"] += 1
+                        yield (json.dumps({"error": "stub injected stream error"}) + "\n").encode()
+                        return
+                    yield (json.dumps(chunk(token), ensure_ascii=False) + "\n").encode()
+                    index += 1
+                yield (json.dumps(final(start, ttft_ms, ""), ensure_ascii=False) + "\n").encode()
+            finally:
+                behavior.exit()
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def ollama_generate(request: Request):
+        return await ollama_completion(request, chat=False)
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        return await ollama_completion(request, chat=True)
+
+    # ---- Gemini ----
+
+    @app.post("/{api_version}/models/{model_method}")
+    async def gemini_model_method(api_version: str, model_method: str, request: Request):
+        model_name, _, method = model_method.partition(":")
+        if method not in ("generateContent", "streamGenerateContent"):
+            return JSONResponse({"error": {"code": 404, "message": f"Unknown method: {method}"}}, status_code=404)
+        body = await request.json()
+        behavior.record(f"gemini_{method}")
+
+        fault = await injected_fault()
+        if fault is not None:
+            return fault
+
+        generation_config = body.get("generationConfig") or {}
+        tokens, finish_reason = behavior.tokens(generation_config.get("maxOutputTokens"), generation_config.get("stopSequences"))
+        prompt_chars = sum(
+            len(part.get("text", ""))
+            for content in body.get("contents") or []
+            for part in content.get("parts") or []
+        )
+        usage = {
+            "promptTokenCount": max(1, prompt_chars // CHARS_PER_TOKEN),
+            "candidatesTokenCount": len(tokens),
+            "totalTokenCount": max(1, prompt_chars // CHARS_PER_TOKEN) + len(tokens)
+        }
+
+        def candidate(text: str, done: bool) -> Dict[str, Any]:
+            data = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+            if done:
+                data["finishReason"] = "STOP" if finish_reason == "stop" else "MAX_TOKENS"
+            return data
+
+        if method == "generateContent":
+            behavior.enter()
+            try:
+                await asyncio.sleep(behavior.sample_ttft_ms() / 1000)
+                text = "".join([token async for token in behavior.emit(tokens)])
+                return {"candidates": [candidate(text, True)], "usageMetadata": usage, "modelVersion": model_name}
+            finally:
+                behavior.exit()
+
+        sse = request.query_params.get("alt") == "sse"
+
+        async def stream() -> AsyncIterator[bytes]:
+            behavior.enter()
+            try:
+                await asyncio.sleep(behavior.sample_ttft_ms() / 1000)
+                break_at = len(tokens) // 2 if behavior.rng.random() < settings.stream_error_rate else None
+                if not sse:
+                    yield b"["
+                index = 0
+                async for token in behavior.emit(tokens):
+                    if index == break_at:
+                        behavior.stats["injected_stream_errors"] += 1
+                        return
+                    done = index == len(tokens) - 1
+                    data = {"candidates": [candidate(token, done)]}
+                    if done:
+                        data["usageMetadata"] = usage
+                    payload = json.dumps(data, ensure_ascii=False)
+                    if sse:
+                        yield f"data: {payload}\r\n\r\n".encode()
+                    else:
+                        yield ((", " if index else "") + payload).encode()
+                    index += 1
+                if not sse:
+                    yield b"]"
+            finally:
+                behavior.exit()
+
+        return StreamingResponse(stream(), media_type="text/event-stream" if sse else "application/json")
+
+    return app
+
+# uvicorn stub_llm_server:app ile de çalıştırılabilir
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Ollama / Gemini stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)